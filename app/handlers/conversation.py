@@ -5,7 +5,8 @@ from app.models.girlfriend_profile import GirlfriendProfile
 from app.services.database import db_service
 from app.services.girlfriend_service import GirlfriendService
 from app.services.conversation_service import ConversationService
-from app.services.gemini_service import GeminiService
+from app.services.gemini_service import gemini_service
+from app.services.persona_prompt_service import persona_prompt_service
 from app.utils.keyboards import get_conversation_keyboard, get_confirmation_keyboard, get_main_keyboard
 from app.utils.decorators import user_required, subscription_required, error_handler, rate_limit
 from app.utils.helpers import format_conversation_stats
@@ -13,10 +14,7 @@ from app.utils.states import Conversation
 import logging
 
 logger = logging.getLogger(__name__)
-router = Router()
-
-# Инициализируем сервис Gemini
-gemini_service = GeminiService()
+router = Router(name="conversation")
 
 
 @router.message(Command("chat"))
@@ -42,6 +40,9 @@ async def start_conversation(message: types.Message, state: FSMContext, user):
         await state.set_state(Conversation.chatting)
         await state.update_data(profile_id=profile.id)
         
+        # Собираем промпт персонажа заранее, чтобы сообщения не загружали профиль
+        await persona_prompt_service.compile(profile)
+        
         # Получаем статистику разговора
         stats = await ConversationService.get_conversation_stats(
             session, user.id, profile.id
@@ -110,20 +111,23 @@ async def handle_conversation_message(message: types.Message, state: FSMContext,
     
     async with db_service.async_session() as session:
         try:
-            # Получаем профиль девушки
-            profile = await session.get(GirlfriendProfile, profile_id)
-            if not profile:
-                await message.answer("❌ Профиль не найден.")
-                await state.clear()
-                return
+            # Получаем собранный промпт персонажа (профиль загружаем только при промахе кэша)
+            persona = await persona_prompt_service.get(profile_id)
+            if persona is None:
+                profile = await session.get(GirlfriendProfile, profile_id)
+                if not profile:
+                    await message.answer("❌ Профиль не найден.")
+                    await state.clear()
+                    return
+                persona = await persona_prompt_service.compile(profile)
             
             # Сохраняем сообщение пользователя
             await ConversationService.save_message(
                 session, user.id, profile_id, "user", user_message
             )
             
-            # Получаем контекст разговора
-            context = await ConversationService.get_recent_context(
+            # Получаем контекст разговора (структурированные реплики)
+            context = await ConversationService.get_recent_turns(
                 session, user.id, profile_id, limit=10
             )
             
@@ -136,7 +140,7 @@ async def handle_conversation_message(message: types.Message, state: FSMContext,
             else:
                 # Генерируем ответ от девушки
                 response = await gemini_service.generate_response(
-                    profile, user_message, context
+                    persona, user_message, context
                 )
             
             # Сохраняем ответ девушки
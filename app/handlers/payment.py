@@ -2,18 +2,18 @@ from aiogram import Router, types
 from aiogram.filters import Command
 from app.services.database import db_service
 from app.services.payment_service import PaymentService
+from app.services.container import services
 from app.services.subscription_service import SubscriptionService
 from app.services.subscription_plan_service import SubscriptionPlanService
 from app.models import User
 from app.utils.decorators import error_handler
 from app.utils.helpers import format_datetime_for_user
 import logging
-from yookassa import Configuration
 from config.settings import settings
 from app.utils.keyboards import get_subscription_keyboard
 
 logger = logging.getLogger(__name__)
-router = Router()
+router = Router(name="payment")
 
 
 @router.message(Command("webhook"))
@@ -116,8 +116,7 @@ async def setup_yookassa_webhook():
     """Настройка webhook в YooKassa"""
     try:
         # Настраиваем конфигурацию YooKassa
-        Configuration.account_id = settings.yookassa_shop_id
-        Configuration.secret_key = settings.yookassa_secret_key
+        services.get("yookassa")
         
         if settings.webhook_url:
             webhook_url = f"{settings.webhook_url}/yookassa_webhook"
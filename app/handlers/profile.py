@@ -1,9 +1,12 @@
 from aiogram import Router, types, F
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
+from app.models import GirlfriendProfile
 from app.services.database import db_service
 from app.services.girlfriend_service import GirlfriendService
-from app.services.gemini_service import GeminiService
+from app.services.gemini_service import gemini_service
+from app.services.profile_pool_service import profile_pool_service
+from app.services.persona_prompt_service import get_profile_version
 from app.utils.keyboards import (
     get_profile_keyboard, get_profile_creation_keyboard, 
     get_profile_edit_keyboard, get_confirmation_keyboard
@@ -11,13 +14,11 @@ from app.utils.keyboards import (
 from app.utils.decorators import user_required, subscription_required, error_handler, rate_limit
 from app.utils.helpers import format_profile_info, validate_age, validate_name, safe_edit_message
 from app.utils.states import ProfileCreation, ProfileEditing
+from config.settings import settings
 import logging
 
 logger = logging.getLogger(__name__)
-router = Router()
-
-# Инициализируем сервис Gemini
-gemini_service = GeminiService()
+router = Router(name="profile")
 
 
 @router.message(Command("profile"))
@@ -282,6 +283,38 @@ async def process_background(message: types.Message, state: FSMContext, user):
         await message.answer("❌ Ошибка при создании профиля. Попробуйте еще раз.")
 
 
+async def refine_pooled_profile(
+    message: types.Message,
+    profile_id: int,
+    profile_version: str,
+    preferences: str,
+    user_description: str
+):
+    """
+    Уточнение профиля из пула по полным предпочтениям пользователя
+
+    Профиль уже показан пользователю, поэтому уточненный вариант не
+    записывается сразу, а предлагается: пользователь применяет его
+    кнопкой. Применение проверяет, что профиль не менялся с момента
+    выдачи, - правки пользователя не перезаписываются.
+    """
+    try:
+        profile_data = await gemini_service.generate_profile(preferences, user_description)
+        if profile_data is None:
+            return
+        
+        await profile_pool_service.save_refinement(profile_id, profile_version, profile_data)
+        await message.answer(
+            f"✨ **Есть вариант профиля точнее под ваши пожелания:**\n\n"
+            f"{format_profile_info(GirlfriendProfile(**profile_data))}\n\n"
+            f"Заменить им текущий профиль?",
+            reply_markup=get_confirmation_keyboard("profile_refine"),
+            parse_mode="Markdown"
+        )
+    except Exception as e:
+        logger.error(f"Error refining pooled profile {profile_id}: {e}")
+
+
 # Обработчик для создания профиля с помощью ИИ
 @router.message(ProfileCreation.waiting_for_preferences)
 @error_handler
@@ -304,8 +337,15 @@ async def process_ai_preferences(message: types.Message, state: FSMContext, user
     await message.answer("🤖 Создаю персонализированный профиль на основе ваших данных...")
     
     try:
-        # Генерируем профиль с помощью ИИ, используя и описание пользователя, и предпочтения
-        profile_data = await gemini_service.generate_profile_suggestions(preferences, user_description)
+        # Сначала пробуем готовый профиль из пула - это мгновенно
+        profile_data = None
+        if profile_pool_service.enabled:
+            profile_data = await profile_pool_service.take(preferences, user_description)
+        from_pool = profile_data is not None
+        
+        if not from_pool:
+            # Генерируем профиль с помощью ИИ, используя и описание пользователя, и предпочтения
+            profile_data = await gemini_service.generate_profile_suggestions(preferences, user_description)
         
         async with db_service.async_session() as session:
             profile = await GirlfriendService.create_girlfriend_profile(
@@ -334,6 +374,11 @@ async def process_ai_preferences(message: types.Message, state: FSMContext, user
             parse_mode="Markdown"
         )
         
+        if from_pool and settings.profile_pool_refine:
+            profile_pool_service.run_in_background(
+                refine_pooled_profile(message, profile.id, get_profile_version(profile), preferences, user_description)
+            )
+        
     except Exception as e:
         logger.error(f"Error creating AI profile: {e}")
         await message.answer("❌ Ошибка при создании профиля. Попробуйте еще раз.")
@@ -415,6 +460,54 @@ async def delete_profile_callback(callback: types.CallbackQuery):
         await callback.answer()
 
 
+@router.callback_query(F.data == "confirm_profile_refine")
+@error_handler
+@user_required
+async def confirm_refine_profile(callback: types.CallbackQuery, user):
+    """Применение уточненного варианта профиля из пула"""
+    async with db_service.async_session() as session:
+        profile = await GirlfriendService.get_active_profile(session, user.id)
+        refinement = await profile_pool_service.pop_refinement(profile.id) if profile else None
+        
+        if not refinement:
+            await callback.answer("❌ Предложение устарело", show_alert=True)
+            return
+        
+        updated = await GirlfriendService.update_profile_if_unchanged(
+            session, profile.id, user.id, refinement["version"], **refinement["profile"]
+        )
+    
+    if updated is None:
+        await safe_edit_message(
+            callback.message,
+            "ℹ️ Профиль уже изменен после создания - оставили ваши правки."
+        )
+        await callback.answer()
+        return
+    
+    await safe_edit_message(
+        callback.message,
+        f"✅ **Профиль обновлен:**\n\n{format_profile_info(updated)}",
+        reply_markup=get_profile_keyboard(True),
+        parse_mode="Markdown"
+    )
+    await callback.answer("Профиль обновлен")
+
+
+@router.callback_query(F.data == "cancel_profile_refine")
+@error_handler
+@user_required
+async def cancel_refine_profile(callback: types.CallbackQuery, user):
+    """Отказ от уточненного варианта профиля"""
+    async with db_service.async_session() as session:
+        profile = await GirlfriendService.get_active_profile(session, user.id)
+    if profile:
+        await profile_pool_service.pop_refinement(profile.id)
+    
+    await safe_edit_message(callback.message, "👌 Оставили текущий профиль")
+    await callback.answer()
+
+
 @router.callback_query(F.data == "confirm_profile_delete")
 @error_handler
 @user_required
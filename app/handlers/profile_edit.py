@@ -9,7 +9,7 @@ from app.utils.states import ProfileEditing
 import logging
 
 logger = logging.getLogger(__name__)
-router = Router()
+router = Router(name="profile_edit")
 
 # Обработчики для редактирования профиля
 @router.callback_query(F.data == "edit_name")
@@ -12,7 +12,7 @@ from config.settings import settings
 import logging
 
 logger = logging.getLogger(__name__)
-router = Router()
+router = Router(name="start")
 
 
 @router.message(Command("start"))
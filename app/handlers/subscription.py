@@ -8,7 +8,7 @@ from app.services.subscription_plan_service import SubscriptionPlanService
 from app.services.payment_service import PaymentService
 from app.utils.keyboards import (
     get_subscription_keyboard, get_confirmation_keyboard,
-    get_subscription_plans_keyboard, get_plan_details_keyboard,
+    get_plan_details_keyboard,
     get_payment_keyboard
 )
 from app.utils.decorators import user_required, subscription_required, error_handler, rate_limit
@@ -19,7 +19,7 @@ from decimal import Decimal
 import logging
 
 logger = logging.getLogger(__name__)
-router = Router()
+router = Router(name="subscription")
 
 
 @router.message(Command("subscription"))
@@ -201,31 +201,19 @@ async def cancel_subscription_cancel(callback: types.CallbackQuery):
 async def view_plans_callback(callback: types.CallbackQuery, user):
     """Просмотр доступных планов подписки"""
     async with db_service.async_session() as session:
-        # Инициализируем планы, если их нет
-        await SubscriptionPlanService.initialize_plans_if_needed(session)
-        
-        # Получаем все активные планы
-        plans = await SubscriptionPlanService.get_all_active_plans(session)
-        
-        if not plans:
-            await callback.answer("❌ Планы подписок не найдены", show_alert=True)
-            return
-        
-        plans_text = "💳 **Выберите план подписки:**\n\n"
-        
-        for plan in plans:
-            plan_info = SubscriptionPlanService.format_plan_info(plan)
-            plans_text += f"{plan_info}\n\n"
-            plans_text += "---\n\n"
-        
-        keyboard = get_subscription_plans_keyboard(plans)
-        
-        await callback.message.edit_text(
-            plans_text,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-        await callback.answer()
+        # Экран тарифов отрисован заранее для текущей версии каталога
+        rendered = await SubscriptionPlanService.get_rendered_plans(session)
+    
+    if not rendered.details_text:
+        await callback.answer("❌ Планы подписок не найдены", show_alert=True)
+        return
+    
+    await callback.message.edit_text(
+        rendered.plans_text,
+        reply_markup=rendered.plans_keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
 
 
 @router.callback_query(F.data.startswith("buy_plan_"))
@@ -236,28 +224,27 @@ async def buy_plan_callback(callback: types.CallbackQuery, state: FSMContext, us
     plan_id = int(callback.data.split("_")[-1])
     
     async with db_service.async_session() as session:
-        plan = await SubscriptionPlanService.get_plan_by_id(session, plan_id)
+        rendered = await SubscriptionPlanService.get_rendered_plans(session)
+        details_text = rendered.details_text.get(plan_id)
+        keyboard = rendered.details_keyboards.get(plan_id)
         
-        if not plan:
-            await callback.answer("❌ План не найден", show_alert=True)
-            return
-        
-        plan_details = SubscriptionPlanService.format_plan_info(plan)
-        
-        details_text = (
-            f"💳 **Подробности плана:**\n\n"
-            f"{plan_details}\n\n"
-            f"Подтвердите покупку:"
-        )
-        
-        keyboard = get_plan_details_keyboard(plan_id)
-        
-        await callback.message.edit_text(
-            details_text,
-            reply_markup=keyboard,
-            parse_mode="Markdown"
-        )
-        await callback.answer()
+        if details_text is None:
+            # Плана нет в каталоге активных - ищем отключенный план в базе
+            plan = await SubscriptionPlanService.get_plan_by_id(session, plan_id)
+            
+            if not plan:
+                await callback.answer("❌ План не найден", show_alert=True)
+                return
+            
+            details_text = SubscriptionPlanService.format_plan_details(plan)
+            keyboard = get_plan_details_keyboard(plan_id)
+    
+    await callback.message.edit_text(
+        details_text,
+        reply_markup=keyboard,
+        parse_mode="Markdown"
+    )
+    await callback.answer()
 
 
 @router.callback_query(F.data.startswith("confirm_buy_plan_"))
@@ -0,0 +1,188 @@
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional
+from config.settings import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+# Числовое значение состояния для метрик
+CIRCUIT_STATE_VALUES = {
+    CircuitState.CLOSED: 0,
+    CircuitState.HALF_OPEN: 1,
+    CircuitState.OPEN: 2
+}
+
+
+class CircuitOpenError(Exception):
+    """Вызов отклонен: предохранитель разомкнут"""
+    pass
+
+
+@dataclass(frozen=True)
+class CircuitAdmission:
+    """Допуск вызова: поколение состояния, в котором он пропущен, и признак пробного вызова"""
+    generation: int
+    probe: bool
+
+
+class CircuitBreaker:
+    """
+    Предохранитель вызовов внешнего сервиса
+
+    closed - вызовы проходят, результаты пишутся в скользящее окно;
+    если доля ошибок в окне превышает порог, предохранитель размыкается.
+    open - вызовы сразу отклоняются, пока не истечет время восстановления.
+    half_open - пропускается ограниченное число пробных вызовов: успех
+    всех проб замыкает предохранитель, любая ошибка снова размыкает.
+
+    Каждая смена состояния начинает новое поколение. Результат вызова
+    учитывается только в поколении, в котором вызов был пропущен:
+    вызов из closed, завершившийся уже в half_open, не считается пробой,
+    а запоздавшая проба не влияет на следующий цикл.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        min_calls: int = 10,
+        window_seconds: int = 60,
+        open_seconds: int = 30,
+        half_open_max_calls: int = 3
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self.state = CircuitState.CLOSED
+        self._results = deque()  # (timestamp, ok)
+        self._opened_at: Optional[float] = None
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        self._generation = 0
+
+        self.total_rejected = 0
+        self.times_opened = 0
+
+    def _trim(self, now: float) -> None:
+        """Отбрасывание результатов за пределами окна"""
+        threshold = now - self.window_seconds
+        while self._results and self._results[0][0] < threshold:
+            self._results.popleft()
+
+    def _failure_rate(self) -> float:
+        if not self._results:
+            return 0.0
+        return sum(1 for _, ok in self._results if not ok) / len(self._results)
+
+    def _transition(self, state: CircuitState) -> None:
+        if self.state == state:
+            return
+        logger.warning(f"Circuit breaker '{self.name}': {self.state.value} -> {state.value}")
+        self.state = state
+        self._generation += 1
+
+        if state == CircuitState.OPEN:
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+        elif state == CircuitState.CLOSED:
+            self._results.clear()
+            self._opened_at = None
+
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+
+    def allow_request(self) -> Optional[CircuitAdmission]:
+        """Допуск вызова (None - вызов отклонен; в half_open занимает слот пробного вызова)"""
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.total_rejected += 1
+                return None
+            self._transition(CircuitState.HALF_OPEN)
+
+        if self.state == CircuitState.HALF_OPEN:
+            if self._half_open_in_flight + self._half_open_successes >= self.half_open_max_calls:
+                self.total_rejected += 1
+                return None
+            self._half_open_in_flight += 1
+            return CircuitAdmission(self._generation, probe=True)
+
+        return CircuitAdmission(self._generation, probe=False)
+
+    def _is_current(self, admission: CircuitAdmission) -> bool:
+        """Вызов пропущен в текущем поколении состояния"""
+        return admission.generation == self._generation
+
+    def record_success(self, admission: CircuitAdmission) -> None:
+        """Учет успешного вызова"""
+        if not self._is_current(admission):
+            return
+
+        if admission.probe:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+            self._half_open_successes += 1
+            if self._half_open_successes >= self.half_open_max_calls:
+                self._transition(CircuitState.CLOSED)
+            return
+
+        now = time.monotonic()
+        self._results.append((now, True))
+        self._trim(now)
+
+    def release(self, admission: CircuitAdmission) -> None:
+        """Освобождение слота пробного вызова без результата (вызов отменен)"""
+        if admission.probe and self._is_current(admission):
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+
+    def record_failure(self, admission: CircuitAdmission) -> None:
+        """Учет неудачного вызова"""
+        if not self._is_current(admission):
+            return
+
+        if admission.probe:
+            self._transition(CircuitState.OPEN)
+            return
+
+        now = time.monotonic()
+        self._results.append((now, False))
+        self._trim(now)
+
+        if len(self._results) >= self.min_calls and self._failure_rate() >= self.failure_rate_threshold:
+            self._transition(CircuitState.OPEN)
+
+    def get_state(self) -> dict:
+        """Состояние предохранителя для метрик"""
+        self._trim(time.monotonic())
+        return {
+            "name": self.name,
+            "state": self.state.value,
+            "state_value": CIRCUIT_STATE_VALUES[self.state],
+            "window_calls": len(self._results),
+            "failure_rate": round(self._failure_rate(), 3),
+            "times_opened": self.times_opened,
+            "rejected": self.total_rejected
+        }
+
+
+# Общий предохранитель вызовов Gemini для всех экземпляров GeminiService
+gemini_circuit_breaker = CircuitBreaker(
+    "gemini",
+    failure_rate_threshold=settings.gemini_breaker_failure_rate,
+    min_calls=settings.gemini_breaker_min_calls,
+    window_seconds=settings.gemini_breaker_window_seconds,
+    open_seconds=settings.gemini_breaker_open_seconds,
+    half_open_max_calls=settings.gemini_breaker_half_open_calls
+)
@@ -0,0 +1,82 @@
+"""
+Контейнер сервисов с отложенным созданием
+
+Тяжелые сервисы (БД, Gemini, YooKassa) регистрируются фабрикой и создаются
+один раз - при первом обращении или заранее в on_startup (warm_up).
+Импорт модулей приложения при этом не открывает подключений и не
+импортирует SDK, поэтому холодный старт и импорт в скриптах быстрые.
+Модули по-прежнему экспортируют глобальные имена (db_service и т.д.) -
+это заместители, которые передают обращения созданному сервису.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceContainer:
+    """Реестр фабрик сервисов и созданных экземпляров"""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> "LazyService":
+        """Регистрация фабрики; возвращает заместитель сервиса"""
+        with self._registry_lock:
+            self._factories[name] = factory
+            self._locks[name] = threading.Lock()
+        return LazyService(self, name)
+
+    def get(self, name: str) -> Any:
+        """Экземпляр сервиса (создается при первом обращении)"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        # Блокировка на сервис: warm_up создает сервисы в потоках параллельно
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                started = time.perf_counter()
+                instance = self._factories[name]()
+                self._instances[name] = instance
+                logger.info(f"Service {name} created in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return instance
+
+    def is_created(self, name: str) -> bool:
+        return name in self._instances
+
+    async def warm_up(self, names: Optional[Iterable[str]] = None) -> None:
+        """Создание сервисов заранее: в потоках, параллельно и не блокируя event loop"""
+        names = list(names) if names is not None else list(self._factories)
+        await asyncio.gather(*(asyncio.to_thread(self.get, name) for name in names))
+
+
+class LazyService:
+    """Заместитель сервиса: создает его при первом обращении к атрибуту"""
+
+    __slots__ = ("_container", "_name")
+
+    def __init__(self, container: ServiceContainer, name: str):
+        object.__setattr__(self, "_container", container)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self._container.get(self._name), attribute)
+
+    def __setattr__(self, attribute: str, value: Any) -> None:
+        setattr(self._container.get(self._name), attribute, value)
+
+    def __repr__(self) -> str:
+        state = "created" if self._container.is_created(self._name) else "not created"
+        return f"<LazyService {self._name} ({state})>"
+
+
+# Глобальный контейнер сервисов
+services = ServiceContainer()
@@ -72,6 +72,26 @@ class ConversationService:
         
         return "\n".join(context_parts)
     
+    @staticmethod
+    async def get_recent_turns(
+        session: AsyncSession,
+        user_id: int,
+        girlfriend_profile_id: int,
+        limit: int = 10
+    ) -> List[dict]:
+        """Получение недавних реплик для AI в структурированном виде"""
+        conversations = await ConversationService.get_conversation_history(
+            session, user_id, girlfriend_profile_id, limit
+        )
+        
+        return [
+            {
+                "role": "user" if conv.message_type == "user" else "model",
+                "text": conv.content
+            }
+            for conv in conversations
+        ]
+    
     @staticmethod
     async def clear_conversation_history(
         session: AsyncSession,
@@ -1,12 +1,36 @@
+from pathlib import Path
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.pool import NullPool
 from config.settings import settings
 from app.models import Base
-from typing import AsyncGenerator
+from app.services.container import services
+from app.services.metrics import instrument_engine
+from app.services.tracing import trace_engine
+from typing import AsyncGenerator, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+ALEMBIC_INI_PATH = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+
+class SchemaRevisionError(RuntimeError):
+    """Схема БД не соответствует миграциям кода"""
+
+
+def get_migrations_heads() -> Tuple[str, ...]:
+    """Последние ревизии из каталога миграций (читаются файлы, к БД не обращается)"""
+    # alembic нужен только здесь - не тянем его в импорт приложения
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config(str(ALEMBIC_INI_PATH))
+    config.set_main_option("script_location", str(ALEMBIC_INI_PATH.parent / "migrations"))
+    return tuple(ScriptDirectory.from_config(config).get_heads())
+
+
 class DatabaseService:
     def __init__(self):
         self.engine = create_async_engine(
@@ -14,6 +38,9 @@ class DatabaseService:
             poolclass=NullPool,
             echo=settings.debug
         )
+        instrument_engine(self.engine)
+        if settings.tracing_enabled:
+            trace_engine(self.engine)
         self.async_session = async_sessionmaker(
             self.engine,
             class_=AsyncSession,
@@ -26,6 +53,33 @@ class DatabaseService:
             await conn.run_sync(Base.metadata.create_all)
             logger.info("Database tables created successfully")
     
+    async def get_schema_revision(self) -> Optional[str]:
+        """Текущая ревизия Alembic в БД (None - миграции не применялись)"""
+        try:
+            async with self.engine.connect() as conn:
+                result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+                return result.scalar()
+        except ProgrammingError:
+            # Таблицы alembic_version нет
+            return None
+    
+    async def check_schema_revision(self) -> str:
+        """
+        Проверка, что к БД применены все миграции кода
+        
+        Один запрос вместо create_all, который при каждом запуске читает
+        структуру всех таблиц. Схему меняет только `alembic upgrade head`.
+        """
+        heads = get_migrations_heads()
+        revision = await self.get_schema_revision()
+        if revision not in heads:
+            raise SchemaRevisionError(
+                f"Database schema revision {revision} does not match migrations head "
+                f"{', '.join(heads)}; run `alembic upgrade head`"
+            )
+        logger.info(f"Database schema is at revision {revision}")
+        return revision
+    
     async def drop_tables(self):
         """Удаление всех таблиц"""
         async with self.engine.begin() as conn:
@@ -46,5 +100,5 @@ class DatabaseService:
         logger.info("Database connection closed")
 
 
-# Глобальный экземпляр сервиса базы данных
-db_service = DatabaseService()
\ No newline at end of file
+# Глобальный экземпляр сервиса базы данных (движок создается при первом обращении)
+db_service = services.register("db", DatabaseService)
\ No newline at end of file
@@ -0,0 +1,132 @@
+"""
+Локальная фейковая модель Gemini
+
+Повторяет интерфейс google.generativeai.GenerativeModel в той части,
+которую использует GeminiService, и считает токены так же, как это
+делает API (prompt / candidates / cached_content). Позволяет проверять
+учет токенов и кэширование контекста без сети и API-ключа
+(GEMINI_BACKEND=fake).
+"""
+import re
+from dataclasses import dataclass
+from itertools import count
+from typing import Callable, Optional
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_cache_ids = count(1)
+
+
+def count_tokens(text: str) -> int:
+    """Приблизительный подсчет токенов: слова и знаки препинания"""
+    return len(_TOKEN_RE.findall(text or ""))
+
+
+def _content_text(contents) -> str:
+    """Склейка текста из contents (строка, список строк или список реплик)"""
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for item in contents or []:
+        if isinstance(item, str):
+            parts.append(item)
+        elif isinstance(item, dict):
+            parts.extend(str(part) for part in item.get("parts", []))
+    return "\n".join(parts)
+
+
+@dataclass
+class FakeUsageMetadata:
+    prompt_token_count: int
+    candidates_token_count: int
+    total_token_count: int
+    cached_content_token_count: int = 0
+
+
+@dataclass
+class FakeResponse:
+    text: str
+    usage_metadata: FakeUsageMetadata
+
+
+@dataclass
+class FakeCachedContent:
+    name: str
+    model: str
+    system_instruction: str
+    token_count: int
+
+
+class FakeGenerativeModel:
+    """Фейковая модель: отвечает через responder и возвращает usage_metadata"""
+
+    def __init__(
+        self,
+        model_name: str,
+        system_instruction: Optional[str] = None,
+        cached_content: Optional[FakeCachedContent] = None,
+        responder: Optional[Callable[[str, str], str]] = None,
+        api_key: Optional[str] = None
+    ):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.system_instruction = system_instruction
+        self.cached_content = cached_content
+        self.responder = responder or (lambda system, prompt: f"[{model_name}] {prompt[-200:]}")
+        self.calls = []
+
+    async def generate_content_async(self, contents, safety_settings=None, generation_config=None, **kwargs):
+        prompt_text = _content_text(contents)
+        system_text = self.system_instruction or ""
+        cached_tokens = 0
+
+        if self.cached_content is not None:
+            # Закэшированная инструкция не передается в запросе, но учитывается как cached_content
+            system_text = self.cached_content.system_instruction
+            cached_tokens = self.cached_content.token_count
+
+        text = self.responder(system_text, prompt_text)
+        prompt_tokens = count_tokens(system_text) + count_tokens(prompt_text)
+        output_tokens = count_tokens(text)
+
+        self.calls.append({"contents": contents, "generation_config": generation_config})
+        return FakeResponse(
+            text=text,
+            usage_metadata=FakeUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+                cached_content_token_count=cached_tokens
+            )
+        )
+
+
+class FakeModelBackend:
+    """Бэкенд GeminiService, создающий фейковые модели"""
+
+    def __init__(self, responder: Optional[Callable[[str, str], str]] = None):
+        self.responder = responder
+        self.cached_contents = []
+
+    def create_model(self, model_name: str, system_instruction: Optional[str] = None, api_key: Optional[str] = None):
+        return FakeGenerativeModel(
+            model_name,
+            system_instruction=system_instruction,
+            responder=self.responder,
+            api_key=api_key
+        )
+
+    async def create_cached_model(
+        self,
+        model_name: str,
+        system_instruction: str,
+        ttl_seconds: int,
+        api_key: Optional[str] = None
+    ):
+        cached = FakeCachedContent(
+            name=f"cachedContents/fake-{next(_cache_ids)}",
+            model=model_name,
+            system_instruction=system_instruction,
+            token_count=count_tokens(system_instruction)
+        )
+        self.cached_contents.append(cached)
+        return FakeGenerativeModel(model_name, cached_content=cached, responder=self.responder, api_key=api_key)
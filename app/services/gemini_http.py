@@ -0,0 +1,198 @@
+"""
+Бэкенд GeminiService на REST API Gemini через общий пул HTTP-соединений
+
+Все модели и ключи работают через один httpx.AsyncClient: соединения
+переиспользуются (keep-alive), при поддержке сервером используется HTTP/2
+(несколько запросов в одном соединении), размеры пула задаются настройками.
+Интерфейс моделей совпадает с google.generativeai в той части, которую
+использует GeminiService (GEMINI_BACKEND=http).
+"""
+from dataclasses import dataclass
+from typing import Optional
+import httpx
+from config.settings import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Общий HTTP-клиент (создается при первом обращении)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=settings.gemini_http_base_url,
+            http2=settings.gemini_http2,
+            limits=httpx.Limits(
+                max_connections=settings.gemini_http_max_connections,
+                max_keepalive_connections=settings.gemini_http_max_keepalive_connections,
+                keepalive_expiry=settings.gemini_http_keepalive_expiry_seconds
+            ),
+            # Общий таймаут запроса задает GeminiService, здесь - только установка соединения
+            timeout=httpx.Timeout(None, connect=settings.gemini_http_connect_timeout_seconds)
+        )
+        logger.info(
+            f"Created Gemini HTTP client: {settings.gemini_http_base_url}, http2={settings.gemini_http2}, "
+            f"max_connections={settings.gemini_http_max_connections}"
+        )
+    return _client
+
+
+async def close_http_client() -> None:
+    """Закрытие общего HTTP-клиента"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+class GeminiHTTPError(Exception):
+    """Ошибка ответа REST API (status_code - для распознавания 429)"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"{status_code} {message}")
+        self.status_code = status_code
+
+
+@dataclass
+class HttpUsageMetadata:
+    prompt_token_count: int = 0
+    candidates_token_count: int = 0
+    total_token_count: int = 0
+    cached_content_token_count: int = 0
+
+
+class HttpResponse:
+    """Ответ generateContent с полями как у ответа SDK"""
+
+    def __init__(self, data: dict):
+        self.data = data
+        usage = data.get("usageMetadata", {})
+        self.usage_metadata = HttpUsageMetadata(
+            prompt_token_count=usage.get("promptTokenCount", 0),
+            candidates_token_count=usage.get("candidatesTokenCount", 0),
+            total_token_count=usage.get("totalTokenCount", 0),
+            cached_content_token_count=usage.get("cachedContentTokenCount", 0)
+        )
+
+    @property
+    def text(self) -> str:
+        candidates = self.data.get("candidates") or []
+        parts = candidates[0].get("content", {}).get("parts", []) if candidates else []
+        if not parts:
+            # Как и SDK: заблокированный или пустой ответ не имеет текста
+            reason = self.data.get("promptFeedback", {}).get("blockReason") or "no candidates"
+            raise ValueError(f"Response has no text ({reason})")
+        return "".join(part.get("text", "") for part in parts)
+
+
+def _to_api_contents(contents) -> list:
+    """contents в формате REST API: [{"role", "parts": [{"text"}]}]"""
+    if isinstance(contents, str):
+        return [{"role": "user", "parts": [{"text": contents}]}]
+    result = []
+    for item in contents:
+        if isinstance(item, str):
+            result.append({"role": "user", "parts": [{"text": item}]})
+        else:
+            parts = [part if isinstance(part, dict) else {"text": str(part)} for part in item["parts"]]
+            result.append({"role": item.get("role", "user"), "parts": parts})
+    return result
+
+
+def _to_api_schema(schema: dict) -> dict:
+    """Схема ответа в формате REST API (типы в верхнем регистре)"""
+    result = {}
+    for key, value in schema.items():
+        if key == "type":
+            result[key] = value.upper()
+        elif key == "properties":
+            result[key] = {name: _to_api_schema(prop) for name, prop in value.items()}
+        elif key == "items":
+            result[key] = _to_api_schema(value)
+        else:
+            result[key] = value
+    return result
+
+
+def _to_api_generation_config(generation_config: Optional[dict]) -> Optional[dict]:
+    if not generation_config:
+        return None
+    result = {}
+    for key, value in generation_config.items():
+        if key == "response_schema":
+            value = _to_api_schema(value)
+        head, *tail = key.split("_")
+        result[head + "".join(word.title() for word in tail)] = value
+    return result
+
+
+class HttpGenerativeModel:
+    """Модель Gemini, вызываемая через общий HTTP-клиент"""
+
+    def __init__(
+        self,
+        model_name: str,
+        api_key: str,
+        system_instruction: Optional[str] = None,
+        cached_content: Optional[str] = None
+    ):
+        self.model_name = model_name
+        self.api_key = api_key
+        self.system_instruction = system_instruction
+        self.cached_content = cached_content
+
+    async def generate_content_async(self, contents, safety_settings=None, generation_config=None, **kwargs):
+        body = {"contents": _to_api_contents(contents)}
+        if self.cached_content:
+            body["cachedContent"] = self.cached_content
+        elif self.system_instruction:
+            body["systemInstruction"] = {"parts": [{"text": self.system_instruction}]}
+        if safety_settings:
+            body["safetySettings"] = safety_settings
+        api_generation_config = _to_api_generation_config(generation_config)
+        if api_generation_config:
+            body["generationConfig"] = api_generation_config
+
+        response = await get_http_client().post(
+            f"/v1beta/models/{self.model_name}:generateContent",
+            json=body,
+            headers={"x-goog-api-key": self.api_key}
+        )
+        if response.status_code != 200:
+            raise GeminiHTTPError(response.status_code, response.text[:500])
+        return HttpResponse(response.json())
+
+
+class HttpModelBackend:
+    """Бэкенд GeminiService на REST API через общий пул соединений"""
+
+    def create_model(self, model_name: str, system_instruction: Optional[str] = None, api_key: Optional[str] = None):
+        return HttpGenerativeModel(
+            model_name,
+            api_key or settings.gemini_api_key,
+            system_instruction=system_instruction
+        )
+
+    async def create_cached_model(
+        self,
+        model_name: str,
+        system_instruction: str,
+        ttl_seconds: int,
+        api_key: Optional[str] = None
+    ):
+        api_key = api_key or settings.gemini_api_key
+        response = await get_http_client().post(
+            "/v1beta/cachedContents",
+            json={
+                "model": f"models/{model_name}",
+                "systemInstruction": {"parts": [{"text": system_instruction}]},
+                "ttl": f"{ttl_seconds}s"
+            },
+            headers={"x-goog-api-key": api_key}
+        )
+        if response.status_code != 200:
+            raise GeminiHTTPError(response.status_code, response.text[:500])
+        return HttpGenerativeModel(model_name, api_key, cached_content=response.json()["name"])
@@ -0,0 +1,176 @@
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from config.settings import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+QUOTA_WINDOW_SECONDS = 60
+
+
+class NoAvailableKeyError(Exception):
+    """Все ключи API на карантине или исчерпали квоту"""
+    pass
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Ответ 429 / RESOURCE_EXHAUSTED от API (по типу исключения или коду статуса, не по тексту)"""
+    try:
+        from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+        if isinstance(error, (ResourceExhausted, TooManyRequests)):
+            return True
+    except ImportError:
+        pass
+    # google.api_core - code, бэкенд http - status_code
+    for attribute in ("code", "status_code"):
+        if getattr(error, attribute, None) == 429:
+            return True
+    return False
+
+
+def mask_key(api_key: str) -> str:
+    """Безопасное для логов представление ключа"""
+    return f"...{api_key[-4:]}" if len(api_key) > 4 else "***"
+
+
+class ApiKeyState:
+    """Учет использования одного ключа API"""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.key_id = mask_key(api_key)
+        self.requests = deque()  # время запросов за окно квоты
+        self.tokens = deque()  # (время, токены) за окно квоты
+        self.quarantined_until = 0.0
+        self.consecutive_rate_limits = 0
+
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.total_rate_limited = 0
+
+    def _trim(self, now: float) -> None:
+        threshold = now - QUOTA_WINDOW_SECONDS
+        while self.requests and self.requests[0] < threshold:
+            self.requests.popleft()
+        while self.tokens and self.tokens[0][0] < threshold:
+            self.tokens.popleft()
+
+    def requests_in_window(self, now: float) -> int:
+        self._trim(now)
+        return len(self.requests)
+
+    def tokens_in_window(self, now: float) -> int:
+        self._trim(now)
+        return sum(tokens for _, tokens in self.tokens)
+
+    def is_quarantined(self, now: float) -> bool:
+        return now < self.quarantined_until
+
+
+class ApiKeyPool:
+    """
+    Пул ключей Gemini API
+
+    Запрос получает ключ с наибольшим остатком поминутной квоты
+    (запросы и токены). Ключ, получивший 429, уходит на карантин
+    с экспоненциально растущей паузой; успешный запрос сбрасывает паузу.
+    Лимит 0 означает, что квота не задана, и ключи выбираются
+    по наименьшему числу запросов за окно.
+    """
+
+    def __init__(
+        self,
+        api_keys: List[str],
+        rpm_limit: int = 0,
+        tpm_limit: int = 0,
+        quarantine_seconds: int = 30,
+        max_quarantine_seconds: int = 600
+    ):
+        self.keys = [ApiKeyState(api_key) for api_key in dict.fromkeys(api_keys) if api_key]
+        self.rpm_limit = rpm_limit
+        self.tpm_limit = tpm_limit
+        self.quarantine_seconds = quarantine_seconds
+        self.max_quarantine_seconds = max_quarantine_seconds
+
+    def _remaining_share(self, key: ApiKeyState, now: float) -> float:
+        """Доля оставшейся квоты ключа (1.0 - квота не задана)"""
+        shares = [1.0]
+        if self.rpm_limit:
+            shares.append(1 - key.requests_in_window(now) / self.rpm_limit)
+        if self.tpm_limit:
+            shares.append(1 - key.tokens_in_window(now) / self.tpm_limit)
+        return min(shares)
+
+    def acquire(self) -> ApiKeyState:
+        """Выбор ключа для запроса"""
+        now = time.monotonic()
+        best: Optional[ApiKeyState] = None
+        best_score = None
+
+        for key in self.keys:
+            if key.is_quarantined(now):
+                continue
+            share = self._remaining_share(key, now)
+            if share <= 0:
+                continue
+            score = (share, -key.requests_in_window(now))
+            if best_score is None or score > best_score:
+                best, best_score = key, score
+
+        if best is None:
+            raise NoAvailableKeyError("All Gemini API keys are rate limited or out of quota")
+
+        best.requests.append(now)
+        best.total_requests += 1
+        return best
+
+    def record_usage(self, key: ApiKeyState, tokens: int) -> None:
+        """Учет успешного запроса и потраченных токенов"""
+        key.consecutive_rate_limits = 0
+        if tokens:
+            key.tokens.append((time.monotonic(), tokens))
+            key.total_tokens += tokens
+
+    def record_rate_limited(self, key: ApiKeyState) -> None:
+        """Карантин ключа после 429 с экспоненциальной паузой"""
+        key.consecutive_rate_limits += 1
+        key.total_rate_limited += 1
+        pause = min(
+            self.quarantine_seconds * 2 ** (key.consecutive_rate_limits - 1),
+            self.max_quarantine_seconds
+        )
+        key.quarantined_until = time.monotonic() + pause
+        logger.warning(f"Gemini API key {key.key_id} rate limited, quarantined for {pause}s")
+
+    def get_stats(self) -> Dict[str, dict]:
+        """Использование ключей"""
+        now = time.monotonic()
+        return {
+            key.key_id: {
+                "quarantined": key.is_quarantined(now),
+                "quarantine_left": max(0, round(key.quarantined_until - now, 1)),
+                "requests_last_minute": key.requests_in_window(now),
+                "tokens_last_minute": key.tokens_in_window(now),
+                "total_requests": key.total_requests,
+                "total_tokens": key.total_tokens,
+                "rate_limited": key.total_rate_limited
+            }
+            for key in self.keys
+        }
+
+
+def get_configured_keys() -> List[str]:
+    """Основной ключ и дополнительные ключи из настроек"""
+    extra_keys = [key.strip() for key in settings.gemini_api_keys.split(",") if key.strip()]
+    return [settings.gemini_api_key] + extra_keys
+
+
+# Общий пул ключей для всех экземпляров GeminiService
+gemini_key_pool = ApiKeyPool(
+    get_configured_keys(),
+    rpm_limit=settings.gemini_key_rpm_limit,
+    tpm_limit=settings.gemini_key_tpm_limit,
+    quarantine_seconds=settings.gemini_key_quarantine_seconds,
+    max_quarantine_seconds=settings.gemini_key_max_quarantine_seconds
+)
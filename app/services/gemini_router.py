@@ -0,0 +1,169 @@
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Перцентиль по отсортированной выборке (None для пустой выборки)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class ModelStats:
+    """Скользящее окно задержек и ошибок одной модели"""
+
+    def __init__(self, window_size: int = 200, window_seconds: int = 300):
+        self.window_seconds = window_seconds
+        self.samples = deque(maxlen=window_size)  # (timestamp, latency, ok)
+        self.total_requests = 0
+        self.total_errors = 0
+
+    def record(self, latency: float, ok: bool) -> None:
+        self.samples.append((time.monotonic(), latency, ok))
+        self.total_requests += 1
+        if not ok:
+            self.total_errors += 1
+
+    def _recent(self) -> list:
+        """Отбрасывание устаревших замеров"""
+        threshold = time.monotonic() - self.window_seconds
+        while self.samples and self.samples[0][0] < threshold:
+            self.samples.popleft()
+        return list(self.samples)
+
+    def latency_percentile(self, pct: float) -> Optional[float]:
+        return percentile([latency for _, latency, ok in self._recent() if ok], pct)
+
+    def error_rate(self) -> float:
+        recent = self._recent()
+        if not recent:
+            return 0.0
+        return sum(1 for _, _, ok in recent if not ok) / len(recent)
+
+    def sample_count(self) -> int:
+        return len(self._recent())
+
+
+@dataclass(frozen=True)
+class CallPolicy:
+    """Ограничения одного типа вызова модели"""
+    deadline_seconds: float  # Общий дедлайн вызова, включая переключения на запасные модели
+    hedge: bool = False  # Дублировать запрос в следующую модель, если первая отвечает дольше p90
+    hedge_default_delay: float = 2.0  # Задержка дублирования, пока у модели нет замеров
+    hedge_min_delay: float = 0.3
+
+    def get_hedge_delay(self, p90_latency: Optional[float]) -> float:
+        """Задержка перед дублирующим запросом по p90 задержки модели"""
+        if p90_latency is None:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, p90_latency)
+
+
+class GeminiModelRouter:
+    """
+    Маршрутизатор запросов между моделями Gemini
+
+    Для каждой модели ведется скользящее окно задержек и ошибок.
+    Запрос идет в самую быструю (по p95) здоровую модель, при ошибке
+    или таймауте - в следующую. Модели с высокой долей ошибок уходят
+    в конец очереди и остаются запасным вариантом, пока окно не очистится.
+
+    Модели без достаточного числа замеров (запасные, которые еще не
+    вызывались, или чье окно очистилось) иначе никогда не оказались бы
+    первыми. Поэтому доля запросов explore_ratio отправляется первой в
+    такую модель - по ее ответам набирается p95 для честной сортировки.
+    """
+
+    def __init__(
+        self,
+        models: List[str],
+        max_error_rate: float = 0.5,
+        explore_ratio: float = 0.05,
+        min_samples: int = 5,
+        window_size: int = 200,
+        window_seconds: int = 300
+    ):
+        # Сохраняем порядок и убираем дубли: порядок - приоритет при равных условиях
+        self.models = list(dict.fromkeys(models))
+        self.max_error_rate = max_error_rate
+        self.explore_ratio = explore_ratio
+        self.min_samples = min_samples
+        self.stats: Dict[str, ModelStats] = {
+            model: ModelStats(window_size, window_seconds) for model in self.models
+        }
+
+    def record(self, model: str, latency: float, ok: bool) -> None:
+        """Запись результата запроса к модели"""
+        stats = self.stats.get(model)
+        if stats is None:
+            return
+        stats.record(latency, ok)
+        if not ok:
+            logger.debug(f"Gemini model {model} error, error rate {stats.error_rate():.2f}")
+
+    def latency_percentile(self, model: str, pct: float) -> Optional[float]:
+        """Перцентиль задержки успешных запросов модели"""
+        return self.stats[model].latency_percentile(pct)
+
+    def is_healthy(self, model: str) -> bool:
+        stats = self.stats[model]
+        if stats.sample_count() < self.min_samples:
+            return True
+        return stats.error_rate() <= self.max_error_rate
+
+    def is_measured(self, model: str) -> bool:
+        """Достаточно замеров, чтобы сравнивать модель по p95"""
+        return self.stats[model].sample_count() >= self.min_samples
+
+    def get_order(self) -> List[str]:
+        """
+        Порядок обхода моделей: здоровые по возрастанию p95, затем нездоровые
+
+        С вероятностью explore_ratio первой идет пробная модель - здоровая
+        модель без достаточного числа замеров (с наивысшим приоритетом).
+        """
+        def sort_key(item):
+            priority, model = item
+            p95 = self.stats[model].latency_percentile(95)
+            # Модели без замеров идут после измеренных, в порядке приоритета
+            return (p95 if p95 is not None else float("inf"), priority)
+
+        indexed = list(enumerate(self.models))
+        healthy = [item for item in indexed if self.is_healthy(item[1])]
+        unhealthy = [item for item in indexed if not self.is_healthy(item[1])]
+
+        ordered = sorted(healthy, key=sort_key) + sorted(unhealthy, key=lambda item: item[0])
+        order = [model for _, model in ordered]
+
+        unmeasured = [model for _, model in healthy if model != order[0] and not self.is_measured(model)]
+        if unmeasured and random.random() < self.explore_ratio:
+            probe = min(unmeasured, key=self.models.index)
+            order.remove(probe)
+            order.insert(0, probe)
+            logger.debug(f"Gemini router probing unmeasured model {probe}")
+        return order
+
+    def get_stats(self) -> Dict[str, dict]:
+        """Статистика по моделям"""
+        result = {}
+        for model in self.models:
+            stats = self.stats[model]
+            result[model] = {
+                "healthy": self.is_healthy(model),
+                "requests": stats.total_requests,
+                "errors": stats.total_errors,
+                "window_samples": stats.sample_count(),
+                "error_rate": round(stats.error_rate(), 3),
+                "p50_latency": stats.latency_percentile(50),
+                "p90_latency": stats.latency_percentile(90),
+                "p95_latency": stats.latency_percentile(95)
+            }
+        return result
@@ -1,35 +1,157 @@
-import google.generativeai as genai
 from config.settings import settings
+from app.services.container import services
 from app.models import GirlfriendProfile
-from typing import Optional
+from app.services.persona_prompt_service import CompiledPersona
+from app.services.gemini_router import CallPolicy, GeminiModelRouter
+from app.services.circuit_breaker import CircuitOpenError, gemini_circuit_breaker
+from app.services.gemini_key_pool import ApiKeyState, NoAvailableKeyError, gemini_key_pool, is_rate_limit_error
+from app.services.response_cache_service import make_cache_key, normalize_chat_prompt, response_cache_service
+from app.services.moderation_service import moderation_service
+from app.services.profile_schema import InvalidProfileOutput, PROFILE_GENERATION_CONFIG, parse_profile
+from app.services.metrics import (
+    GEMINI_ATTEMPT_SECONDS, GEMINI_CALL_ERRORS, GEMINI_CALL_SECONDS, record_gemini_usage
+)
+from app.services.tracing import traced
+from opentelemetry import trace
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple, Union
+import asyncio
+import hashlib
 import logging
 import json
-import re
+import time
 
 logger = logging.getLogger(__name__)
 
-# Настройка Gemini API
-genai.configure(api_key=settings.gemini_api_key)
+# За сколько секунд до истечения TTL кэша контекста модель персонажа пересоздается
+CONTEXT_CACHE_REFRESH_MARGIN_SECONDS = 300
 
-def extract_json_from_markdown(text: str) -> str:
-    """Извлечение JSON из markdown блока кода"""
-    # Поиск JSON в блоке кода ```json...```
-    json_match = re.search(r'```(?:json)?\s*\n?({[^`]+})\s*\n?```', text, re.DOTALL)
-    if json_match:
-        return json_match.group(1).strip()
-    
-    # Поиск JSON в обычном блоке кода ```...```
-    code_match = re.search(r'```\s*\n?({[^`]+})\s*\n?```', text, re.DOTALL)
-    if code_match:
-        return code_match.group(1).strip()
-    
-    # Поиск JSON объекта в тексте
-    json_object_match = re.search(r'({\s*"[^}]+})', text, re.DOTALL)
-    if json_object_match:
-        return json_object_match.group(1).strip()
-    
-    # Если ничего не найдено, возвращаем исходный текст
-    return text.strip()
+class GoogleModelBackend:
+    """Бэкенд GeminiService на SDK google.generativeai"""
+
+    def __init__(self):
+        # SDK импортируется и настраивается при создании бэкенда, а не при импорте модуля
+        import google.generativeai as genai
+        import google.ai.generativelanguage as glm
+        genai.configure(api_key=settings.gemini_api_key)
+        self._genai = genai
+        self._glm = glm
+
+        # Клиенты API по ключам: SDK хранит один глобальный ключ, поэтому
+        # для пула ключей клиенты создаются явно и подставляются в модель
+        self._generative_clients = {}
+        self._cache_clients = {}
+
+    def _get_generative_client(self, api_key: str):
+        client = self._generative_clients.get(api_key)
+        if client is None:
+            client = self._glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+            self._generative_clients[api_key] = client
+        return client
+
+    def _get_cache_client(self, api_key: str):
+        client = self._cache_clients.get(api_key)
+        if client is None:
+            client = self._glm.CacheServiceClient(client_options={"api_key": api_key})
+            self._cache_clients[api_key] = client
+        return client
+
+    def _bind_key(self, model, api_key: Optional[str]):
+        if api_key:
+            model._async_client = self._get_generative_client(api_key)
+        return model
+
+    def create_model(self, model_name: str, system_instruction: Optional[str] = None, api_key: Optional[str] = None):
+        model = self._genai.GenerativeModel(model_name, system_instruction=system_instruction)
+        return self._bind_key(model, api_key)
+
+    async def create_cached_model(
+        self,
+        model_name: str,
+        system_instruction: str,
+        ttl_seconds: int,
+        api_key: Optional[str] = None
+    ):
+        if api_key:
+            # Кэш контекста принадлежит проекту ключа - создаем его тем же ключом
+            request = self._genai.caching.CachedContent._prepare_create_request(
+                model=f"models/{model_name}",
+                system_instruction=system_instruction,
+                ttl=timedelta(seconds=ttl_seconds)
+            )
+            # Создание кэша - синхронный вызов SDK, выносим его из event loop
+            response = await asyncio.to_thread(self._get_cache_client(api_key).create_cached_content, request)
+            cached_content = self._genai.caching.CachedContent._from_obj(response)
+        else:
+            cached_content = await asyncio.to_thread(
+                self._genai.caching.CachedContent.create,
+                model=f"models/{model_name}",
+                system_instruction=system_instruction,
+                ttl=timedelta(seconds=ttl_seconds)
+            )
+        return self._bind_key(self._genai.GenerativeModel.from_cached_content(cached_content), api_key)
+
+
+def create_model_backend():
+    """Выбор бэкенда моделей согласно настройкам"""
+    if settings.gemini_backend == "fake":
+        from app.services.gemini_fake import FakeModelBackend
+        return FakeModelBackend()
+    if settings.gemini_backend == "http":
+        from app.services.gemini_http import HttpModelBackend
+        return HttpModelBackend()
+    return GoogleModelBackend()
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов без обращения к API (~4 символа на токен)"""
+    return len(text) // 4
+
+
+def is_cached_content_missing(error: Exception) -> bool:
+    """Кэш контекста удален на стороне API (истек TTL) - модель нужно пересоздать"""
+    try:
+        from google.api_core.exceptions import NotFound
+        if isinstance(error, NotFound):
+            return True
+    except ImportError:
+        pass
+    text = str(error).lower()
+    return "cachedcontent" in text and ("404" in text or "not found" in text or "expired" in text)
+
+
+def get_router_models() -> List[str]:
+    """Основная модель и запасные модели из настроек"""
+    fallbacks = [name.strip() for name in settings.gemini_fallback_models.split(",") if name.strip()]
+    return [settings.gemini_model] + fallbacks
+
+
+def get_call_policy(call_type: str) -> CallPolicy:
+    """Дедлайн и дублирование запросов для типа вызова (chat или profile)"""
+    if call_type == "profile":
+        return CallPolicy(
+            deadline_seconds=settings.gemini_profile_deadline_seconds,
+            hedge=settings.gemini_profile_hedge,
+            hedge_default_delay=settings.gemini_hedge_default_delay_seconds,
+            hedge_min_delay=settings.gemini_hedge_min_delay_seconds
+        )
+    return CallPolicy(
+        deadline_seconds=settings.gemini_chat_deadline_seconds,
+        hedge=settings.gemini_chat_hedge,
+        hedge_default_delay=settings.gemini_hedge_default_delay_seconds,
+        hedge_min_delay=settings.gemini_hedge_min_delay_seconds
+    )
+
+
+class AllModelsFailedError(Exception):
+    """Ни одна модель не вернула ответ"""
+    pass
+
+
+class DeadlineExceededError(AllModelsFailedError):
+    """Модели не ответили до дедлайна вызова"""
+    pass
 
 
 class GeminiService:
@@ -38,7 +160,9 @@ class GeminiService:
         "gemini-pro": {
             "name": "Gemini Pro",
             "description": "Базовая модель с хорошим качеством",
-            "recommended_for": "general"
+            "recommended_for": "general",
+            "supports_system_instruction": False,
+            "supports_json_mode": False
         },
         "gemini-1.5-pro": {
             "name": "Gemini 1.5 Pro",
@@ -57,7 +181,7 @@ class GeminiService:
         }
     }
     
-    def __init__(self):
+    def __init__(self, backend=None):
         # Проверяем, что модель поддерживается
         if settings.gemini_model not in self.AVAILABLE_MODELS:
             logger.warning(
@@ -65,12 +189,41 @@ class GeminiService:
                 f"Supported models: {list(self.AVAILABLE_MODELS.keys())}"
             )
         
-        self.model = genai.GenerativeModel(settings.gemini_model)
+        self.backend = backend or create_model_backend()
+        self.router = GeminiModelRouter(
+            get_router_models(),
+            max_error_rate=settings.gemini_router_max_error_rate,
+            explore_ratio=settings.gemini_router_explore_ratio
+        )
+        for model_name in self.router.models[1:]:
+            if model_name not in self.AVAILABLE_MODELS:
+                logger.warning(f"Fallback model {model_name} not in supported list")
+        
+        # Модели без системной инструкции, по одной на пару (модель, ключ API)
+        self._models = {}
+        self.breaker = gemini_circuit_breaker
+        self.key_pool = gemini_key_pool
+        self.response_cache = response_cache_service
         model_info = self.AVAILABLE_MODELS.get(settings.gemini_model, {})
         logger.info(
             f"Initialized Gemini service with model: {settings.gemini_model} "
-            f"({model_info.get('name', 'Unknown')})"
+            f"({model_info.get('name', 'Unknown')}), fallbacks: {self.router.models[1:]}"
         )
+        
+        # Модели с системной инструкцией персонажа (ключ - хэш промпта):
+        # модель и момент пересоздания (для кэша контекста - до истечения его TTL)
+        self._persona_models: "OrderedDict[str, Tuple[object, Optional[float]]]" = OrderedDict()
+        self._persona_models_lock = asyncio.Lock()
+        self.max_persona_models = 512
+        
+        # Учет токенов по usage_metadata ответов
+        self.token_usage = {
+            "requests": 0,
+            "prompt_tokens": 0,
+            "output_tokens": 0,
+            "cached_tokens": 0
+        }
+        
         self.safety_settings = [
             {
                 "category": "HARM_CATEGORY_HARASSMENT",
@@ -90,43 +243,453 @@ class GeminiService:
             }
         ]
     
+    def _get_model(self, model_name: str, api_key: str):
+        """Модель без системной инструкции для ключа API"""
+        model = self._models.get((model_name, api_key))
+        if model is None:
+            model = self.backend.create_model(model_name, api_key=api_key)
+            self._models[(model_name, api_key)] = model
+        return model
+    
+    @staticmethod
+    def _persona_model_key(system_prompt: str, model_name: str, api_key: str) -> str:
+        return hashlib.sha1(f"{model_name}:{api_key}:{system_prompt}".encode("utf-8")).hexdigest()
+    
+    def _get_fresh_persona_model(self, key: str):
+        """Модель из кэша, если ее кэш контекста еще не подходит к концу TTL"""
+        entry = self._persona_models.get(key)
+        if entry is None:
+            return None
+        model, refresh_at = entry
+        if refresh_at is not None and time.monotonic() >= refresh_at:
+            return None
+        self._persona_models.move_to_end(key)
+        return model
+    
+    def _evict_persona_model(self, system_prompt: str, model_name: str, api_key: str) -> None:
+        """Удаление модели, чей кэш контекста уже удален на стороне API"""
+        key = self._persona_model_key(system_prompt, model_name, api_key)
+        if self._persona_models.pop(key, None) is not None:
+            logger.info(f"Cached content for persona prompt {key[:8]} expired, will be recreated")
+    
+    async def _get_persona_model(self, system_prompt: str, model_name: str, api_key: str):
+        """Модель с системной инструкцией персонажа (с кэшем контекста для длинных промптов)"""
+        key = self._persona_model_key(system_prompt, model_name, api_key)
+        
+        model = self._get_fresh_persona_model(key)
+        if model is not None:
+            return model
+        
+        async with self._persona_models_lock:
+            model = self._get_fresh_persona_model(key)
+            if model is not None:
+                return model
+            
+            refresh_at = None
+            if (
+                settings.gemini_enable_context_cache
+                and estimate_tokens(system_prompt) >= settings.gemini_context_cache_min_tokens
+            ):
+                # Длинный персонаж: инструкция хранится на стороне API и не тарифицируется целиком
+                ttl_seconds = settings.gemini_context_cache_ttl_minutes * 60
+                try:
+                    model = await self.backend.create_cached_model(
+                        model_name,
+                        system_prompt,
+                        ttl_seconds,
+                        api_key=api_key
+                    )
+                    # Пересоздаем заранее, чтобы запрос не попал на уже удаленный кэш
+                    refresh_at = time.monotonic() + ttl_seconds - min(CONTEXT_CACHE_REFRESH_MARGIN_SECONDS, ttl_seconds / 2)
+                    logger.info(f"Created cached content for persona prompt {key[:8]}")
+                except Exception as e:
+                    logger.warning(f"Context caching unavailable, using system instruction: {e}")
+            
+            if model is None:
+                model = self.backend.create_model(model_name, system_instruction=system_prompt, api_key=api_key)
+            
+            self._persona_models[key] = (model, refresh_at)
+            self._persona_models.move_to_end(key)
+            while len(self._persona_models) > self.max_persona_models:
+                self._persona_models.popitem(last=False)
+            
+            return model
+    
+    @staticmethod
+    def _build_contents(user_message: str, history: Optional[List[dict]] = None) -> List[dict]:
+        """Преобразование истории в структурированные реплики contents"""
+        contents = []
+        for turn in history or []:
+            role = "model" if turn["role"] == "model" else "user"
+            # Соседние реплики одной роли объединяем - API ожидает чередование ролей
+            if contents and contents[-1]["role"] == role:
+                contents[-1]["parts"].append(turn["text"])
+            else:
+                contents.append({"role": role, "parts": [turn["text"]]})
+        
+        # Диалог должен начинаться с реплики пользователя
+        while contents and contents[0]["role"] != "user":
+            contents.pop(0)
+        
+        # Текущее сообщение могло уже попасть в историю (оно сохраняется до генерации)
+        if not contents or contents[-1]["role"] != "user":
+            contents.append({"role": "user", "parts": [user_message]})
+        elif contents[-1]["parts"][-1] != user_message:
+            contents[-1]["parts"].append(user_message)
+        
+        return contents
+    
+    def _record_usage(self, response) -> None:
+        """Учет токенов из usage_metadata ответа"""
+        usage = getattr(response, "usage_metadata", None)
+        self.token_usage["requests"] += 1
+        if usage is None:
+            return
+        self.token_usage["prompt_tokens"] += getattr(usage, "prompt_token_count", 0) or 0
+        self.token_usage["output_tokens"] += getattr(usage, "candidates_token_count", 0) or 0
+        self.token_usage["cached_tokens"] += getattr(usage, "cached_content_token_count", 0) or 0
+    
+    @staticmethod
+    def _get_response_text(response) -> Optional[str]:
+        """Текст ответа (None, если ответ заблокирован или пуст)"""
+        try:
+            return response.text
+        except ValueError:
+            return None
+    
+    def get_token_usage(self) -> dict:
+        """Получение накопленной статистики токенов"""
+        return dict(self.token_usage)
+    
+    def get_model_stats(self) -> dict:
+        """Статистика задержек и ошибок по моделям"""
+        return self.router.get_stats()
+    
+    def get_breaker_state(self) -> dict:
+        """Состояние предохранителя вызовов Gemini"""
+        return self.breaker.get_state()
+    
+    def get_key_usage(self) -> dict:
+        """Использование ключей API"""
+        return self.key_pool.get_stats()
+    
+    def get_response_cache_stats(self) -> dict:
+        """Попадания и промахи кэша ответов"""
+        return self.response_cache.get_stats()
+    
+    async def _prepare_request(self, model_name: str, api_key: str, contents, system_prompt: Optional[str]):
+        """Модель и contents запроса с учетом поддержки системных инструкций"""
+        if system_prompt is None:
+            return self._get_model(model_name, api_key), contents
+        
+        model_info = self.AVAILABLE_MODELS.get(model_name, {})
+        if model_info.get("supports_system_instruction", True):
+            return await self._get_persona_model(system_prompt, model_name, api_key), contents
+        
+        # Модель без системных инструкций - персонаж идет первой частью реплики пользователя
+        request_contents = [{"role": item["role"], "parts": list(item["parts"])} for item in contents]
+        request_contents[0]["parts"].insert(0, system_prompt)
+        return self._get_model(model_name, api_key), request_contents
+    
+    @traced("gemini.attempt")
+    async def _attempt(
+        self,
+        model_name: str,
+        contents,
+        system_prompt: Optional[str],
+        timeout: float,
+        generation_config: Optional[dict] = None
+    ):
+        """Одна попытка запроса к модели с записью результата в маршрутизатор и пул ключей"""
+        span = trace.get_current_span()
+        span.set_attribute("gemini.model", model_name)
+        started = time.monotonic()
+        try:
+            key: ApiKeyState = self.key_pool.acquire()
+            span.set_attribute("gemini.key", key.key_id)
+            model, request_contents = await self._prepare_request(model_name, key.api_key, contents, system_prompt)
+            if not self.AVAILABLE_MODELS.get(model_name, {}).get("supports_json_mode", True):
+                # Модель без структурированного вывода - формат задается только промптом
+                generation_config = None
+            response = await asyncio.wait_for(
+                model.generate_content_async(
+                    request_contents,
+                    safety_settings=self.safety_settings,
+                    generation_config=generation_config
+                ),
+                timeout=timeout
+            )
+        except asyncio.CancelledError:
+            # Отмену (проигравший дублирующий запрос, дедлайн) записывает _generate_with_fallback
+            raise
+        except NoAvailableKeyError:
+            # Все ключи на карантине - исчерпана наша квота, модель тут ни при чем
+            logger.warning(f"No Gemini API key available for model {model_name}")
+            raise
+        except Exception as e:
+            elapsed = time.monotonic() - started
+            if is_rate_limit_error(e):
+                # 429 - исчерпана квота ключа, а не сбой модели
+                self.key_pool.record_rate_limited(key)
+                GEMINI_ATTEMPT_SECONDS.labels(model_name, "rate_limited").observe(elapsed)
+            else:
+                self.router.record(model_name, elapsed, ok=False)
+                GEMINI_ATTEMPT_SECONDS.labels(model_name, "error").observe(elapsed)
+            if system_prompt is not None and is_cached_content_missing(e):
+                # Кэш контекста истек раньше срока - следующая попытка создаст его заново
+                self._evict_persona_model(system_prompt, model_name, key.api_key)
+            logger.warning(f"Gemini model {model_name} failed with key {key.key_id} ({type(e).__name__}: {e})")
+            raise
+        
+        elapsed = time.monotonic() - started
+        self.router.record(model_name, elapsed, ok=True)
+        GEMINI_ATTEMPT_SECONDS.labels(model_name, "ok").observe(elapsed)
+        usage = getattr(response, "usage_metadata", None)
+        self.key_pool.record_usage(key, getattr(usage, "total_token_count", 0) or 0)
+        record_gemini_usage(model_name, usage)
+        span.set_attribute("gemini.total_tokens", getattr(usage, "total_token_count", 0) or 0)
+        self._record_usage(response)
+        return response
+    
+    def _get_cache_keys(self, call_type: str, prompt: str) -> Dict[str, str]:
+        """Ключи кэша ответа для каждой модели цепочки (в порядке приоритета)"""
+        params = {"safety_settings": self.safety_settings}
+        return {model: make_cache_key(call_type, model, prompt, params) for model in self.router.models}
+    
+    def _record_cancelled_attempt(self, model_name: str, elapsed: float, outcome: Optional[str]) -> None:
+        """Запись отмененной попытки в маршрутизатор"""
+        if outcome is None:
+            # Вызов отменен снаружи - о модели это ничего не говорит
+            return
+        if outcome == "hedge_lost":
+            # Проигравший, который еще укладывался в свой p95 (или без замеров), - не ошибка модели
+            p95 = self.router.latency_percentile(model_name, 95)
+            if p95 is None or elapsed <= p95:
+                return
+        self.router.record(model_name, elapsed, ok=False)
+        GEMINI_ATTEMPT_SECONDS.labels(model_name, outcome).observe(elapsed)
+        logger.info(f"Gemini model {model_name} attempt cancelled after {elapsed:.2f}s ({outcome})")
+    
+    @traced("gemini.generate")
+    async def _generate(
+        self,
+        contents,
+        system_prompt: Optional[str] = None,
+        call_type: str = "chat",
+        generation_config: Optional[dict] = None
+    ):
+        """
+        Вызов Gemini через предохранитель: при недоступности API отказ без ожидания
+
+        Возвращает ответ и имя модели, которая его дала.
+        """
+        trace.get_current_span().set_attribute("gemini.call_type", call_type)
+        admission = self.breaker.allow_request()
+        if admission is None:
+            GEMINI_CALL_ERRORS.labels(call_type, CircuitOpenError.__name__).inc()
+            raise CircuitOpenError("Gemini circuit breaker is open")
+        
+        started = time.monotonic()
+        try:
+            response, model_name = await self._generate_with_fallback(contents, system_prompt, call_type, generation_config)
+        except asyncio.CancelledError:
+            self.breaker.release(admission)
+            raise
+        except NoAvailableKeyError:
+            # Нехватка квоты ключей - не сбой API, предохранитель не размыкаем
+            self.breaker.release(admission)
+            GEMINI_CALL_SECONDS.labels(call_type, "error").observe(time.monotonic() - started)
+            GEMINI_CALL_ERRORS.labels(call_type, NoAvailableKeyError.__name__).inc()
+            raise
+        except Exception as e:
+            self.breaker.record_failure(admission)
+            GEMINI_CALL_SECONDS.labels(call_type, "error").observe(time.monotonic() - started)
+            GEMINI_CALL_ERRORS.labels(call_type, type(e).__name__).inc()
+            raise
+        
+        self.breaker.record_success(admission)
+        GEMINI_CALL_SECONDS.labels(call_type, "ok").observe(time.monotonic() - started)
+        return response, model_name
+    
+    async def _generate_with_fallback(
+        self,
+        contents,
+        system_prompt: Optional[str],
+        call_type: str,
+        generation_config: Optional[dict] = None
+    ):
+        """
+        Запрос к моделям в порядке маршрутизатора (возвращает ответ и модель)
+        
+        Вызов ограничен дедлайном своего типа (chat / profile), каждая попытка -
+        еще и таймаутом запроса. При ошибке запрос уходит в следующую модель.
+        Если включено дублирование и текущая модель не ответила за свой p90,
+        параллельно запускается запрос к следующей модели: берется ответ,
+        пришедший первым, второй запрос отменяется.
+        
+        Отмененные попытки тоже попадают в маршрутизатор как ошибки: по
+        дедлайну - всегда, проигравший дублирующий запрос - если он уже
+        шел дольше своего p95. Иначе медленная модель не получала бы
+        замеров и оставалась бы первой в очереди.
+        """
+        policy = get_call_policy(call_type)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + policy.deadline_seconds
+        order = self.router.get_order()
+        pending = {}
+        started_at = {}
+        next_index = 0
+        hedged = False
+        last_error = None
+        # Все ли ошибки - нехватка квоты (429 или нет свободного ключа)
+        only_capacity_errors = True
+        # Почему остались незавершенные попытки: "hedge_lost" или "timeout" (None - отмена снаружи)
+        cancel_outcome = None
+        
+        def launch() -> None:
+            nonlocal next_index
+            model_name = order[next_index]
+            next_index += 1
+            timeout = min(settings.gemini_request_timeout_seconds, max(deadline - loop.time(), 0))
+            task = asyncio.create_task(
+                self._attempt(model_name, contents, system_prompt, timeout, generation_config)
+            )
+            pending[task] = model_name
+            started_at[task] = loop.time()
+        
+        try:
+            launch()
+            
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    cancel_outcome = "timeout"
+                    break
+                
+                can_hedge = policy.hedge and not hedged and len(pending) == 1 and next_index < len(order)
+                wait_timeout = remaining
+                if can_hedge:
+                    # Задержка дублирования - по p90 модели, которая сейчас отвечает
+                    [(in_flight, in_flight_model)] = pending.items()
+                    hedge_delay = policy.get_hedge_delay(self.router.latency_percentile(in_flight_model, 90))
+                    hedge_wait = max(started_at[in_flight] + hedge_delay - loop.time(), 0)
+                    wait_timeout = min(remaining, hedge_wait)
+                
+                done, _ = await asyncio.wait(pending, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                if not done:
+                    if can_hedge:
+                        hedged = True
+                        logger.info(
+                            f"Gemini model {in_flight_model} slower than {hedge_delay:.2f}s, "
+                            f"hedging to {order[next_index]}"
+                        )
+                        launch()
+                        continue
+                    cancel_outcome = "timeout"
+                    break
+                
+                for task in done:
+                    model_name = pending.pop(task)
+                    if task.exception() is None:
+                        cancel_outcome = "hedge_lost"
+                        return task.result(), model_name
+                    last_error = task.exception()
+                    if not isinstance(last_error, NoAvailableKeyError) and not is_rate_limit_error(last_error):
+                        only_capacity_errors = False
+                
+                # Ключей нет ни для одной модели - переключаться бессмысленно
+                if isinstance(last_error, NoAvailableKeyError) and not pending:
+                    break
+                
+                # Все запущенные попытки завершились ошибкой - переходим к следующей модели
+                if not pending and next_index < len(order):
+                    launch()
+        finally:
+            now = loop.time()
+            for task, model_name in pending.items():
+                task.cancel()
+                self._record_cancelled_attempt(model_name, now - started_at[task], cancel_outcome)
+        
+        if pending:
+            raise DeadlineExceededError(
+                f"Gemini call '{call_type}' exceeded deadline of {policy.deadline_seconds}s"
+            )
+        if only_capacity_errors:
+            raise NoAvailableKeyError(f"Gemini quota exhausted, last error: {last_error}") from last_error
+        raise AllModelsFailedError(f"All Gemini models failed, last error: {last_error}")
+    
     async def generate_response(
         self,
-        girlfriend_profile: GirlfriendProfile,
+        girlfriend_profile: Union[GirlfriendProfile, CompiledPersona],
         user_message: str,
-        conversation_context: Optional[str] = None
+        conversation_context: Optional[Union[str, List[dict]]] = None
     ) -> str:
-        """Генерация ответа от девушки"""
+        """
+        Генерация ответа от девушки
+        
+        Персонаж передается как системная инструкция, история - структурированными
+        репликами contents ([{"role": "user"|"model", "text": ...}]). Строковый
+        контекст (старый формат) добавляется к системной инструкции.
+        """
         try:
             # Создаем системный промпт
             system_prompt = girlfriend_profile.get_full_prompt()
+            history = None
             
-            # Добавляем контекст разговора если есть
-            if conversation_context:
+            if isinstance(conversation_context, str) and conversation_context:
                 system_prompt += f"\n\nКонтекст предыдущих сообщений:\n{conversation_context}"
+            elif isinstance(conversation_context, list):
+                history = conversation_context
             
-            # Формируем полный промпт
-            full_prompt = f"{system_prompt}\n\nПользователь написал: {user_message}\n\nОтветь как {girlfriend_profile.name}:"
+            contents = self._build_contents(user_message, history)
             
-            # Генерируем ответ
-            response = await self.model.generate_content_async(
-                full_prompt,
-                safety_settings=self.safety_settings
-            )
+            # Типовые реплики (приветствие и т.п.) отвечаются из кэша, если он включен
+            cache_keys = None
+            prompt_class = self.response_cache.is_chat_cacheable(user_message)
+            if prompt_class and not isinstance(conversation_context, str):
+                cache_keys = self._get_cache_keys(
+                    "chat",
+                    f"{system_prompt}\n{prompt_class}\n{normalize_chat_prompt(user_message)}"
+                )
+                cached_text = await self.response_cache.get_first("chat", list(cache_keys.values()))
+                if cached_text:
+                    return cached_text
             
-            if response.text:
+            # Генерируем ответ (с переключением на запасные модели)
+            response, model_name = await self._generate(contents, system_prompt, call_type="chat")
+            
+            # Заблокированный или пустой ответ - .text бросает ValueError
+            text = self._get_response_text(response)
+            if text:
                 logger.info(f"Generated response for profile {girlfriend_profile.name}")
-                return response.text.strip()
+                text = text.strip()
+                if cache_keys:
+                    await self.response_cache.set("chat", cache_keys[model_name], text)
+                return text
             else:
-                logger.warning("Empty response from Gemini")
+                logger.warning("Empty or blocked response from Gemini")
                 return "Извини, я не знаю что ответить... 😔"
                 
+        except CircuitOpenError:
+            logger.debug("Gemini circuit breaker open, returning fallback response")
+            return "Прости, у меня сейчас проблемы с интернетом... Попробуй написать еще раз 😊"
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             return "Прости, у меня сейчас проблемы с интернетом... Попробуй написать еще раз 😊"
     
     async def generate_profile_suggestions(self, user_preferences: str, user_description: str = "") -> dict:
         """Генерация предложений для профиля девушки на основе предпочтений пользователя"""
+        profile_data = await self.generate_profile(user_preferences, user_description)
+        return profile_data or self._get_default_profile()
+    
+    async def generate_profile(
+        self,
+        user_preferences: str,
+        user_description: str = "",
+        use_cache: bool = True
+    ) -> Optional[dict]:
+        """Генерация профиля девушки (None, если получить валидный профиль не удалось)"""
         try:
             # Формируем промпт с учетом описания пользователя
             user_info_section = ""
@@ -153,8 +716,7 @@ class GeminiService:
             
             Важно: девушка должна быть взрослой, реалистичной, не детской. Она может материться, флиртовать, обсуждать интимные темы.
             
-            Отвечай в формате:
-            ```json
+            Ответ - только JSON-объект вида:
             {{
               "name": "Имя",
               "age": 25,
@@ -164,50 +726,43 @@ class GeminiService:
               "background": "Предыстория...",
               "communication_style": "Стиль общения..."
             }}
-            ```
             """
             
-            response = await self.model.generate_content_async(
-                prompt,
-                safety_settings=self.safety_settings
-            )
+            cache_keys = self._get_cache_keys("profile", prompt)
+            if use_cache:
+                cached_profile = await self.response_cache.get_first("profile", list(cache_keys.values()))
+                if cached_profile:
+                    return json.loads(cached_profile)
             
-            if response.text:
-                # Извлекаем JSON из markdown и парсим
+            # Ответ ограничен JSON-схемой; невалидный ответ запрашивается повторно
+            for attempt in range(1, settings.gemini_profile_max_attempts + 1):
+                response, model_name = await self._generate(
+                    prompt,
+                    call_type="profile",
+                    generation_config=PROFILE_GENERATION_CONFIG
+                )
+                
                 try:
-                    json_text = extract_json_from_markdown(response.text)
-                    logger.info(f"Extracted JSON from Gemini response: {json_text[:200]}...")
-                    
-                    profile_data = json.loads(json_text)
-                    
-                    # Проверяем, что все обязательные поля присутствуют
-                    required_fields = ["name", "age", "personality", "appearance", "interests", "background", "communication_style"]
-                    for field in required_fields:
-                        if field not in profile_data:
-                            logger.warning(f"Missing required field: {field}")
-                            profile_data[field] = self._get_default_profile()[field]
-                    
-                    # Проверяем возраст
-                    if not isinstance(profile_data.get("age"), int) or not (18 <= profile_data["age"] <= 50):
-                        profile_data["age"] = 23
-                    
-                    logger.info(f"Successfully parsed profile for: {profile_data.get('name', 'Unknown')}")
-                    return profile_data
-                    
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Failed to parse JSON from Gemini response: {e}")
-                    logger.warning(f"Raw response: {response.text[:500]}...")
-                    return self._get_default_profile()
-                except Exception as e:
-                    logger.error(f"Error processing Gemini response: {e}")
-                    return self._get_default_profile()
-            else:
-                logger.warning("Empty response from Gemini")
-                return self._get_default_profile()
+                    profile = parse_profile(self._get_response_text(response))
+                except InvalidProfileOutput as e:
+                    logger.warning(f"Invalid profile output from Gemini (attempt {attempt}): {e}")
+                    continue
+                
+                profile_data = profile.model_dump()
+                logger.info(f"Successfully parsed profile for: {profile.name}")
+                if use_cache:
+                    await self.response_cache.set("profile", cache_keys[model_name], json.dumps(profile_data, ensure_ascii=False))
+                return profile_data
+            
+            logger.warning(f"No valid profile after {settings.gemini_profile_max_attempts} attempts")
+            return None
                 
+        except CircuitOpenError:
+            logger.debug("Gemini circuit breaker open, profile not generated")
+            return None
         except Exception as e:
             logger.error(f"Error generating profile suggestions: {e}")
-            return self._get_default_profile()
+            return None
     
     def _get_default_profile(self) -> dict:
         """Профиль по умолчанию"""
@@ -224,18 +779,8 @@ class GeminiService:
     async def moderate_content(self, text: str) -> bool:
         """Модерация контента (только критические случаи)"""
         try:
-            # Проверяем только на действительно опасный контент
-            critical_words = ["убить", "убийство", "суицид", "самоубийство", "наркотики", "героин", "кокаин"]
-            text_lower = text.lower()
-            
-            # Проверяем только на прямые угрозы и опасный контент
-            for word in critical_words:
-                if word in text_lower:
-                    # Дополнительная проверка контекста
-                    if any(context in text_lower for context in ["хочу", "буду", "планирую", "собираюсь"]):
-                        return False
-            
-            return True  # Разрешаем большинство контента
+            # Блокируем только прямые угрозы и опасный контент: опасное слово вместе с намерением
+            return moderation_service.is_allowed(text)
             
         except Exception as e:
             logger.error(f"Error in content moderation: {e}")
@@ -254,4 +799,8 @@ class GeminiService:
     @classmethod
     def get_available_models(cls) -> dict:
         """Получение списка доступных моделей"""
-        return cls.AVAILABLE_MODELS
\ No newline at end of file
+        return cls.AVAILABLE_MODELS
+
+
+# Глобальный экземпляр сервиса Gemini (создается при первом обращении)
+gemini_service = services.register("gemini", GeminiService)
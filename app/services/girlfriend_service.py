@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
 from app.models import GirlfriendProfile, User
+from app.services.persona_prompt_service import DELETED_VERSION, get_profile_version, persona_prompt_service
 from typing import Optional, List
 import logging
 
@@ -139,10 +140,50 @@ class GirlfriendService:
             
             await session.commit()
             await session.refresh(profile)
+            await persona_prompt_service.invalidate(profile_id, get_profile_version(profile))
             logger.info(f"Updated profile {profile_id} for user {user_id}")
         
         return profile
     
+    @staticmethod
+    async def update_profile_if_unchanged(
+        session: AsyncSession,
+        profile_id: int,
+        user_id: int,
+        expected_version: str,
+        **kwargs
+    ) -> Optional[GirlfriendProfile]:
+        """
+        Обновление профиля, только если он не менялся с версии expected_version
+
+        Возвращает None, если профиля нет или его уже изменили (например,
+        пользователь отредактировал поле) - изменения не перезаписываются.
+        """
+        result = await session.execute(
+            select(GirlfriendProfile)
+            .where(
+                and_(
+                    GirlfriendProfile.id == profile_id,
+                    GirlfriendProfile.user_id == user_id
+                )
+            )
+            .with_for_update()
+        )
+        profile = result.scalar_one_or_none()
+        
+        if not profile or get_profile_version(profile) != expected_version:
+            return None
+        
+        for key, value in kwargs.items():
+            if hasattr(profile, key) and value is not None:
+                setattr(profile, key, value)
+        
+        await session.commit()
+        await session.refresh(profile)
+        await persona_prompt_service.invalidate(profile_id, get_profile_version(profile))
+        logger.info(f"Applied suggested changes to profile {profile_id} for user {user_id}")
+        return profile
+    
     @staticmethod
     async def update_profile_field(
         session: AsyncSession,
@@ -161,6 +202,7 @@ class GirlfriendService:
             setattr(profile, field_name, field_value)
             await session.commit()
             await session.refresh(profile)
+            await persona_prompt_service.invalidate(profile_id, get_profile_version(profile))
             logger.info(f"Updated field '{field_name}' for profile {profile_id}")
         
         return profile
@@ -182,6 +224,7 @@ class GirlfriendService:
         if profile:
             await session.delete(profile)
             await session.commit()
+            await persona_prompt_service.invalidate(profile_id, DELETED_VERSION)
             logger.info(f"Deleted profile {profile_id} for user {user_id}")
             return True
         
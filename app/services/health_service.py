@@ -0,0 +1,96 @@
+import asyncio
+import time
+from sqlalchemy import text
+from typing import Awaitable, Dict, Optional
+from config.settings import settings
+from app.services.redis_client import get_redis
+from app.services.database import db_service
+from app.services.circuit_breaker import CircuitState, gemini_circuit_breaker
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class HealthService:
+    """
+    Состояние процесса для /healthz и /readyz
+
+    Живость (liveness) - процесс отвечает. Готовность (readiness) - запуск
+    завершен, процесс не останавливается, БД и Redis отвечают. Gemini
+    проверяется по предохранителю и на готовность не влияет: при сбое
+    Gemini бот продолжает отвечать запасными сообщениями, а вывод всех
+    реплик из балансировки ничего бы не исправил.
+    """
+
+    def __init__(self, redis_url: str = None, check_timeout_seconds: float = None):
+        self.redis_url = redis_url or settings.redis_url
+        self.check_timeout_seconds = check_timeout_seconds or settings.health_check_timeout_seconds
+        self.started = False
+        self.draining = False
+        self.started_at: Optional[float] = None
+        self.startup_steps: Dict[str, int] = {}
+
+    async def run_step(self, name: str, step: Awaitable):
+        """Шаг запуска с замером времени"""
+        started = time.perf_counter()
+        try:
+            return await step
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.startup_steps[name] = round(elapsed_ms)
+            logger.info(f"Startup step {name} took {elapsed_ms:.0f} ms")
+
+    def mark_started(self) -> None:
+        self.started = True
+        self.started_at = time.time()
+
+    def start_draining(self) -> None:
+        """Остановка: /readyz отвечает 503, балансировщик перестает слать запросы"""
+        self.draining = True
+
+    async def _check(self, check: Awaitable) -> dict:
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(check, timeout=self.check_timeout_seconds)
+            return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"[:200]}
+
+    async def _ping_database(self) -> None:
+        async with db_service.engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    async def _ping_redis(self) -> None:
+        client = get_redis(self.redis_url)
+        await client.ping()
+
+    def liveness(self) -> dict:
+        return {"status": "ok", "started": self.started, "draining": self.draining}
+
+    async def readiness(self) -> dict:
+        """Проверки зависимостей (параллельно, с таймаутом на каждую)"""
+        checks = {"database": self._check(self._ping_database())}
+        if self.redis_url:
+            checks["redis"] = self._check(self._ping_redis())
+        results = dict(zip(checks, await asyncio.gather(*checks.values())))
+
+        breaker_state = gemini_circuit_breaker.get_state()["state"]
+        results["gemini"] = {"ok": breaker_state != CircuitState.OPEN.value, "breaker": breaker_state}
+
+        ready = (
+            self.started
+            and not self.draining
+            and all(results[name]["ok"] for name in checks)
+        )
+        return {
+            "status": "ready" if ready else "not_ready",
+            "ready": ready,
+            "started": self.started,
+            "draining": self.draining,
+            "checks": results,
+            "startup_steps_ms": self.startup_steps
+        }
+
+
+# Глобальный экземпляр состояния процесса
+health_service = HealthService()
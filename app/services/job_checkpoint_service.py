@@ -0,0 +1,65 @@
+from typing import Optional
+from config.settings import settings
+from app.services.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+class JobCheckpointService:
+    """
+    Хранение контрольных точек периодических задач в Redis
+
+    Задача сохраняет ID последней обработанной записи по каждому этапу.
+    Если процесс перезапустился посреди прогона, следующий запуск
+    продолжает с сохраненной точки, а не начинает обход заново.
+    После успешного завершения прогона контрольная точка удаляется.
+    """
+
+    def __init__(self, redis_url: str = None):
+        self.redis_url = redis_url or settings.redis_url
+
+        # Префикс для ключей Redis
+        self.CHECKPOINT_KEY_PREFIX = "scheduler:checkpoint:"
+
+        # Контрольная точка живет не дольше двух интервалов проверки
+        self.checkpoint_ttl_seconds = settings.notification_check_interval_hours * 3600 * 2
+
+    async def get_checkpoint(self, job_id: str, stage: str) -> Optional[int]:
+        """Получение ID последней обработанной записи для этапа задачи"""
+        try:
+            redis_client = get_redis(self.redis_url)
+            value = await redis_client.hget(f"{self.CHECKPOINT_KEY_PREFIX}{job_id}", stage)
+            return int(value) if value else None
+        except Exception as e:
+            logger.error(f"Error getting checkpoint for job {job_id}/{stage}: {e}")
+            return None
+
+    async def set_checkpoint(self, job_id: str, stage: str, last_id: int) -> None:
+        """Сохранение ID последней обработанной записи для этапа задачи"""
+        try:
+            redis_client = get_redis(self.redis_url)
+            key = f"{self.CHECKPOINT_KEY_PREFIX}{job_id}"
+            await redis_client.hset(key, stage, last_id)
+            await redis_client.expire(key, self.checkpoint_ttl_seconds)
+        except Exception as e:
+            logger.error(f"Error saving checkpoint for job {job_id}/{stage}: {e}")
+
+    async def has_checkpoint(self, job_id: str) -> bool:
+        """Проверка, остался ли незавершенный прогон задачи"""
+        try:
+            redis_client = get_redis(self.redis_url)
+            return bool(await redis_client.exists(f"{self.CHECKPOINT_KEY_PREFIX}{job_id}"))
+        except Exception as e:
+            logger.error(f"Error checking checkpoint for job {job_id}: {e}")
+            return False
+
+    async def clear_checkpoint(self, job_id: str) -> None:
+        """Удаление контрольной точки после завершения прогона"""
+        try:
+            redis_client = get_redis(self.redis_url)
+            await redis_client.delete(f"{self.CHECKPOINT_KEY_PREFIX}{job_id}")
+        except Exception as e:
+            logger.error(f"Error clearing checkpoint for job {job_id}: {e}")
+
+# Глобальный экземпляр сервиса контрольных точек
+job_checkpoint_service = JobCheckpointService()
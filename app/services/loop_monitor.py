@@ -0,0 +1,127 @@
+"""
+Контроль задержки event loop
+
+Синхронный код в корутине (SDK без async, тяжелые вычисления, запись
+больших логов) останавливает обработку обновлений всех пользователей.
+Фоновая задача засыпает на интервал и измеряет, насколько позже
+срока она проснулась, - это задержка loop, она идет в метрику
+bot_event_loop_lag_seconds.
+
+В режиме отладки (DEBUG или LOOP_BLOCK_CAPTURE_STACKS) дополнительно
+работает сторожевой поток: если loop не разбудил задачу дольше порога,
+поток снимает стек потока loop, пока блокировка еще продолжается,
+и пишет его в лог - видно, какой код держит loop.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+from config.settings import settings
+from app.services.metrics import EVENT_LOOP_BLOCKS, EVENT_LOOP_LAG_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько внутренних кадров стека писать в лог
+STACK_LIMIT = 25
+
+
+class LoopMonitor:
+    """Измерение задержки event loop и поиск блокирующего кода"""
+
+    def __init__(
+        self,
+        interval_seconds: float = None,
+        block_threshold_seconds: float = None,
+        capture_stacks: bool = None
+    ):
+        self.interval_seconds = interval_seconds or settings.loop_monitor_interval_seconds
+        self.block_threshold_seconds = block_threshold_seconds or settings.loop_block_threshold_seconds
+        if capture_stacks is None:
+            capture_stacks = settings.debug or settings.loop_block_capture_stacks
+        self.capture_stacks = capture_stacks
+
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop_watchdog = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        # Когда задача должна проснуться; читается сторожевым потоком
+        self._expected_wake: Optional[float] = None
+
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.blocks = 0
+
+    def start(self) -> None:
+        """Запуск в работающем event loop"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.create_task(self._run(), name="loop-monitor")
+        if self.capture_stacks:
+            self._stop_watchdog.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+        logger.info(
+            f"Event loop monitor started: interval {self.interval_seconds}s, "
+            f"block threshold {self.block_threshold_seconds * 1000:.0f} ms, stacks {self.capture_stacks}"
+        )
+
+    async def _run(self) -> None:
+        while True:
+            self._expected_wake = time.monotonic() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            lag = max(0.0, time.monotonic() - self._expected_wake)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            if lag >= self.block_threshold_seconds:
+                self.blocks += 1
+                EVENT_LOOP_BLOCKS.inc()
+                logger.warning(f"Event loop lag {lag * 1000:.0f} ms (threshold {self.block_threshold_seconds * 1000:.0f} ms)")
+
+    def _watch(self) -> None:
+        """Сторожевой поток: стек потока loop во время блокировки (один раз на блокировку)"""
+        check_interval = max(self.block_threshold_seconds / 2, 0.01)
+        reported_wake = None
+        while not self._stop_watchdog.wait(check_interval):
+            expected_wake = self._expected_wake
+            if expected_wake is None or expected_wake == reported_wake:
+                continue
+            blocked_for = time.monotonic() - expected_wake
+            if blocked_for < self.block_threshold_seconds:
+                continue
+
+            reported_wake = expected_wake
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+            logger.warning(f"Event loop blocked for over {blocked_for * 1000:.0f} ms, loop thread stack:\n{stack}")
+
+    def get_stats(self) -> dict:
+        return {
+            "last_lag_seconds": round(self.last_lag, 4),
+            "max_lag_seconds": round(self.max_lag, 4),
+            "blocks": self.blocks
+        }
+
+    async def stop(self) -> None:
+        """Остановка задачи и сторожевого потока"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._stop_watchdog.set()
+            self._watchdog.join()
+            self._watchdog = None
+
+
+# Глобальный экземпляр контроля event loop
+loop_monitor = LoopMonitor()
@@ -0,0 +1,361 @@
+"""
+Метрики Prometheus (/metrics)
+
+Счетчики и гистограммы обновляются в местах вызова: обработчики событий
+(middleware диспетчера), запросы к Gemini, SQL-запросы (события движка),
+Redis в rate limiter, отправка уведомлений и задержка event loop. Состояние, которое сервисы
+уже считают сами (предохранитель, маршрутизатор моделей, пул ключей,
+кэш ответов, очередь webhook), читается при сборе метрик.
+
+При нескольких процессах webhook-сервера задайте METRICS_MULTIPROC_DIR:
+счетчики процессов складываются в общий каталог и суммируются при
+запросе /metrics к любому процессу.
+"""
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict
+from config.settings import settings
+import logging
+
+# Режим нескольких процессов prometheus_client выбирает при импорте по переменной окружения
+if settings.metrics_multiproc_dir:
+    os.makedirs(settings.metrics_multiproc_dir, exist_ok=True)
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.metrics_multiproc_dir)
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from aiohttp import web
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+HANDLER_SECONDS = Histogram(
+    "bot_handler_duration_seconds",
+    "Время обработки события обработчиком",
+    ["event", "router", "handler"]
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total",
+    "Исключения в обработчиках (в том числе перехваченные error_handler)",
+    ["event", "router", "handler", "error"]
+)
+
+GEMINI_BUCKETS = (0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+GEMINI_CALL_SECONDS = Histogram(
+    "bot_gemini_call_duration_seconds",
+    "Время вызова Gemini с учетом резервных моделей и дублирования",
+    ["call_type", "outcome"],
+    buckets=GEMINI_BUCKETS
+)
+GEMINI_CALL_ERRORS = Counter(
+    "bot_gemini_call_errors_total",
+    "Неудачные вызовы Gemini по типу ошибки",
+    ["call_type", "error"]
+)
+GEMINI_ATTEMPT_SECONDS = Histogram(
+    "bot_gemini_attempt_duration_seconds",
+    "Время одного запроса к модели",
+    ["model", "outcome"],
+    buckets=GEMINI_BUCKETS
+)
+GEMINI_TOKENS = Counter(
+    "bot_gemini_tokens_total",
+    "Токены по usage_metadata ответов",
+    ["model", "kind"]
+)
+
+DB_QUERY_SECONDS = Histogram(
+    "bot_db_query_duration_seconds",
+    "Время SQL-запроса",
+    ["statement"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+DB_ERRORS = Counter("bot_db_errors_total", "Ошибки SQL-запросов", ["error"])
+DB_CONNECTIONS_OPENED = Counter("bot_db_connections_opened_total", "Открытые подключения к БД")
+DB_CONNECTIONS_IN_USE = Gauge(
+    "bot_db_connections_in_use",
+    "Подключения к БД, выданные сессиям",
+    multiprocess_mode="livesum"
+)
+
+REDIS_SECONDS = Histogram(
+    "bot_redis_operation_duration_seconds",
+    "Время операции с Redis",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+)
+RATE_LIMIT_CHECKS = Counter(
+    "bot_rate_limit_checks_total",
+    "Результаты проверки rate limit",
+    ["outcome"]
+)
+
+NOTIFICATIONS = Counter(
+    "bot_notifications_total",
+    "Уведомления о подписке",
+    ["type", "outcome"]
+)
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "bot_event_loop_lag_seconds",
+    "Задержка пробуждения таймера event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+EVENT_LOOP_BLOCKS = Counter(
+    "bot_event_loop_blocks_total",
+    "Задержки event loop выше порога блокировки"
+)
+
+SQL_STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Время и ошибки обработчиков по роутеру и имени функции
+
+    Сюда доходят только исключения обработчиков без error_handler:
+    перехваченные декоратором считает record_handler_error.
+    """
+
+    def __init__(self, event_name: str):
+        self.event_name = event_name
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        router = data.get("event_router")
+        handler_object = data.get("handler")
+        labels = (
+            self.event_name,
+            router.name if router is not None else "",
+            handler_object.callback.__name__ if handler_object is not None else ""
+        )
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.labels(*labels, type(e).__name__).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(*labels).observe(time.perf_counter() - started)
+
+
+def record_handler_error(event: Any, handler: Callable, error: Exception) -> None:
+    """Исключение, перехваченное декоратором error_handler (те же метки, что у middleware)"""
+    if isinstance(event, CallbackQuery):
+        event_name = "callback_query"
+    elif isinstance(event, Message):
+        event_name = "message"
+    else:
+        event_name = ""
+    # Роутеры названы по модулям обработчиков: app.handlers.profile -> profile
+    router_name = handler.__module__.rsplit(".", 1)[-1]
+    HANDLER_ERRORS.labels(event_name, router_name, handler.__name__, type(error).__name__).inc()
+
+
+def setup_handler_metrics(dispatcher: Dispatcher) -> None:
+    """
+    Middleware на наблюдателях диспетчера
+
+    Внутренние middleware диспетчера применяются к обработчикам всех
+    вложенных роутеров и вызываются только после прохождения фильтров,
+    поэтому обработчик уже известен.
+    """
+    for event_name, observer in dispatcher.observers.items():
+        if event_name not in ("update", "error"):
+            observer.middleware(HandlerMetricsMiddleware(event_name))
+
+
+def instrument_engine(engine) -> None:
+    """Время SQL-запросов и учет подключений через события движка SQLAlchemy"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.labels(get_statement_type(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+        DB_ERRORS.labels(type(context.original_exception).__name__).inc()
+
+    @event.listens_for(sync_engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        DB_CONNECTIONS_OPENED.inc()
+
+    @event.listens_for(sync_engine, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_CONNECTIONS_IN_USE.inc()
+
+    @event.listens_for(sync_engine, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        DB_CONNECTIONS_IN_USE.dec()
+
+
+def get_statement_type(statement: str) -> str:
+    """Первое слово SQL для метки (без текста запроса - иначе неограниченное число меток)"""
+    keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return keyword if keyword in SQL_STATEMENTS else "OTHER"
+
+
+def record_gemini_usage(model: str, usage) -> None:
+    """Токены ответа Gemini"""
+    if usage is None:
+        return
+    for kind, attribute in (
+        ("prompt", "prompt_token_count"),
+        ("output", "candidates_token_count"),
+        ("cached", "cached_content_token_count")
+    ):
+        count = getattr(usage, attribute, 0) or 0
+        if count:
+            GEMINI_TOKENS.labels(model, kind).inc(count)
+
+
+class ServiceStatsCollector:
+    """Метрики из статистики, которую сервисы ведут сами (читаются при сборе)"""
+
+    def __init__(self):
+        self.webhook_handler = None
+        self.worker = "0"
+
+    def set_webhook_handler(self, handler, worker: int = 0) -> None:
+        self.webhook_handler = handler
+        self.worker = str(worker)
+
+    def collect(self):
+        yield from self._collect_gemini()
+        if self.webhook_handler is not None:
+            yield from self._collect_webhook(self.webhook_handler.get_stats())
+
+    def _collect_gemini(self):
+        from app.services.circuit_breaker import gemini_circuit_breaker
+        from app.services.gemini_key_pool import gemini_key_pool
+        from app.services.response_cache_service import response_cache_service
+        from app.services.container import services
+
+        labels = ["worker"]
+        breaker = gemini_circuit_breaker.get_state()
+        state = GaugeMetricFamily(
+            "bot_gemini_breaker_state", "Предохранитель Gemini: 0 - closed, 1 - half_open, 2 - open", labels=labels
+        )
+        state.add_metric([self.worker], breaker["state_value"])
+        opened = CounterMetricFamily("bot_gemini_breaker_opened", "Срабатывания предохранителя", labels=labels)
+        opened.add_metric([self.worker], breaker["times_opened"])
+        rejected = CounterMetricFamily("bot_gemini_breaker_rejected", "Отказы без запроса к API", labels=labels)
+        rejected.add_metric([self.worker], breaker["rejected"])
+        yield from (state, opened, rejected)
+
+        key_labels = ["worker", "key"]
+        quarantined = GaugeMetricFamily("bot_gemini_key_quarantined", "Ключ API на карантине", labels=key_labels)
+        key_requests = GaugeMetricFamily(
+            "bot_gemini_key_requests_last_minute", "Запросы по ключу за минуту", labels=key_labels
+        )
+        key_tokens = GaugeMetricFamily("bot_gemini_key_tokens_last_minute", "Токены по ключу за минуту", labels=key_labels)
+        key_limited = CounterMetricFamily("bot_gemini_key_rate_limited", "Ответы 429 по ключу", labels=key_labels)
+        for key_id, stats in gemini_key_pool.get_stats().items():
+            quarantined.add_metric([self.worker, key_id], int(stats["quarantined"]))
+            key_requests.add_metric([self.worker, key_id], stats["requests_last_minute"])
+            key_tokens.add_metric([self.worker, key_id], stats["tokens_last_minute"])
+            key_limited.add_metric([self.worker, key_id], stats["rate_limited"])
+        yield from (quarantined, key_requests, key_tokens, key_limited)
+
+        cache = CounterMetricFamily(
+            "bot_gemini_response_cache_events", "Кэш ответов Gemini", labels=["worker", "call_type", "event"]
+        )
+        for call_type, stats in response_cache_service.get_stats().items():
+            for name in ("hits", "misses", "stores", "errors"):
+                cache.add_metric([self.worker, call_type, name], stats.get(name, 0))
+        yield cache
+
+        # Маршрутизатор живет в GeminiService - не создаем сервис ради метрик
+        if services.is_created("gemini"):
+            from app.services.gemini_service import gemini_service
+            model_labels = ["worker", "model"]
+            healthy = GaugeMetricFamily("bot_gemini_model_healthy", "Модель в ротации маршрутизатора", labels=model_labels)
+            error_rate = GaugeMetricFamily("bot_gemini_model_error_rate", "Доля ошибок модели в окне", labels=model_labels)
+            latency = GaugeMetricFamily(
+                "bot_gemini_model_latency_seconds", "Перцентили задержки модели в окне",
+                labels=["worker", "model", "quantile"]
+            )
+            for model, stats in gemini_service.get_model_stats().items():
+                healthy.add_metric([self.worker, model], int(stats["healthy"]))
+                error_rate.add_metric([self.worker, model], stats["error_rate"])
+                for quantile in (50, 90, 95):
+                    value = stats[f"p{quantile}_latency"]
+                    if value is not None:
+                        latency.add_metric([self.worker, model, f"0.{quantile}"], value)
+            yield from (healthy, error_rate, latency)
+
+    def _collect_webhook(self, stats: dict):
+        labels = ["worker"]
+        for name, documentation in (
+            ("queue_depth", "Обновления в очереди webhook"),
+            ("max_queue_depth", "Максимальная глубина очереди"),
+            ("in_flight", "Обновления в обработке"),
+            ("avg_queue_wait_seconds", "Среднее ожидание в очереди")
+        ):
+            gauge = GaugeMetricFamily(f"bot_webhook_{name}", documentation, labels=labels)
+            gauge.add_metric([self.worker], stats[name])
+            yield gauge
+
+        updates = CounterMetricFamily("bot_webhook_updates", "Обновления webhook по результату", labels=["worker", "outcome"])
+        for outcome in ("accepted", "processed", "failed", "rejected", "dropped"):
+            updates.add_metric([self.worker, outcome], stats[outcome])
+        yield updates
+
+
+def is_multiprocess() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def clear_multiprocess_dir() -> None:
+    """Удаление файлов метрик прошлого запуска (вызывается до старта процессов)"""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(".db"):
+            os.remove(os.path.join(directory, name))
+
+
+def mark_process_dead(pid: int) -> None:
+    """Значения livesum-метрик завершенного процесса больше не учитываются"""
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid)
+
+
+def generate_metrics() -> bytes:
+    """Текст /metrics: счетчики всех процессов и состояние сервисов текущего процесса"""
+    if not is_multiprocess():
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(stats_collector)
+    return generate_latest(registry)
+
+
+async def metrics_handler(request):
+    """Обработчик /metrics"""
+    return web.Response(body=generate_metrics(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+# Глобальный сборщик статистики сервисов
+stats_collector = ServiceStatsCollector()
+if not is_multiprocess():
+    REGISTRY.register(stats_collector)
@@ -0,0 +1,234 @@
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+from config.settings import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+CRITICAL = "critical"
+INTENT = "intent"
+
+# Похожие символы, которыми подменяют русские буквы (режим match_obfuscation)
+_CHAR_VARIANTS = {
+    "а": "аa@", "в": "вb", "е": "еёe", "з": "з3", "к": "кk", "м": "мm", "н": "нh",
+    "о": "оo0", "р": "рp", "с": "сc", "т": "тt", "у": "уy", "х": "хx"
+}
+
+# Окончания, отбрасываемые при приведении слова к основе (длинные первыми)
+_REFLEXIVE_ENDINGS = ("ся", "сь")
+_ENDINGS = (
+    "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ешь", "ете", "ишь", "ите",
+    "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ую", "юю", "ов", "ев", "ам", "ям",
+    "ах", "ях", "ом", "ем", "им", "ым", "ть", "ти", "ет", "ит", "ут", "ют", "ат", "ят",
+    "ы", "и", "а", "я", "о", "е", "у", "ю", "ь"
+)
+MIN_STEM_LENGTH = 4
+
+# До скольких основ в категории поиск идет подстроками (str.find на C),
+# дальше - одним скомпилированным выражением: по бенчмарку до ~30 основ
+# поиск подстрок быстрее, после - выражение, чья стоимость почти не растет
+SUBSTRING_SCAN_MAX_STEMS = 30
+
+# Начало слова: перед совпадением нет буквы
+_WORD_START = r"(?<![^\W\d_])"
+
+
+def stem(word: str) -> str:
+    """Основа слова: отбрасывание возвратного суффикса и одного окончания"""
+    word = word.strip().lower().replace("ё", "е")
+    for ending in _REFLEXIVE_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            word = word[:-len(ending)]
+            break
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def normalize_text(text: str) -> str:
+    """Текст в том же виде, что и основы словаря: нижний регистр, ё -> е"""
+    text = text.lower()
+    return text.replace("ё", "е") if "ё" in text else text
+
+
+def _drop_covered_stems(stems: Iterable[str]) -> Tuple[str, ...]:
+    """Без основ, которые начинаются с другой основы (наркотик при наркот): их совпадения уже найдены"""
+    kept: List[str] = []
+    for word_stem in sorted(set(stems)):
+        if not kept or not word_stem.startswith(kept[-1]):
+            kept.append(word_stem)
+    return tuple(kept)
+
+
+def _is_word_start(text: str, index: int) -> bool:
+    """Перед позицией нет буквы"""
+    return index == 0 or not text[index - 1].isalpha()
+
+
+def _char_pattern(char: str, match_obfuscation: bool) -> str:
+    """Буква основы; с match_obfuscation - похожие символы и растянутые повторы (убиииить)"""
+    if not match_obfuscation:
+        return re.escape(char)
+    variants = _CHAR_VARIANTS.get(char, char)
+    if len(variants) == 1:
+        return f"{re.escape(char)}+"
+    return f"[{re.escape(variants)}]+"
+
+
+def compile_stems(stems: Iterable[str], match_obfuscation: bool = False) -> Optional[Pattern]:
+    """
+    Компиляция основ в одно регулярное выражение по префиксному дереву
+
+    Общие префиксы основ сливаются, поэтому текст проходится движком re
+    за один проход без перебора слов, и стоимость почти не растет с
+    размером словаря. Совпадение засчитывается только с начала слова.
+    """
+    trie: dict = {}
+    for word_stem in stems:
+        node = trie
+        for char in word_stem:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        if "" in node:
+            # Основа закончилась - продолжения уже не нужны для совпадения
+            return ""
+        alternatives = [
+            _char_pattern(char, match_obfuscation) + build(child) for char, child in sorted(node.items())
+        ]
+        return alternatives[0] if len(alternatives) == 1 else f"(?:{'|'.join(alternatives)})"
+
+    if not trie:
+        return None
+    return re.compile(_WORD_START + build(trie))
+
+
+class StemMatcher:
+    """
+    Скомпилированный словарь: поиск основ категории с начала слова
+
+    Текст передается уже нормализованным (normalize_text). Небольшие
+    категории ищутся подстроками, большие и режим match_obfuscation -
+    скомпилированным выражением.
+    """
+
+    def __init__(
+        self,
+        patterns: Iterable[Tuple[str, str]],
+        match_obfuscation: bool = False,
+        substring_max_stems: int = SUBSTRING_SCAN_MAX_STEMS
+    ):
+        stems_by_category: Dict[str, set] = {}
+        for word_stem, category in patterns:
+            stems_by_category.setdefault(category, set()).add(word_stem)
+
+        self.stem_count = sum(len(stems) for stems in stems_by_category.values())
+        self._stems: Dict[str, Tuple[str, ...]] = {}
+        self._patterns: Dict[str, Pattern] = {}
+        for category, stems in stems_by_category.items():
+            if match_obfuscation or len(stems) > substring_max_stems:
+                self._patterns[category] = compile_stems(stems, match_obfuscation)
+            else:
+                self._stems[category] = _drop_covered_stems(stems)
+
+    def contains(self, category: str, text: str) -> bool:
+        """Есть ли в нормализованном тексте слово категории"""
+        pattern = self._patterns.get(category)
+        if pattern is not None:
+            return pattern.search(text) is not None
+
+        for word_stem in self._stems.get(category, ()):
+            if word_stem not in text:
+                continue
+            index = text.find(word_stem)
+            while index != -1:
+                if _is_word_start(text, index):
+                    return True
+                index = text.find(word_stem, index + 1)
+        return False
+
+
+def load_dictionary(path: str) -> List[Tuple[str, str]]:
+    """Чтение словаря: секции [critical] / [intent], по слову в строке"""
+    patterns = []
+    category = CRITICAL
+
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                category = line[1:-1].strip()
+                continue
+            word_stem = stem(line)
+            if word_stem:
+                patterns.append((word_stem, category))
+
+    return patterns
+
+
+class ModerationService:
+    """
+    Модерация сообщений по словарю
+
+    Словарь компилируется один раз и перечитывается, если файл изменился
+    (проверка не чаще reload_interval_seconds). Сообщение блокируется,
+    если в нем есть и опасное слово, и слово-намерение; слова-намерения
+    ищутся только в сообщениях с опасными словами. Подмена букв латиницей
+    и растянутые буквы ловятся только с match_obfuscation.
+    """
+
+    def __init__(self, path: str = None, reload_interval_seconds: int = None, match_obfuscation: bool = None):
+        self.path = path or settings.moderation_words_path
+        self.match_obfuscation = (
+            settings.moderation_match_obfuscation if match_obfuscation is None else match_obfuscation
+        )
+        self.reload_interval_seconds = (
+            settings.moderation_reload_interval_seconds if reload_interval_seconds is None else reload_interval_seconds
+        )
+        self._matcher: Optional[StemMatcher] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+
+    def reload(self) -> bool:
+        """Перекомпиляция словаря из файла"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            patterns = load_dictionary(self.path)
+        except OSError as e:
+            logger.error(f"Failed to load moderation dictionary {self.path}: {e}")
+            return False
+
+        self._matcher = StemMatcher(patterns, self.match_obfuscation)
+        self._mtime = mtime
+        logger.info(f"Loaded moderation dictionary: {self._matcher.stem_count} stems")
+        return True
+
+    def _get_matcher(self) -> Optional[StemMatcher]:
+        now = time.monotonic()
+        if self._matcher is None or now - self._checked_at >= self.reload_interval_seconds:
+            self._checked_at = now
+            try:
+                changed = os.path.getmtime(self.path) != self._mtime
+            except OSError:
+                changed = self._matcher is None
+            if changed:
+                self.reload()
+        return self._matcher
+
+    def is_allowed(self, text: str) -> bool:
+        """Разрешено ли сообщение"""
+        matcher = self._get_matcher()
+        if matcher is None or not text:
+            return True
+        text = normalize_text(text)
+        return not (matcher.contains(CRITICAL, text) and matcher.contains(INTENT, text))
+
+
+# Глобальный экземпляр модерации
+moderation_service = ModerationService()
@@ -3,11 +3,13 @@ from sqlalchemy import select, and_
 from app.models import User, Subscription, SubscriptionStatus
 from app.services.subscription_service import SubscriptionService, get_current_utc_time
 from app.services.database import db_service
+from app.services.job_checkpoint_service import job_checkpoint_service
 from app.utils.helpers import format_datetime_for_user, format_time_remaining
 from app.utils.keyboards import get_subscription_keyboard
+from app.services.metrics import NOTIFICATIONS
 from datetime import timedelta
 from config.settings import settings
-from typing import List
+from typing import List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,7 +18,8 @@ class NotificationService:
     @staticmethod
     async def get_users_with_expiring_subscriptions(
         session: AsyncSession, 
-        days_before: int = None
+        days_before: int = None,
+        after_subscription_id: Optional[int] = None
     ) -> List[tuple[User, Subscription]]:
         """Получение пользователей с истекающими подписками"""
         if days_before is None:
@@ -36,15 +39,21 @@ class NotificationService:
                     Subscription.end_date > current_time,
                     # Проверяем, что уведомление еще не отправлялось или отправлялось давно
                     User.last_expiry_notification_sent.is_(None) |
-                    (User.last_expiry_notification_sent < current_time - timedelta(hours=12))
+                    (User.last_expiry_notification_sent < current_time - timedelta(hours=12)),
+                    # Продолжаем с контрольной точки прерванного прогона
+                    Subscription.id > (after_subscription_id or 0)
                 )
             )
+            .order_by(Subscription.id)
         )
         
         return result.all()
     
     @staticmethod
-    async def get_users_with_expired_subscriptions(session: AsyncSession) -> List[tuple[User, Subscription]]:
+    async def get_users_with_expired_subscriptions(
+        session: AsyncSession,
+        after_subscription_id: Optional[int] = None
+    ) -> List[tuple[User, Subscription]]:
         """Получение пользователей с истекшими подписками"""
         current_time = get_current_utc_time()
         
@@ -61,9 +70,12 @@ class NotificationService:
                     Subscription.end_date >= expired_threshold,
                     # Проверяем, что уведомление об истечении еще не отправлялось
                     User.last_expired_notification_sent.is_(None) |
-                    (User.last_expired_notification_sent < Subscription.end_date)
+                    (User.last_expired_notification_sent < Subscription.end_date),
+                    # Продолжаем с контрольной точки прерванного прогона
+                    Subscription.id > (after_subscription_id or 0)
                 )
             )
+            .order_by(Subscription.id)
         )
         
         return result.all()
@@ -166,8 +178,13 @@ class NotificationService:
             return False
     
     @staticmethod
-    async def check_and_send_notifications(bot) -> dict:
-        """Основная функция проверки и отправки уведомлений"""
+    async def check_and_send_notifications(bot, checkpoint_job_id: Optional[str] = None) -> dict:
+        """
+        Основная функция проверки и отправки уведомлений
+        
+        Если передан checkpoint_job_id, после каждой обработанной подписки
+        сохраняется контрольная точка, и прерванный прогон продолжается с нее.
+        """
         if not settings.enable_subscription_notifications:
             logger.info("Subscription notifications are disabled")
             return {"expiry_warnings": 0, "expired_notifications": 0, "errors": 0}
@@ -178,10 +195,23 @@ class NotificationService:
             "errors": 0
         }
         
+        expiring_after = None
+        expired_after = None
+        if checkpoint_job_id:
+            expiring_after = await job_checkpoint_service.get_checkpoint(checkpoint_job_id, "expiring")
+            expired_after = await job_checkpoint_service.get_checkpoint(checkpoint_job_id, "expired")
+            if expiring_after or expired_after:
+                logger.info(
+                    f"Resuming notification check from checkpoint: "
+                    f"expiring after {expiring_after}, expired after {expired_after}"
+                )
+        
         try:
             async with db_service.async_session() as session:
                 # Проверяем истекающие подписки
-                expiring_users = await NotificationService.get_users_with_expiring_subscriptions(session)
+                expiring_users = await NotificationService.get_users_with_expiring_subscriptions(
+                    session, after_subscription_id=expiring_after
+                )
                 
                 for user, subscription in expiring_users:
                     success = await NotificationService.send_expiry_warning_notification(
@@ -191,9 +221,17 @@ class NotificationService:
                         stats["expiry_warnings"] += 1
                     else:
                         stats["errors"] += 1
+                    NOTIFICATIONS.labels("expiry_warning", "sent" if success else "failed").inc()
+                    
+                    if checkpoint_job_id:
+                        await job_checkpoint_service.set_checkpoint(
+                            checkpoint_job_id, "expiring", subscription.id
+                        )
                 
                 # Проверяем истекшие подписки
-                expired_users = await NotificationService.get_users_with_expired_subscriptions(session)
+                expired_users = await NotificationService.get_users_with_expired_subscriptions(
+                    session, after_subscription_id=expired_after
+                )
                 
                 for user, subscription in expired_users:
                     success = await NotificationService.send_expired_notification(
@@ -203,6 +241,16 @@ class NotificationService:
                         stats["expired_notifications"] += 1
                     else:
                         stats["errors"] += 1
+                    NOTIFICATIONS.labels("expired", "sent" if success else "failed").inc()
+                    
+                    if checkpoint_job_id:
+                        await job_checkpoint_service.set_checkpoint(
+                            checkpoint_job_id, "expired", subscription.id
+                        )
+                
+                # Прогон завершен полностью - контрольная точка больше не нужна
+                if checkpoint_job_id:
+                    await job_checkpoint_service.clear_checkpoint(checkpoint_job_id)
                 
                 logger.info(f"Notification check completed: {stats}")
                 return stats
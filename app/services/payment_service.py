@@ -1,8 +1,8 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models import Payment, User, PaymentStatus
-from yookassa import Configuration, Payment as YooKassaPayment
 from config.settings import settings
+from app.services.container import services
 from typing import Optional
 from decimal import Decimal
 import uuid
@@ -10,9 +10,18 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-# Настройка YooKassa
-Configuration.account_id = settings.yookassa_shop_id
-Configuration.secret_key = settings.yookassa_secret_key
+
+def create_yookassa_payment_api():
+    """API платежей YooKassa: SDK импортируется и настраивается при первом обращении"""
+    from yookassa import Configuration, Payment
+    Configuration.account_id = settings.yookassa_shop_id
+    Configuration.secret_key = settings.yookassa_secret_key
+    return Payment
+
+
+# API платежей YooKassa (SDK загружается при первом платеже)
+YooKassaPayment = services.register("yookassa", create_yookassa_payment_api)
+
 
 class PaymentService:
     @staticmethod
@@ -0,0 +1,217 @@
+import asyncio
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+from app.models import GirlfriendProfile
+from config.settings import settings
+from app.services.redis_client import get_redis, subscribe_invalidations
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Версия удаленного профиля: строка больше любой версии-даты
+DELETED_VERSION = "~deleted"
+
+# Запись в Redis, только если там нет более новой версии (в том числе отметки о сбросе)
+STORE_IF_NOT_OLDER_SCRIPT = """
+local current = redis.call('GET', KEYS[1])
+if current then
+    local ok, data = pcall(cjson.decode, current)
+    if ok and type(data) == 'table' and data['version'] and data['version'] > ARGV[1] then
+        return 0
+    end
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+def get_profile_version(profile: GirlfriendProfile) -> str:
+    """Версия профиля - время последнего изменения строки (фиксированной ширины, версии сравнимы как строки)"""
+    return profile.updated_at.isoformat(timespec="microseconds") if profile.updated_at else "0"
+
+
+@dataclass(frozen=True)
+class CompiledPersona:
+    """Собранный системный промпт персонажа для конкретной версии профиля"""
+    profile_id: int
+    version: str
+    name: str
+    prompt: str
+
+    def get_full_prompt(self) -> str:
+        """Совместимость с GirlfriendProfile.get_full_prompt"""
+        return self.prompt
+
+
+class PersonaPromptService:
+    """
+    Кэш системных промптов персонажей
+
+    Промпт собирается из полей профиля один раз на версию профиля
+    (profile_id, updated_at) и хранится в памяти процесса и в Redis.
+    На каждое сообщение остается только поиск по profile_id, без
+    загрузки строки профиля из базы. При изменении или удалении
+    профиля запись сбрасывается на всех репликах через Redis pub/sub.
+
+    Сброс запоминает новую версию профиля: в Redis вместо промпта
+    остается отметка с этой версией, в памяти - минимальная допустимая
+    версия. Поэтому читатель, загрузивший строку до изменения, не может
+    записать устаревший промпт обратно - более старая версия не
+    сохраняется ни в памяти, ни в Redis.
+    """
+
+    PROMPT_KEY_PREFIX = "persona:prompt:"
+    INVALIDATE_CHANNEL = "persona:prompt:invalidate"
+
+    def __init__(self, redis_url: str = None, max_local_entries: int = 10000, ttl_seconds: int = 86400):
+        self.redis_url = redis_url or settings.redis_url
+        self.max_local_entries = max_local_entries
+        self.ttl_seconds = ttl_seconds
+        self._local: "OrderedDict[int, CompiledPersona]" = OrderedDict()
+        # Минимальная актуальная версия профиля по последнему сбросу
+        self._min_versions: "OrderedDict[int, str]" = OrderedDict()
+        self._store_script = None
+        self._listener_task: Optional[asyncio.Task] = None
+
+    def _is_stale(self, profile_id: int, version: str) -> bool:
+        """Версия старше известной по последнему сбросу"""
+        return version < self._min_versions.get(profile_id, "")
+
+    def _remember_min_version(self, profile_id: int, version: str) -> None:
+        if version > self._min_versions.get(profile_id, ""):
+            self._min_versions[profile_id] = version
+        self._min_versions.move_to_end(profile_id)
+        while len(self._min_versions) > self.max_local_entries:
+            self._min_versions.popitem(last=False)
+
+    async def _store(self, profile_id: int, version: str, payload: Dict) -> bool:
+        """Запись в Redis, если там нет более новой версии"""
+        redis_client = get_redis(self.redis_url)
+        if self._store_script is None:
+            self._store_script = redis_client.register_script(STORE_IF_NOT_OLDER_SCRIPT)
+        stored = await self._store_script(
+            keys=[f"{self.PROMPT_KEY_PREFIX}{profile_id}"],
+            args=[version, json.dumps(payload, ensure_ascii=False), self.ttl_seconds]
+        )
+        return bool(stored)
+
+    def _remember(self, persona: CompiledPersona) -> None:
+        """Сохранение промпта в локальный LRU-кэш (устаревшая версия не сохраняется)"""
+        if self._is_stale(persona.profile_id, persona.version):
+            return
+        self._local[persona.profile_id] = persona
+        self._local.move_to_end(persona.profile_id)
+        while len(self._local) > self.max_local_entries:
+            self._local.popitem(last=False)
+
+    async def get(self, profile_id: int) -> Optional[CompiledPersona]:
+        """Получение собранного промпта по ID профиля (память, затем Redis)"""
+        persona = self._local.get(profile_id)
+        if persona is not None:
+            self._local.move_to_end(profile_id)
+            return persona
+
+        try:
+            redis_client = get_redis(self.redis_url)
+            raw = await redis_client.get(f"{self.PROMPT_KEY_PREFIX}{profile_id}")
+        except Exception as e:
+            logger.warning(f"Failed to read persona prompt {profile_id} from Redis: {e}")
+            return None
+
+        if not raw:
+            return None
+
+        data = json.loads(raw)
+        # Отметка о сбросе (без промпта) или версия старше известной - промах
+        if "prompt" not in data or self._is_stale(profile_id, data["version"]):
+            return None
+
+        persona = CompiledPersona(
+            profile_id=profile_id,
+            version=data["version"],
+            name=data["name"],
+            prompt=data["prompt"]
+        )
+        self._remember(persona)
+        return persona
+
+    async def compile(self, profile: GirlfriendProfile) -> CompiledPersona:
+        """Сборка промпта профиля (повторно только при смене версии)"""
+        version = get_profile_version(profile)
+
+        cached = self._local.get(profile.id)
+        if cached is not None and cached.version == version:
+            return cached
+
+        persona = CompiledPersona(
+            profile_id=profile.id,
+            version=version,
+            name=profile.name,
+            prompt=profile.get_full_prompt()
+        )
+        self._remember(persona)
+
+        try:
+            stored = await self._store(
+                profile.id,
+                version,
+                {"version": version, "name": persona.name, "prompt": persona.prompt}
+            )
+            if not stored:
+                logger.info(f"Persona prompt {profile.id} version {version} is outdated, not cached")
+        except Exception as e:
+            logger.warning(f"Failed to store persona prompt {profile.id} in Redis: {e}")
+
+        return persona
+
+    async def invalidate(self, profile_id: int, version: Optional[str] = None, broadcast: bool = True) -> None:
+        """
+        Сброс промпта профиля (и оповещение других реплик)
+
+        version - новая версия профиля после изменения (DELETED_VERSION при
+        удалении): промпты более старых версий больше не кэшируются.
+        """
+        self._local.pop(profile_id, None)
+        if version is not None:
+            self._remember_min_version(profile_id, version)
+
+        if broadcast:
+            try:
+                redis_client = get_redis(self.redis_url)
+                if version is not None:
+                    # Отметка о сбросе вместо удаления ключа - блокирует запись устаревших версий
+                    await self._store(profile_id, version, {"version": version})
+                else:
+                    await redis_client.delete(f"{self.PROMPT_KEY_PREFIX}{profile_id}")
+                await redis_client.publish(self.INVALIDATE_CHANNEL, f"{profile_id}:{version or ''}")
+            except Exception as e:
+                logger.warning(f"Failed to invalidate persona prompt {profile_id} in Redis: {e}")
+
+    async def _on_invalidation(self, data: str) -> None:
+        """Сброс промпта по сообщению другой реплики ("<profile_id>:<version>")"""
+        profile_id, _, version = data.partition(":")
+        await self.invalidate(int(profile_id), version or None, broadcast=False)
+
+    def start_listener(self) -> None:
+        """Запуск фоновой подписки на сброс промптов"""
+        if self._listener_task is None or self._listener_task.done():
+            self._listener_task = asyncio.create_task(
+                subscribe_invalidations(self.INVALIDATE_CHANNEL, self._on_invalidation, self.redis_url)
+            )
+
+    async def close(self) -> None:
+        """Остановка подписки на сброс промптов"""
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
+
+# Глобальный экземпляр кэша промптов персонажей
+persona_prompt_service = PersonaPromptService()
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from decimal import Decimal
+from enum import Enum
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from aiogram.types import InlineKeyboardMarkup
+from app.models import SubscriptionPlan
+from config.settings import settings
+from app.services.redis_client import get_redis, subscribe_invalidations
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def plan_type_key(plan_type) -> str:
+    """Нормализация типа плана к строке (PlanType или str)"""
+    if isinstance(plan_type, Enum):
+        return str(plan_type.value)
+    return str(plan_type)
+
+
+@dataclass(frozen=True)
+class PlanSnapshot:
+    """Неизменяемый снимок плана подписки, отвязанный от сессии БД"""
+    id: int
+    name: str
+    plan_type: str
+    duration_days: int
+    price: Decimal
+    currency: str
+    description: Optional[str]
+    features: Tuple[str, ...]
+    discount_percentage: int
+    is_popular: bool
+    price_per_month: Decimal
+    savings_percentage: int
+
+    @classmethod
+    def from_model(cls, plan: SubscriptionPlan) -> "PlanSnapshot":
+        """Создание снимка из ORM-модели"""
+        return cls(
+            id=plan.id,
+            name=plan.name,
+            plan_type=plan_type_key(plan.plan_type),
+            duration_days=plan.duration_days,
+            price=plan.price,
+            currency=plan.currency or "RUB",
+            description=plan.description,
+            features=tuple(plan.get_features_list()),
+            discount_percentage=plan.discount_percentage or 0,
+            is_popular=bool(plan.is_popular),
+            price_per_month=plan.price_per_month,
+            savings_percentage=plan.savings_percentage
+        )
+
+    def get_features_list(self) -> list:
+        """Получение списка особенностей плана"""
+        return list(self.features)
+
+
+@dataclass(frozen=True)
+class PlanCatalog:
+    """Каталог активных планов с версией содержимого"""
+    plans: Tuple[PlanSnapshot, ...]
+    by_id: Mapping[int, PlanSnapshot]
+    by_type: Mapping[str, PlanSnapshot]
+    version: str
+    loaded_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    @classmethod
+    def build(cls, plans: list) -> "PlanCatalog":
+        """Сборка каталога из списка снимков, отсортированных по длительности"""
+        snapshots = tuple(sorted(plans, key=lambda plan: plan.duration_days))
+
+        # Версия - хэш содержимого: одинаковые планы дают одинаковую версию на всех репликах
+        digest = hashlib.sha1(repr(snapshots).encode("utf-8")).hexdigest()[:12]
+
+        return cls(
+            plans=snapshots,
+            by_id=MappingProxyType({plan.id: plan for plan in snapshots}),
+            by_type=MappingProxyType({plan.plan_type: plan for plan in snapshots}),
+            version=digest
+        )
+
+
+@dataclass(frozen=True)
+class RenderedPlans:
+    """Готовые тексты и клавиатуры экрана тарифов для одной версии каталога"""
+    version: str
+    plans_text: str
+    plans_keyboard: InlineKeyboardMarkup
+    details_text: Mapping[int, str]
+    details_keyboards: Mapping[int, InlineKeyboardMarkup]
+
+
+class PlanCatalogService:
+    """
+    Кэш каталога планов подписки в памяти процесса
+
+    Планы меняются крайне редко, поэтому каталог загружается один раз
+    (при старте или первом обращении) и дальше поиск плана - чтение из словаря.
+    При изменении планов каталог сбрасывается на всех репликах
+    через Redis pub/sub и перечитывается при следующем обращении.
+    """
+
+    INVALIDATE_CHANNEL = "plans:catalog:invalidate"
+
+    def __init__(self, redis_url: str = None):
+        self.redis_url = redis_url or settings.redis_url
+        self._catalog: Optional[PlanCatalog] = None
+        self._lock = asyncio.Lock()
+        self._listener_task: Optional[asyncio.Task] = None
+
+    @property
+    def version(self) -> Optional[str]:
+        """Версия загруженного каталога"""
+        return self._catalog.version if self._catalog else None
+
+    async def load(self, session: AsyncSession) -> PlanCatalog:
+        """Загрузка активных планов из базы данных"""
+        result = await session.execute(
+            select(SubscriptionPlan)
+            .where(SubscriptionPlan.is_active == True)
+            .order_by(SubscriptionPlan.duration_days)
+        )
+        plans = [PlanSnapshot.from_model(plan) for plan in result.scalars().all()]
+
+        catalog = PlanCatalog.build(plans)
+        self._catalog = catalog
+        logger.info(f"Loaded subscription plan catalog: {len(catalog.plans)} plans, version {catalog.version}")
+        return catalog
+
+    async def get_catalog(self, session: AsyncSession) -> PlanCatalog:
+        """Получение каталога (загрузка при первом обращении)"""
+        catalog = self._catalog
+        if catalog is not None:
+            return catalog
+
+        async with self._lock:
+            # Каталог мог загрузить конкурирующий запрос, пока мы ждали блокировку
+            if self._catalog is None:
+                await self.load(session)
+            return self._catalog
+
+    async def invalidate(self, broadcast: bool = True) -> None:
+        """Сброс каталога (и оповещение других реплик)"""
+        self._catalog = None
+        logger.info("Subscription plan catalog invalidated")
+
+        if broadcast:
+            try:
+                redis_client = get_redis(self.redis_url)
+                await redis_client.publish(self.INVALIDATE_CHANNEL, "invalidate")
+            except Exception as e:
+                logger.warning(f"Failed to broadcast plan catalog invalidation: {e}")
+
+    async def _on_invalidation(self, data: str) -> None:
+        """Сброс каталога по сообщению другой реплики"""
+        await self.invalidate(broadcast=False)
+
+    def start_listener(self) -> None:
+        """Запуск фоновой подписки на сброс каталога"""
+        if self._listener_task is None or self._listener_task.done():
+            self._listener_task = asyncio.create_task(
+                subscribe_invalidations(self.INVALIDATE_CHANNEL, self._on_invalidation, self.redis_url)
+            )
+
+    async def close(self) -> None:
+        """Остановка подписки на сброс каталога"""
+        if self._listener_task:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
+
+# Глобальный экземпляр кэша каталога планов
+plan_catalog_service = PlanCatalogService()
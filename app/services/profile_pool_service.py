@@ -0,0 +1,250 @@
+import asyncio
+import json
+import re
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, FrozenSet, Optional
+from app.services.circuit_breaker import CircuitState, gemini_circuit_breaker
+from config.settings import settings
+from app.services.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Блокировка пополнения снимается и продлевается только владельцем (по токену)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+EXTEND_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Грубые теги предпочтений: тег -> начала слов, по которым он распознается
+PREFERENCE_TAGS = {
+    "cheerful": ("весел", "жизнерад", "позитив", "смешн", "юмор", "энергичн", "задорн"),
+    "calm": ("спокойн", "тих", "уравновешен", "мягк", "нежн", "скромн"),
+    "bold": ("дерзк", "смел", "страстн", "горяч", "стерв", "игрив"),
+    "romantic": ("романтич", "мечтательн", "чувствен", "ласков", "заботлив"),
+    "smart": ("умн", "интеллект", "начитан", "образован", "эрудир", "книг"),
+    "sporty": ("спорт", "фитнес", "йог", "бег", "трениров", "зож"),
+    "creative": ("творч", "рису", "музык", "искусств", "художн", "фотограф", "поэз", "стих"),
+    "geek": ("геймер", "видеоигр", "компьютерн", "аниме", "программ", "айти", "технолог"),
+    "traveler": ("путешеств", "поездк", "приключен", "авантюр"),
+    "homebody": ("домашн", "уют", "готовит", "кулинар", "хозяйствен")
+}
+
+_TAG_PATTERNS = {
+    tag: re.compile(r"\b(?:" + "|".join(prefixes) + r")\w*")
+    for tag, prefixes in PREFERENCE_TAGS.items()
+}
+
+
+def extract_tags(text: str) -> FrozenSet[str]:
+    """Теги предпочтений, найденные в тексте"""
+    text = (text or "").lower().replace("ё", "е")
+    return frozenset(tag for tag, pattern in _TAG_PATTERNS.items() if pattern.search(text))
+
+
+@dataclass(frozen=True)
+class ProfileBucket:
+    """Корзина пула: набор тегов и предпочтения, по которым генерируются профили"""
+    name: str
+    tags: FrozenSet[str]
+    seed_preferences: str
+
+
+PROFILE_BUCKETS = (
+    ProfileBucket("general", frozenset(), "Обычная современная девушка, общительная, с чувством юмора"),
+    ProfileBucket("cheerful", frozenset({"cheerful"}), "Веселая, жизнерадостная и энергичная девушка"),
+    ProfileBucket("calm", frozenset({"calm"}), "Спокойная, нежная и уравновешенная девушка"),
+    ProfileBucket("bold", frozenset({"bold"}), "Дерзкая, страстная и уверенная в себе девушка"),
+    ProfileBucket("romantic", frozenset({"romantic"}), "Романтичная, заботливая и ласковая девушка"),
+    ProfileBucket("smart", frozenset({"smart"}), "Умная, начитанная девушка, с которой интересно поговорить"),
+    ProfileBucket("sporty", frozenset({"sporty", "cheerful"}), "Спортивная, активная и веселая девушка, любит фитнес"),
+    ProfileBucket("creative", frozenset({"creative"}), "Творческая девушка, увлекается музыкой и искусством"),
+    ProfileBucket("geek", frozenset({"geek", "smart"}), "Умная девушка-геймер, любит технологии и аниме"),
+    ProfileBucket("traveler", frozenset({"traveler", "bold"}), "Смелая девушка, обожает путешествия и приключения"),
+    ProfileBucket("homebody", frozenset({"homebody", "calm"}), "Домашняя уютная девушка, любит готовить")
+)
+
+
+def match_score(user_tags: FrozenSet[str], bucket: ProfileBucket) -> float:
+    """Близость тегов пользователя и корзины (коэффициент Жаккара)"""
+    if not user_tags and not bucket.tags:
+        return 1.0
+    union = user_tags | bucket.tags
+    return len(user_tags & bucket.tags) / len(union) if union else 0.0
+
+
+class ProfilePoolService:
+    """
+    Пул заранее сгенерированных профилей девушек
+
+    Фоновый производитель поддерживает в Redis по pool_size готовых
+    провалидированных профилей в каждой корзине тегов. При создании
+    профиля с помощью ИИ из предпочтений пользователя извлекаются теги
+    и профиль сразу берется из ближайшей непустой корзины - без ожидания
+    ответа модели. Каждый профиль выдается один раз. Если подходящей
+    корзины нет, профиль генерируется как обычно.
+    """
+
+    POOL_KEY_PREFIX = "profiles:pool:"
+    REFILL_LOCK_KEY = "profiles:pool:refill_lock"
+    REFILL_LOCK_TTL_SECONDS = 300
+    REFINEMENT_KEY_PREFIX = "profiles:refinement:"
+    REFINEMENT_TTL_SECONDS = 86400
+
+    def __init__(
+        self,
+        redis_url: str = None,
+        pool_size: int = None,
+        refill_interval_seconds: int = None
+    ):
+        self.redis_url = redis_url or settings.redis_url
+        # Пул хранится в Redis - без него выдача из пула не включается
+        self.enabled = settings.profile_pool_enabled and bool(self.redis_url)
+        self.pool_size = pool_size or settings.profile_pool_bucket_size
+        self.refill_interval_seconds = refill_interval_seconds or settings.profile_pool_refill_interval_seconds
+        self._producer_task: Optional[asyncio.Task] = None
+        self._refill_requested = asyncio.Event()
+        self._background_tasks = set()
+
+    def _get_gemini_service(self):
+        # Общий экземпляр GeminiService; импорт здесь - gemini_service сам импортирует этот модуль
+        from app.services.gemini_service import gemini_service
+        return gemini_service
+
+    async def take(self, preferences: str, user_description: str = "") -> Optional[dict]:
+        """Выдача ближайшего по тегам готового профиля (None - подходящего нет)"""
+        user_tags = extract_tags(f"{preferences} {user_description}")
+        candidates = sorted(
+            (bucket for bucket in PROFILE_BUCKETS if match_score(user_tags, bucket) > 0),
+            key=lambda bucket: match_score(user_tags, bucket),
+            reverse=True
+        )
+
+        try:
+            redis_client = get_redis(self.redis_url)
+            for bucket in candidates:
+                raw = await redis_client.lpop(f"{self.POOL_KEY_PREFIX}{bucket.name}")
+                if raw:
+                    self._refill_requested.set()
+                    logger.info(f"Served pooled profile from bucket '{bucket.name}' for tags {sorted(user_tags)}")
+                    return json.loads(raw)
+        except Exception as e:
+            logger.warning(f"Failed to take profile from pool: {e}")
+
+        return None
+
+    async def save_refinement(self, profile_id: int, profile_version: str, profile_data: dict) -> None:
+        """Сохранение уточненного профиля как предложения для пользователя"""
+        redis_client = get_redis(self.redis_url)
+        await redis_client.setex(
+            f"{self.REFINEMENT_KEY_PREFIX}{profile_id}",
+            self.REFINEMENT_TTL_SECONDS,
+            json.dumps({"version": profile_version, "profile": profile_data}, ensure_ascii=False)
+        )
+
+    async def pop_refinement(self, profile_id: int) -> Optional[dict]:
+        """Предложение уточнения профиля: {"version", "profile"} (None - нет или истекло)"""
+        redis_client = get_redis(self.redis_url)
+        raw = await redis_client.getdel(f"{self.REFINEMENT_KEY_PREFIX}{profile_id}")
+        return json.loads(raw) if raw else None
+
+    async def refill(self) -> int:
+        """
+        Догенерация профилей в неполные корзины (одна реплика за раз)
+
+        Блокировка хранит уникальный токен реплики и продлевается после
+        каждого профиля. Если пополнение шло дольше TTL и блокировку
+        уже взяла другая реплика, эта реплика останавливается и не
+        снимает чужую блокировку.
+        """
+        redis_client = get_redis(self.redis_url)
+        token = uuid.uuid4().hex
+        if not await redis_client.set(self.REFILL_LOCK_KEY, token, nx=True, ex=self.REFILL_LOCK_TTL_SECONDS):
+            return 0
+
+        extend_lock = redis_client.register_script(EXTEND_LOCK_SCRIPT)
+        release_lock = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+        created = 0
+        try:
+            for bucket in PROFILE_BUCKETS:
+                key = f"{self.POOL_KEY_PREFIX}{bucket.name}"
+                missing = self.pool_size - await redis_client.llen(key)
+
+                for _ in range(max(0, missing)):
+                    if gemini_circuit_breaker.state == CircuitState.OPEN:
+                        # Gemini недоступен - не тратим пробные вызовы предохранителя на пул
+                        return created
+
+                    profile_data = await self._get_gemini_service().generate_profile(
+                        bucket.seed_preferences, use_cache=False
+                    )
+                    if profile_data is None:
+                        break
+
+                    await redis_client.rpush(key, json.dumps(profile_data, ensure_ascii=False))
+                    created += 1
+
+                    if not await extend_lock(keys=[self.REFILL_LOCK_KEY], args=[token, self.REFILL_LOCK_TTL_SECONDS]):
+                        logger.warning("Profile pool refill lock lost, stopping refill")
+                        return created
+        finally:
+            await release_lock(keys=[self.REFILL_LOCK_KEY], args=[token])
+
+        if created:
+            logger.info(f"Profile pool refilled with {created} profiles")
+        return created
+
+    async def _produce(self) -> None:
+        """Фоновое пополнение пула"""
+        while True:
+            try:
+                await self.refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Profile pool refill error: {e}")
+
+            # Спим до следующего интервала или до выдачи профиля из пула
+            try:
+                await asyncio.wait_for(self._refill_requested.wait(), timeout=self.refill_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._refill_requested.clear()
+
+    def start_producer(self) -> None:
+        """Запуск фонового пополнения пула"""
+        if self._producer_task is None or self._producer_task.done():
+            self._producer_task = asyncio.create_task(self._produce())
+
+    def run_in_background(self, coro: Awaitable) -> None:
+        """Запуск фоновой задачи (например, уточнения выданного профиля)"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def close(self) -> None:
+        """Остановка производителя и фоновых задач"""
+        if self._producer_task:
+            self._producer_task.cancel()
+            try:
+                await self._producer_task
+            except asyncio.CancelledError:
+                pass
+            self._producer_task = None
+
+        for task in list(self._background_tasks):
+            task.cancel()
+
+
+# Глобальный экземпляр пула профилей
+profile_pool_service = ProfilePoolService()
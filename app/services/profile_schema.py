@@ -0,0 +1,88 @@
+import json
+from typing import Optional
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+# Схема ответа для режима структурированного вывода Gemini (response_schema)
+PROFILE_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string"},
+        "age": {"type": "integer"},
+        "personality": {"type": "string"},
+        "appearance": {"type": "string"},
+        "interests": {"type": "string"},
+        "background": {"type": "string"},
+        "communication_style": {"type": "string"}
+    },
+    "required": ["name", "age", "personality", "appearance", "interests", "background", "communication_style"]
+}
+
+# Сколько позиций "{" пробовать при поиске объекта в тексте: каждая неудачная
+# попытка стоит O(длины текста), а в осмысленном ответе объект находится сразу
+MAX_JSON_OBJECT_CANDIDATES = 64
+
+PROFILE_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": PROFILE_RESPONSE_SCHEMA
+}
+
+
+class InvalidProfileOutput(ValueError):
+    """Ответ модели не является валидным профилем"""
+    pass
+
+
+class GeneratedProfile(BaseModel):
+    """Профиль девушки, сгенерированный моделью"""
+    name: str = Field(min_length=1, max_length=100)
+    age: int = Field(ge=18, le=50)
+    personality: str = Field(min_length=1)
+    appearance: str = Field(min_length=1)
+    interests: str = Field(min_length=1)
+    background: str = Field(min_length=1)
+    communication_style: str = Field(min_length=1)
+
+    @field_validator("name", "personality", "appearance", "interests", "background", "communication_style", mode="before")
+    @classmethod
+    def strip_text(cls, value):
+        # Модель иногда возвращает интересы списком
+        if isinstance(value, list):
+            value = ", ".join(str(item) for item in value)
+        return value.strip() if isinstance(value, str) else value
+
+
+def _find_json_object(text: str) -> Optional[dict]:
+    """Первый JSON-объект в тексте (для моделей без режима JSON, ответ в блоке кода)"""
+    decoder = json.JSONDecoder()
+    index = text.find("{")
+    for _ in range(MAX_JSON_OBJECT_CANDIDATES):
+        if index == -1:
+            break
+        try:
+            value, _ = decoder.raw_decode(text, index)
+            if isinstance(value, dict):
+                return value
+        except (json.JSONDecodeError, RecursionError):
+            pass
+        index = text.find("{", index + 1)
+    return None
+
+
+def parse_profile(text: Optional[str]) -> GeneratedProfile:
+    """Разбор и валидация профиля из ответа модели"""
+    if not text or not text.strip():
+        raise InvalidProfileOutput("Empty model output")
+
+    try:
+        data = json.loads(text)
+    except (json.JSONDecodeError, RecursionError):
+        # RecursionError - слишком глубокая вложенность скобок
+        data = _find_json_object(text)
+
+    if not isinstance(data, dict):
+        raise InvalidProfileOutput("Model output does not contain a JSON object")
+
+    try:
+        return GeneratedProfile.model_validate(data)
+    except ValidationError as e:
+        raise InvalidProfileOutput(f"Invalid profile fields: {e.error_count()} errors") from e
@@ -0,0 +1,70 @@
+"""
+Общее подключение к Redis для сервисов кэша
+
+Сервисы берут клиент через get_redis вместо собственного подключения:
+на адрес Redis в процессе один клиент с общим пулом соединений.
+Клиент создается при первом обращении, соединение открывается при
+первой команде. Закрывает клиенты close_redis при остановке бота.
+"""
+import asyncio
+import redis.asyncio as redis
+from typing import Awaitable, Callable, Dict
+from config.settings import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_clients: Dict[str, redis.Redis] = {}
+
+
+def get_redis(redis_url: str = None) -> redis.Redis:
+    """Клиент Redis для адреса (по умолчанию - REDIS_URL)"""
+    url = redis_url or settings.redis_url
+    client = _clients.get(url)
+    if client is None:
+        client = redis.from_url(
+            url,
+            encoding="utf-8",
+            decode_responses=True
+        )
+        _clients[url] = client
+    return client
+
+
+async def close_redis() -> None:
+    """Закрытие всех клиентов Redis"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+async def subscribe_invalidations(
+    channel: str,
+    callback: Callable[[str], Awaitable[None]],
+    redis_url: str = None,
+    retry_seconds: float = 5
+) -> None:
+    """
+    Прослушивание канала сброса кэша (запускается фоновой задачей)
+
+    callback получает данные каждого сообщения. Ошибка обработчика
+    пишется в лог и не прерывает подписку; при обрыве соединения
+    подписка восстанавливается через retry_seconds.
+    """
+    while True:
+        try:
+            async with get_redis(redis_url).pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        await callback(message["data"])
+                    except Exception as e:
+                        logger.warning(f"Failed to handle invalidation from {channel} ({message['data']!r}): {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Invalidation listener for {channel} error: {e}")
+            await asyncio.sleep(retry_seconds)
@@ -1,7 +1,10 @@
 import redis.asyncio as redis
+import time
 from datetime import datetime, timezone
 from typing import Dict, Optional
 from config.settings import settings
+from app.services.container import services
+from app.services.metrics import RATE_LIMIT_CHECKS, REDIS_SECONDS
 import logging
 
 logger = logging.getLogger(__name__)
@@ -48,6 +51,11 @@ class RedisRateLimiter:
             await self._redis.aclose()
             self._redis = None
     
+    def _record_check(self, outcome: str, started: float) -> None:
+        """Метрики проверки: результат и время обращений к Redis"""
+        RATE_LIMIT_CHECKS.labels(outcome).inc()
+        REDIS_SECONDS.labels("check_rate_limit").observe(time.perf_counter() - started)
+    
     def _get_current_timestamp(self) -> int:
         """Получение текущего timestamp в секундах"""
         return int(datetime.now(timezone.utc).timestamp())
@@ -106,6 +114,7 @@ class RedisRateLimiter:
                 'warning': False
             }
         
+        started = time.perf_counter()
         try:
             redis_client = await self._get_redis()
             ban_key = f"{self.BAN_KEY_PREFIX}{user_id}"
@@ -115,6 +124,7 @@ class RedisRateLimiter:
             # 1. Проверяем, забанен ли пользователь
             ban_remaining = await redis_client.ttl(ban_key)
             if ban_remaining > 0:
+                self._record_check("banned", started)
                 return {
                     'allowed': False,
                     'remaining': 0,
@@ -136,6 +146,7 @@ class RedisRateLimiter:
                 
                 logger.warning(f"User {user_id} rate limited: {current_count} messages, banned for {settings.rate_limit_ban_duration_seconds}s")
                 
+                self._record_check("limited", started)
                 return {
                     'allowed': False,
                     'remaining': 0,
@@ -160,6 +171,7 @@ class RedisRateLimiter:
                     warning = True
                     await redis_client.setex(warning_key, 60, "warned")
             
+            self._record_check("warned" if warning else "allowed", started)
             return {
                 'allowed': True,
                 'remaining': max(0, remaining),
@@ -171,6 +183,7 @@ class RedisRateLimiter:
             
         except Exception as e:
             logger.error(f"Error checking rate limit for user {user_id}: {e}")
+            self._record_check("error", started)
             # В случае ошибки разрешаем сообщение
             return {
                 'allowed': True,
@@ -190,12 +203,13 @@ class RedisRateLimiter:
             redis_client = await self._get_redis()
             count_key = f"{self.MESSAGE_COUNT_KEY_PREFIX}{user_id}"
             
-            # Увеличиваем счетчик на 1
-            current_count = await redis_client.incr(count_key)
-            
-            # Если это первое сообщение, устанавливаем TTL на 60 секунд
-            if current_count == 1:
-                await redis_client.expire(count_key, 60)
+            with REDIS_SECONDS.labels("record_message").time():
+                # Увеличиваем счетчик на 1
+                current_count = await redis_client.incr(count_key)
+                
+                # Если это первое сообщение, устанавливаем TTL на 60 секунд
+                if current_count == 1:
+                    await redis_client.expire(count_key, 60)
             
             logger.debug(f"User {user_id} message recorded, count: {current_count}")
             
@@ -257,4 +271,4 @@ class RedisRateLimiter:
             }
 
 # Глобальный экземпляр Redis rate limiter
-redis_rate_limiter = RedisRateLimiter()
\ No newline at end of file
+redis_rate_limiter = services.register("redis_rate_limiter", RedisRateLimiter)
\ No newline at end of file
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from typing import List, Optional
+from config.settings import settings
+from app.services.redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s!?.,)(:;)]+$")
+
+# Классы типовых реплик, на которые ответ не зависит от хода диалога
+CHAT_PROMPT_CLASSES = {
+    "greeting": re.compile(r"^(привет\w*|здравствуй\w*|хай|хей|приветик|доброе утро|добрый день|добрый вечер|hi|hello)$"),
+    "farewell": re.compile(r"^(пока|до завтра|до встречи|спокойной ночи|споки|bye)$"),
+    "thanks": re.compile(r"^(спасибо|спс|благодарю|thanks|thank you)$"),
+    "how_are_you": re.compile(r"^(как дела|как ты|как настроение|как поживаешь|как день прошел)$")
+}
+
+
+def normalize_prompt(text: str) -> str:
+    """Нормализация текста для ключа кэша: регистр, пробелы, юникод"""
+    text = unicodedata.normalize("NFKC", text or "").lower().replace("ё", "е")
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def normalize_chat_prompt(message: str) -> str:
+    """Нормализация реплики: дополнительно отбрасываются знаки и смайлы в конце"""
+    return _TRAILING_PUNCTUATION_RE.sub("", normalize_prompt(message))
+
+
+def classify_chat_prompt(message: str) -> Optional[str]:
+    """Класс типовой реплики пользователя (None - реплика не типовая)"""
+    normalized = normalize_chat_prompt(message)
+    for prompt_class, pattern in CHAT_PROMPT_CLASSES.items():
+        if pattern.match(normalized):
+            return prompt_class
+    return None
+
+
+def make_cache_key(call_type: str, model: str, prompt: str, params: Optional[dict] = None) -> str:
+    """Хэш нормализованного промпта, модели и параметров генерации"""
+    payload = json.dumps(
+        {"call_type": call_type, "model": model, "prompt": normalize_prompt(prompt), "params": params or {}},
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCacheService:
+    """
+    Кэш ответов Gemini в Redis (включается настройкой)
+
+    Ответ ищется по точному совпадению ключа: нормализованный промпт,
+    модель и параметры генерации. Ответ хранится под моделью, которая его
+    дала (с учетом переключения на запасные), поэтому поиск идет сразу по
+    ключам всех моделей цепочки. Записи живут ttl_seconds, число записей
+    ограничено max_entries - при переполнении удаляются самые старые.
+    Ответы в диалоге кэшируются только для классов реплик из белого
+    списка (приветствие, благодарность и т.п.).
+    """
+
+    KEY_PREFIX = "gemini:response:"
+    INDEX_KEY = "gemini:response:index"
+
+    def __init__(
+        self,
+        redis_url: str = None,
+        enabled: bool = None,
+        ttl_seconds: int = None,
+        max_entries: int = None,
+        chat_classes: str = None
+    ):
+        self.redis_url = redis_url or settings.redis_url
+        self.enabled = settings.gemini_response_cache_enabled if enabled is None else enabled
+        self.ttl_seconds = ttl_seconds or settings.gemini_response_cache_ttl_seconds
+        self.max_entries = max_entries or settings.gemini_response_cache_max_entries
+        classes = settings.gemini_response_cache_chat_classes if chat_classes is None else chat_classes
+        self.chat_classes = {name.strip() for name in classes.split(",") if name.strip()}
+        self.stats = {}
+
+    def _count(self, call_type: str, result: str) -> None:
+        counters = self.stats.setdefault(call_type, {"hits": 0, "misses": 0, "stores": 0, "errors": 0})
+        counters[result] += 1
+
+    def is_chat_cacheable(self, message: str) -> Optional[str]:
+        """Класс реплики, если ответ на нее можно брать из кэша"""
+        if not self.enabled:
+            return None
+        prompt_class = classify_chat_prompt(message)
+        return prompt_class if prompt_class in self.chat_classes else None
+
+    async def get(self, call_type: str, key: str) -> Optional[str]:
+        """Получение ответа из кэша"""
+        return await self.get_first(call_type, [key])
+
+    async def get_first(self, call_type: str, keys: List[str]) -> Optional[str]:
+        """Первый найденный ответ по списку ключей (в порядке списка)"""
+        if not self.enabled or not keys:
+            return None
+
+        try:
+            redis_client = get_redis(self.redis_url)
+            values = await redis_client.mget([f"{self.KEY_PREFIX}{key}" for key in keys])
+            value = next((value for value in values if value is not None), None)
+        except Exception as e:
+            self._count(call_type, "errors")
+            logger.warning(f"Failed to read Gemini response cache: {e}")
+            return None
+
+        self._count(call_type, "hits" if value is not None else "misses")
+        return value
+
+    async def set(self, call_type: str, key: str, value: str) -> None:
+        """Сохранение ответа с TTL и вытеснением самых старых записей"""
+        if not self.enabled:
+            return
+
+        try:
+            redis_client = get_redis(self.redis_url)
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.setex(f"{self.KEY_PREFIX}{key}", self.ttl_seconds, value)
+                pipe.zadd(self.INDEX_KEY, {key: time.time()})
+                # Записи с истекшим TTL убираем и из индекса
+                pipe.zremrangebyscore(self.INDEX_KEY, 0, time.time() - self.ttl_seconds)
+                pipe.zcard(self.INDEX_KEY)
+                results = await pipe.execute()
+
+            overflow = results[-1] - self.max_entries
+            if overflow > 0:
+                evicted = await redis_client.zpopmin(self.INDEX_KEY, overflow)
+                if evicted:
+                    await redis_client.delete(*[f"{self.KEY_PREFIX}{member}" for member, _ in evicted])
+
+            self._count(call_type, "stores")
+        except Exception as e:
+            self._count(call_type, "errors")
+            logger.warning(f"Failed to store Gemini response in cache: {e}")
+
+    def get_stats(self) -> dict:
+        """Попадания и промахи кэша по типам вызовов"""
+        result = {}
+        for call_type, counters in self.stats.items():
+            lookups = counters["hits"] + counters["misses"]
+            result[call_type] = {
+                **counters,
+                "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0
+            }
+        return result
+
+
+# Глобальный экземпляр кэша ответов
+response_cache_service = ResponseCacheService()
@@ -1,56 +1,163 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.jobstores.memory import MemoryJobStore
 from app.services.notification_service import NotificationService
+from app.services.job_checkpoint_service import job_checkpoint_service
 from config.settings import settings
+from datetime import datetime, timezone
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+NOTIFICATIONS_JOB_ID = 'subscription_notifications'
+
+# Бот, используемый задачами планировщика.
+# Задачи ссылаются на функции модуля, а не на методы экземпляра,
+# чтобы их можно было сохранить в персистентное хранилище.
+_scheduler_bot = None
+
+
+async def check_subscription_notifications():
+    """Периодическая проверка уведомлений с обработкой ошибок"""
+    try:
+        logger.info("Starting scheduled notification check...")
+        stats = await NotificationService.check_and_send_notifications(
+            _scheduler_bot, checkpoint_job_id=NOTIFICATIONS_JOB_ID
+        )
+        logger.info(f"Notification check completed: {stats}")
+    except Exception as e:
+        logger.error(f"Error in scheduled notification check: {e}")
+
+
+async def resume_interrupted_notifications():
+    """Дозапуск проверки уведомлений, прерванной перезапуском"""
+    if await job_checkpoint_service.has_checkpoint(NOTIFICATIONS_JOB_ID):
+        logger.info("Found unfinished notification check, resuming from checkpoint")
+        await check_subscription_notifications()
+
+
+def _get_sync_database_url(database_url: str) -> str:
+    """Преобразование asyncpg URL в синхронный (APScheduler работает с синхронным драйвером)"""
+    if "asyncpg" in database_url:
+        return database_url.replace("postgresql+asyncpg://", "postgresql://")
+    return database_url
+
+
 class SchedulerService:
     def __init__(self, bot):
+        global _scheduler_bot
+        _scheduler_bot = bot
+
         self.bot = bot
-        self.scheduler = AsyncIOScheduler()
-        self._setup_jobs()
-    
+        self.scheduler = AsyncIOScheduler(
+            jobstores={'default': self._create_jobstore()},
+            job_defaults={
+                'coalesce': settings.scheduler_coalesce,  # Пропущенные запуски схлопываются в один
+                'misfire_grace_time': settings.scheduler_misfire_grace_time_seconds,
+                'max_instances': 1  # Предотвращаем одновременное выполнение
+            },
+            timezone=timezone.utc,
+            # Запуск идет в отдельном потоке, где планировщик не найдет event loop сам
+            event_loop=asyncio.get_event_loop()
+        )
+
+    def _create_jobstore(self):
+        """Создание хранилища задач согласно настройкам"""
+        backend = settings.scheduler_jobstore.lower()
+
+        if backend == "redis":
+            from apscheduler.jobstores.redis import RedisJobStore
+            from redis import ConnectionPool
+
+            url = settings.scheduler_jobstore_url or settings.redis_url
+            logger.info("Using Redis job store for scheduler")
+            return RedisJobStore(
+                jobs_key='scheduler:jobs',
+                run_times_key='scheduler:run_times',
+                connection_pool=ConnectionPool.from_url(url)
+            )
+
+        if backend == "sqlalchemy":
+            from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+
+            url = settings.scheduler_jobstore_url or _get_sync_database_url(settings.database_url)
+            logger.info("Using SQLAlchemy job store for scheduler")
+            try:
+                return SQLAlchemyJobStore(url=url, tablename='apscheduler_jobs')
+            except ImportError as e:
+                # Иначе планировщик молча не запустится: ошибку в main только логируют
+                raise RuntimeError(
+                    f"SQLAlchemy job store needs a synchronous driver ({e}); "
+                    f"install psycopg2-binary or set SCHEDULER_JOBSTORE_URL"
+                ) from e
+
+        if backend != "memory":
+            logger.warning(f"Unknown scheduler job store '{backend}', using memory job store")
+
+        return MemoryJobStore()
+
     def _setup_jobs(self):
         """Настройка периодических задач"""
         if not settings.enable_subscription_notifications:
             logger.info("Subscription notifications disabled, skipping scheduler setup")
             return
-        
-        # Добавляем задачу проверки уведомлений
+
+        interval_seconds = settings.notification_check_interval_hours * 3600
+        existing_job = self.scheduler.get_job(NOTIFICATIONS_JOB_ID)
+        existing_interval = getattr(existing_job.trigger, 'interval', None) if existing_job else None
+
+        if existing_interval and existing_interval.total_seconds() == interval_seconds:
+            # Задача восстановлена из хранилища - сохраняем время следующего запуска,
+            # чтобы после перезапуска не ждать полный интервал заново
+            logger.info(f"Restored subscription notifications job, next run at {existing_job.next_run_time}")
+        else:
+            # Добавляем задачу проверки уведомлений
+            self.scheduler.add_job(
+                func=check_subscription_notifications,
+                trigger=IntervalTrigger(hours=settings.notification_check_interval_hours),
+                id=NOTIFICATIONS_JOB_ID,
+                name='Check subscription notifications',
+                replace_existing=True
+            )
+            logger.info(f"Scheduled subscription notifications check every {settings.notification_check_interval_hours} hours")
+
+        # Однократная задача: продолжает прогон, прерванный перезапуском
         self.scheduler.add_job(
-            func=self._check_notifications,
-            trigger=IntervalTrigger(hours=settings.notification_check_interval_hours),
-            id='subscription_notifications',
-            name='Check subscription notifications',
-            replace_existing=True,
-            max_instances=1  # Предотвращаем одновременное выполнение
+            func=resume_interrupted_notifications,
+            trigger='date',
+            run_date=datetime.now(timezone.utc),
+            id=f'{NOTIFICATIONS_JOB_ID}_resume',
+            name='Resume interrupted subscription notifications check',
+            replace_existing=True
         )
-        
-        logger.info(f"Scheduled subscription notifications check every {settings.notification_check_interval_hours} hours")
-    
-    async def _check_notifications(self):
-        """Обертка для проверки уведомлений с обработкой ошибок"""
-        try:
-            logger.info("Starting scheduled notification check...")
-            stats = await NotificationService.check_and_send_notifications(self.bot)
-            logger.info(f"Notification check completed: {stats}")
-        except Exception as e:
-            logger.error(f"Error in scheduled notification check: {e}")
-    
-    def start(self):
-        """Запуск планировщика"""
+
+    def _start_sync(self):
+        # Задачи настраиваются после запуска, когда хранилище уже загружено
+        self.scheduler.start()
+        self._setup_jobs()
+
+    async def start(self):
+        """
+        Запуск планировщика
+
+        Хранилища Redis и SQLAlchemy синхронные: подключение, создание
+        таблицы и чтение задач выполняются в отдельном потоке, а не в
+        event loop. Если постоянное хранилище недоступно, ошибка
+        пробрасывается - иначе бот работал бы без задач уведомлений.
+        """
         if not settings.enable_subscription_notifications:
             logger.info("Subscription notifications disabled, scheduler not started")
             return
-        
+
         try:
-            self.scheduler.start()
+            await asyncio.to_thread(self._start_sync)
             logger.info("Scheduler started successfully")
         except Exception as e:
             logger.error(f"Error starting scheduler: {e}")
-    
+            if settings.scheduler_jobstore.lower() != "memory":
+                raise
+
     async def shutdown(self):
         """Остановка планировщика"""
         try:
@@ -59,7 +166,7 @@ class SchedulerService:
                 logger.info("Scheduler shutdown completed")
         except Exception as e:
             logger.error(f"Error shutting down scheduler: {e}")
-    
+
     def get_jobs_info(self) -> list:
         """Получение информации о запланированных задачах"""
         jobs = []
@@ -71,8 +178,8 @@ class SchedulerService:
                 'trigger': str(job.trigger)
             })
         return jobs
-    
+
     async def run_notification_check_now(self) -> dict:
         """Принудительный запуск проверки уведомлений"""
         logger.info("Manual notification check triggered")
-        return await NotificationService.check_and_send_notifications(self.bot)
\ No newline at end of file
+        return await NotificationService.check_and_send_notifications(self.bot)
@@ -1,43 +1,48 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models import SubscriptionPlan, PlanType
+from app.services.plan_catalog_service import (
+    plan_catalog_service, plan_type_key, PlanSnapshot, PlanCatalog, RenderedPlans
+)
+from app.utils.keyboards import get_subscription_plans_keyboard, get_plan_details_keyboard
+from types import MappingProxyType
 from typing import List, Optional
 from decimal import Decimal
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Отрисованный экран тарифов для текущей версии каталога
+_rendered_plans: Optional[RenderedPlans] = None
+
 class SubscriptionPlanService:
     @staticmethod
-    async def get_all_active_plans(session: AsyncSession) -> List[SubscriptionPlan]:
-        """Получение всех активных планов подписки"""
-        result = await session.execute(
-            select(SubscriptionPlan)
-            .where(SubscriptionPlan.is_active == True)
-            .order_by(SubscriptionPlan.duration_days)
-        )
-        return result.scalars().all()
+    async def get_all_active_plans(session: AsyncSession) -> List[PlanSnapshot]:
+        """Получение всех активных планов подписки (из кэша каталога)"""
+        catalog = await plan_catalog_service.get_catalog(session)
+        return list(catalog.plans)
     
     @staticmethod
-    async def get_plan_by_id(session: AsyncSession, plan_id: int) -> Optional[SubscriptionPlan]:
-        """Получение плана по ID"""
+    async def get_plan_by_id(session: AsyncSession, plan_id: int) -> Optional[PlanSnapshot]:
+        """Получение плана по ID (из кэша каталога)"""
+        catalog = await plan_catalog_service.get_catalog(session)
+        plan = catalog.by_id.get(plan_id)
+        if plan:
+            return plan
+        
+        # В каталоге только активные планы - отключенный план ищем в базе
         result = await session.execute(
             select(SubscriptionPlan)
             .where(SubscriptionPlan.id == plan_id)
         )
-        return result.scalar_one_or_none()
+        plan = result.scalar_one_or_none()
+        return PlanSnapshot.from_model(plan) if plan else None
     
     @staticmethod
-    async def get_plan_by_type(session: AsyncSession, plan_type: PlanType) -> Optional[SubscriptionPlan]:
-        """Получение плана по типу"""
-        result = await session.execute(
-            select(SubscriptionPlan)
-            .where(
-                SubscriptionPlan.plan_type == plan_type,
-                SubscriptionPlan.is_active == True
-            )
-        )
-        return result.scalar_one_or_none()
+    async def get_plan_by_type(session: AsyncSession, plan_type: PlanType) -> Optional[PlanSnapshot]:
+        """Получение плана по типу (из кэша каталога)"""
+        catalog = await plan_catalog_service.get_catalog(session)
+        return catalog.by_type.get(plan_type_key(plan_type))
     
     @staticmethod
     async def create_default_plans(session: AsyncSession) -> List[SubscriptionPlan]:
@@ -89,12 +94,17 @@ class SubscriptionPlanService:
             }
         ]
         
+        # Проверяем существующие планы напрямую в базе, минуя кэш
+        result = await session.execute(
+            select(SubscriptionPlan.plan_type)
+            .where(SubscriptionPlan.is_active == True)
+        )
+        existing_types = set(result.scalars().all())
+        
         created_plans = []
         for plan_data in plans_data:
             # Проверяем, существует ли уже план такого типа
-            existing_plan = await SubscriptionPlanService.get_plan_by_type(
-                session, plan_data["plan_type"]
-            )
+            existing_plan = plan_type_key(plan_data["plan_type"]) in existing_types
             
             if not existing_plan:
                 plan = SubscriptionPlan(
@@ -118,21 +128,68 @@ class SubscriptionPlanService:
             await session.commit()
             for plan in created_plans:
                 await session.refresh(plan)
+            
+            # Состав планов изменился - сбрасываем каталог на всех репликах
+            await plan_catalog_service.invalidate()
         
         return created_plans
     
     @staticmethod
     async def initialize_plans_if_needed(session: AsyncSession):
-        """Инициализация планов, если их нет в базе"""
-        existing_plans = await SubscriptionPlanService.get_all_active_plans(session)
+        """Инициализация планов, если их нет в базе, и предзагрузка каталога"""
+        catalog = await plan_catalog_service.load(session)
         
-        if not existing_plans:
+        if not catalog.plans:
             logger.info("No subscription plans found, creating default plans...")
             await SubscriptionPlanService.create_default_plans(session)
+            await plan_catalog_service.load(session)
             logger.info("Default subscription plans created successfully")
     
     @staticmethod
-    def format_plan_info(plan: SubscriptionPlan) -> str:
+    def format_plan_details(plan: PlanSnapshot) -> str:
+        """Текст экрана подтверждения покупки плана"""
+        return (
+            f"💳 **Подробности плана:**\n\n"
+            f"{SubscriptionPlanService.format_plan_info(plan)}\n\n"
+            f"Подтвердите покупку:"
+        )
+    
+    @staticmethod
+    def render_catalog(catalog: PlanCatalog) -> RenderedPlans:
+        """Отрисовка текстов и клавиатур экрана тарифов для версии каталога"""
+        plans_text = "💳 **Выберите план подписки:**\n\n"
+        for plan in catalog.plans:
+            plans_text += f"{SubscriptionPlanService.format_plan_info(plan)}\n\n"
+            plans_text += "---\n\n"
+        
+        return RenderedPlans(
+            version=catalog.version,
+            plans_text=plans_text,
+            plans_keyboard=get_subscription_plans_keyboard(list(catalog.plans)),
+            details_text=MappingProxyType({
+                plan.id: SubscriptionPlanService.format_plan_details(plan) for plan in catalog.plans
+            }),
+            details_keyboards=MappingProxyType({
+                plan.id: get_plan_details_keyboard(plan.id) for plan in catalog.plans
+            })
+        )
+    
+    @staticmethod
+    async def get_rendered_plans(session: AsyncSession) -> RenderedPlans:
+        """Получение отрисованного экрана тарифов (перерисовка только при смене версии каталога)"""
+        global _rendered_plans
+        
+        catalog = await plan_catalog_service.get_catalog(session)
+        rendered = _rendered_plans
+        if rendered is None or rendered.version != catalog.version:
+            rendered = SubscriptionPlanService.render_catalog(catalog)
+            _rendered_plans = rendered
+            logger.info(f"Rendered subscription plans screen for catalog version {catalog.version}")
+        
+        return rendered
+    
+    @staticmethod
+    def format_plan_info(plan: PlanSnapshot) -> str:
         """Форматирование информации о плане для отображения"""
         try:
             features = plan.get_features_list()
@@ -164,7 +221,7 @@ class SubscriptionPlanService:
             return f"💎 **{plan.name}**\n💰 Цена: {plan.price}₽\n📅 Период: {plan.duration_days} дней"
     
     @staticmethod
-    def get_plan_emoji(plan: SubscriptionPlan) -> str:
+    def get_plan_emoji(plan: PlanSnapshot) -> str:
         """Получение эмодзи для плана"""
         emoji_map = {
             PlanType.MONTHLY: "📅",
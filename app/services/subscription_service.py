@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_
-from app.models import Subscription, User, SubscriptionStatus, SubscriptionPlan
+from app.models import Subscription, User, SubscriptionStatus
+from app.services.plan_catalog_service import PlanSnapshot
 from datetime import datetime, timedelta, timezone
 from config.settings import settings
 from typing import Optional, List
@@ -78,10 +79,10 @@ class SubscriptionService:
     async def create_paid_subscription(
         session: AsyncSession, 
         user: User, 
-        plan: SubscriptionPlan,
+        plan: PlanSnapshot,
         payment_id: str
     ) -> Subscription:
-        """Создание платной подписки"""
+        """Создание платной подписки (план - снимок из каталога, нужны только id и длительность)"""
         # Деактивируем все предыдущие подписки
         await SubscriptionService.deactivate_all_user_subscriptions(session, user.id)
         
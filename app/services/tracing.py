@@ -0,0 +1,221 @@
+"""
+Трассировка запросов (OpenTelemetry)
+
+Обработка обновления - один трейс: корневой спан обновления, спаны
+обработчика и декораторов (error_handler, rate_limit, user_required,
+subscription_required), а внутри - SQL-запросы, команды Redis, вызовы
+Gemini и запросы к Bot API. По трейсу медленного ответа видно, на какой
+шаг ушло время.
+
+По умолчанию выключена (TRACING_ENABLED). Спаны пишутся в файл JSON Lines
+(TRACING_EXPORTER=file), в консоль или в OTLP-коллектор (otlp, нужен пакет
+opentelemetry-exporter-otlp-proto-http). Без включенной трассировки SDK не
+импортируется, а декораторы не оборачивают функции.
+"""
+import os
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from sqlalchemy import event
+from config.settings import settings
+from app.services.metrics import get_statement_type
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Прокси-трассировщик: до setup_tracing спаны не записываются
+tracer = trace.get_tracer("girlfriend_bot")
+
+_provider = None
+
+
+def create_exporter():
+    """Экспортер спанов по настройке TRACING_EXPORTER"""
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    exporter = settings.tracing_exporter.lower()
+    if exporter == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            return OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+        except ImportError:
+            logger.warning("opentelemetry-exporter-otlp-proto-http is not installed, writing traces to file")
+            exporter = "file"
+    if exporter == "console":
+        return ConsoleSpanExporter()
+    if exporter != "file":
+        logger.warning(f"Unknown tracing exporter {exporter}, writing traces to file")
+
+    # Одна строка JSON на спан; файл открыт на дозапись, поэтому процессы webhook могут писать в один файл
+    output = open(settings.tracing_file_path, "a", encoding="utf-8")
+    return ConsoleSpanExporter(out=output, formatter=lambda span: span.to_json(indent=None) + "\n")
+
+
+def setup_tracing(worker: int = 0) -> None:
+    """Включение трассировки в процессе (один раз, до обработки обновлений)"""
+    global _provider
+    if not settings.tracing_enabled or _provider is not None:
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    resource = Resource.create({
+        "service.name": settings.tracing_service_name,
+        "service.instance.id": str(os.getpid()),
+        "bot.worker": worker
+    })
+    _provider = TracerProvider(resource=resource, sampler=ParentBased(TraceIdRatioBased(settings.tracing_sample_ratio)))
+    _provider.add_span_processor(BatchSpanProcessor(create_exporter()))
+    trace.set_tracer_provider(_provider)
+    instrument_redis()
+    logger.info(f"Tracing enabled: exporter {settings.tracing_exporter}, sample ratio {settings.tracing_sample_ratio}")
+
+
+def shutdown_tracing() -> None:
+    """Отправка накопленных спанов при остановке"""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def traced(span_name: str):
+    """Декоратор корутины: вызов в отдельном спане (без трассировки функция не оборачивается)"""
+    def decorator(func):
+        if not settings.tracing_enabled:
+            return func
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(span_name, attributes={"code.function": func.__name__}):
+                return await func(*args, **kwargs)
+
+        return wrapper
+    return decorator
+
+
+class UpdateTracingMiddleware(BaseMiddleware):
+    """Корневой спан обработки обновления"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        with tracer.start_as_current_span(
+            f"update {event.event_type}",
+            kind=SpanKind.SERVER,
+            attributes={"telegram.update_id": event.update_id}
+        ):
+            return await handler(event, data)
+
+
+class HandlerTracingMiddleware(BaseMiddleware):
+    """Спан обработчика: роутер и имя функции"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        router = data.get("event_router")
+        handler_object = data.get("handler")
+        router_name = router.name if router is not None else ""
+        handler_name = handler_object.callback.__name__ if handler_object is not None else ""
+        with tracer.start_as_current_span(
+            f"handler {router_name}.{handler_name}",
+            attributes={"bot.router": router_name, "code.function": handler_name}
+        ):
+            return await handler(event, data)
+
+
+class BotApiTracingMiddleware(BaseRequestMiddleware):
+    """Спан запроса к Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        api_method = method.__api_method__
+        with tracer.start_as_current_span(
+            f"telegram {api_method}",
+            kind=SpanKind.CLIENT,
+            attributes={"telegram.method": api_method}
+        ):
+            return await make_request(bot, method)
+
+
+def setup_bot_tracing(dispatcher: Dispatcher, bot) -> None:
+    """Middleware трассировки обновлений, обработчиков и запросов к Bot API"""
+    dispatcher.update.outer_middleware(UpdateTracingMiddleware())
+    for event_name, observer in dispatcher.observers.items():
+        if event_name not in ("update", "error"):
+            observer.middleware(HandlerTracingMiddleware())
+    bot.session.middleware(BotApiTracingMiddleware())
+
+
+def trace_engine(engine) -> None:
+    """Спан на каждый SQL-запрос через события движка SQLAlchemy"""
+    sync_engine = engine.sync_engine
+    db_system = sync_engine.dialect.name
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Текст запроса без параметров - значения пользователей в трейсы не попадают
+        span = tracer.start_span(
+            f"db {get_statement_type(statement)}",
+            kind=SpanKind.CLIENT,
+            attributes={"db.system": db_system, "db.statement": statement[:2000]}
+        )
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info["trace_spans"].pop().end()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        spans = context.connection.info.get("trace_spans") if context.connection is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_exception(context.original_exception)
+            span.set_status(Status(StatusCode.ERROR, type(context.original_exception).__name__))
+            span.end()
+
+
+def instrument_redis() -> None:
+    """Спан на каждую команду и конвейер Redis (все клиенты процесса, включая хранилище FSM)"""
+    from redis.asyncio.client import Pipeline, Redis
+
+    if getattr(Redis.execute_command, "__traced__", False):
+        return
+
+    execute_command = Redis.execute_command
+    pipeline_execute = Pipeline.execute
+
+    @wraps(execute_command)
+    async def traced_execute_command(self, *args, **options):
+        command = str(args[0]) if args else ""
+        with tracer.start_as_current_span(
+            f"redis {command}",
+            kind=SpanKind.CLIENT,
+            attributes={"db.system": "redis", "db.operation": command}
+        ):
+            return await execute_command(self, *args, **options)
+
+    @wraps(pipeline_execute)
+    async def traced_pipeline_execute(self, *args, **kwargs):
+        with tracer.start_as_current_span(
+            "redis pipeline",
+            kind=SpanKind.CLIENT,
+            attributes={"db.system": "redis", "db.redis.pipeline_length": len(self.command_stack)}
+        ):
+            return await pipeline_execute(self, *args, **kwargs)
+
+    traced_execute_command.__traced__ = True
+    Redis.execute_command = traced_execute_command
+    Pipeline.execute = traced_pipeline_execute
@@ -4,12 +4,15 @@ from app.services.database import db_service
 from app.services.user_service import UserService
 from app.services.subscription_service import SubscriptionService
 from app.services.redis_rate_limiter import redis_rate_limiter
+from app.services.tracing import traced
+from app.services.metrics import record_handler_error
 import logging
 
 logger = logging.getLogger(__name__)
 
 def subscription_required(func):
     """Декоратор для проверки наличия активной подписки"""
+    @traced("subscription_required")
     @wraps(func)
     async def wrapper(message_or_callback, *args, **kwargs):
         # Определяем тип объекта (сообщение или callback)
@@ -52,6 +55,7 @@ def subscription_required(func):
 
 def rate_limit(func):
     """Декоратор для применения rate limiting"""
+    @traced("rate_limit")
     @wraps(func)
     async def wrapper(message_or_callback, *args, **kwargs):
         # Определяем тип объекта и получаем user_id
@@ -132,6 +136,7 @@ def rate_limit(func):
 
 def user_required(func):
     """Декоратор для автоматической регистрации пользователя"""
+    @traced("user_required")
     @wraps(func)
     async def wrapper(message_or_callback, *args, **kwargs):
         # Определяем тип объекта
@@ -164,6 +169,7 @@ def user_required(func):
 
 def error_handler(func):
     """Декоратор для обработки ошибок"""
+    @traced("error_handler")
     @wraps(func)
     async def wrapper(*args, **kwargs):
         try:
@@ -171,8 +177,11 @@ def error_handler(func):
         except Exception as e:
             logger.error(f"Error in {func.__name__}: {e}", exc_info=True)
             
-            # Пытаемся отправить сообщение об ошибке пользователю
+            # Исключение не выходит из обработчика - middleware метрик его не увидит
             message_or_callback = args[0] if args else None
+            record_handler_error(message_or_callback, func, e)
+            
+            # Пытаемся отправить сообщение об ошибке пользователю
             if isinstance(message_or_callback, (types.Message, types.CallbackQuery)):
                 try:
                     if isinstance(message_or_callback, types.Message):
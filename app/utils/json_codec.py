@@ -0,0 +1,68 @@
+"""
+Сериализация JSON для webhook-обработчиков, сессии бота и FSM
+
+Бэкенд выбирается настройкой JSON_BACKEND: json (стандартная библиотека),
+orjson или msgspec. Обе библиотеки разбирают и собирают обновления Telegram
+в несколько раз быстрее json. Они необязательные: если выбранной нет,
+используется json с предупреждением в логе. Формат данных одинаковый,
+поэтому бэкенд можно сменить без очистки FSM в Redis.
+"""
+import json
+from typing import Any, Callable, Tuple, Union
+from config.settings import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+JsonLoads = Callable[[Union[str, bytes]], Any]
+JsonDumps = Callable[[Any], str]
+
+
+def _stdlib_codec() -> Tuple[JsonLoads, JsonDumps]:
+    return json.loads, json.dumps
+
+
+def _orjson_codec() -> Tuple[JsonLoads, JsonDumps]:
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        # aiogram и aiohttp ожидают str, orjson возвращает bytes
+        return orjson.dumps(obj).decode()
+
+    return orjson.loads, dumps
+
+
+def _msgspec_codec() -> Tuple[JsonLoads, JsonDumps]:
+    import msgspec
+
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+
+    def dumps(obj: Any) -> str:
+        return encoder.encode(obj).decode()
+
+    return decoder.decode, dumps
+
+
+CODECS = {
+    "json": _stdlib_codec,
+    "orjson": _orjson_codec,
+    "msgspec": _msgspec_codec,
+}
+
+
+def get_json_codec(backend: str = None) -> Tuple[JsonLoads, JsonDumps]:
+    """Пара (loads, dumps) для бэкенда; при недоступной библиотеке - стандартный json"""
+    backend = (backend or settings.json_backend).lower()
+    factory = CODECS.get(backend)
+    if factory is None:
+        logger.warning(f"Unknown JSON backend {backend}, using json")
+        return _stdlib_codec()
+    try:
+        return factory()
+    except ImportError:
+        logger.warning(f"JSON backend {backend} is not installed, using json")
+        return _stdlib_codec()
+
+
+json_loads, json_dumps = get_json_codec()
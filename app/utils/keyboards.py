@@ -1,6 +1,27 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
+from functools import lru_cache
 
+# Реестр клавиатур, которые собираются один раз на набор параметров.
+# Разметка aiogram неизменяема (frozen pydantic-модели), поэтому один
+# экземпляр можно безопасно отправлять во всех ответах.
+KEYBOARD_REGISTRY = {}
+
+
+def registered_keyboard(func):
+    """Декоратор: кэширует клавиатуру по аргументам и регистрирует ее в реестре"""
+    cached = lru_cache(maxsize=256)(func)
+    KEYBOARD_REGISTRY[func.__name__] = cached
+    return cached
+
+
+def clear_keyboard_cache():
+    """Сброс всех закэшированных клавиатур"""
+    for cached in KEYBOARD_REGISTRY.values():
+        cached.cache_clear()
+
+
+@registered_keyboard
 def get_main_keyboard() -> ReplyKeyboardMarkup:
     """Основная клавиатура"""
     builder = ReplyKeyboardBuilder()
@@ -19,10 +40,14 @@ def get_main_keyboard() -> ReplyKeyboardMarkup:
 
 def get_subscription_keyboard(subscription_info: dict) -> InlineKeyboardMarkup:
     """Клавиатура для управления подпиской"""
+    return _get_subscription_keyboard(bool(subscription_info.get("has_subscription", False)))
+
+
+@registered_keyboard
+def _get_subscription_keyboard(has_subscription: bool) -> InlineKeyboardMarkup:
+    """Клавиатура для управления подпиской (зависит только от наличия подписки)"""
     builder = InlineKeyboardBuilder()
     
-    has_subscription = subscription_info.get("has_subscription", False)
-    
     if not has_subscription:
         builder.row(
             InlineKeyboardButton(
@@ -48,6 +73,7 @@ def get_subscription_keyboard(subscription_info: dict) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@registered_keyboard
 def get_profile_keyboard(has_profile: bool = False) -> InlineKeyboardMarkup:
     """Клавиатура для управления профилем девушки"""
     builder = InlineKeyboardBuilder()
@@ -85,6 +111,7 @@ def get_profile_keyboard(has_profile: bool = False) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@registered_keyboard
 def get_profile_creation_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для создания профиля"""
     builder = InlineKeyboardBuilder()
@@ -106,6 +133,7 @@ def get_profile_creation_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@registered_keyboard
 def get_profile_edit_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для редактирования профиля"""
     builder = InlineKeyboardBuilder()
@@ -133,6 +161,7 @@ def get_profile_edit_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@registered_keyboard
 def get_conversation_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура для управления разговором"""
     builder = InlineKeyboardBuilder()
@@ -216,6 +245,7 @@ def get_subscription_plans_keyboard(plans: list) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@registered_keyboard
 def get_plan_details_keyboard(plan_id: int) -> InlineKeyboardMarkup:
     """Клавиатура для подробностей плана"""
     builder = InlineKeyboardBuilder()
@@ -236,6 +266,7 @@ def get_plan_details_keyboard(plan_id: int) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@registered_keyboard
 def get_confirmation_keyboard(action: str) -> InlineKeyboardMarkup:
     """Клавиатура подтверждения действия"""
     builder = InlineKeyboardBuilder()
@@ -254,6 +285,7 @@ def get_confirmation_keyboard(action: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+@registered_keyboard
 def get_cancel_keyboard() -> InlineKeyboardMarkup:
     """Клавиатура с кнопкой отмены"""
     builder = InlineKeyboardBuilder()
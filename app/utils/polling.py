@@ -0,0 +1,102 @@
+"""
+Режим polling с ограничением числа одновременно обрабатываемых обновлений
+
+В aiogram 3.4 при handle_as_tasks каждое полученное обновление сразу
+становится задачей, и при всплеске их число не ограничено. Здесь
+задача создается только при свободном слоте: пока заняты все слоты,
+следующий getUpdates не выполняется и обновления ждут на стороне Telegram.
+"""
+import asyncio
+from typing import Any, List, Optional
+from aiogram import Bot, Dispatcher, loggers
+from aiogram.dispatcher.dispatcher import DEFAULT_BACKOFF_CONFIG
+from aiogram.utils.backoff import BackoffConfig
+from config.settings import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedDispatcher(Dispatcher):
+    """Диспетчер с ограничением параллельной обработки обновлений в polling"""
+
+    def __init__(self, *args: Any, tasks_concurrency_limit: Optional[int] = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        # 0 или None - без ограничения (поведение aiogram по умолчанию)
+        self.tasks_concurrency_limit = tasks_concurrency_limit
+
+    async def _polling(
+        self,
+        bot: Bot,
+        polling_timeout: int = 30,
+        handle_as_tasks: bool = True,
+        backoff_config: BackoffConfig = DEFAULT_BACKOFF_CONFIG,
+        allowed_updates: Optional[List[str]] = None,
+        **kwargs: Any
+    ) -> None:
+        if not handle_as_tasks or not self.tasks_concurrency_limit:
+            return await super()._polling(
+                bot,
+                polling_timeout=polling_timeout,
+                handle_as_tasks=handle_as_tasks,
+                backoff_config=backoff_config,
+                allowed_updates=allowed_updates,
+                **kwargs
+            )
+
+        semaphore = asyncio.Semaphore(self.tasks_concurrency_limit)
+        user = await bot.me()
+        loggers.dispatcher.info(
+            "Run polling for bot @%s id=%d - %r (at most %d updates in flight)",
+            user.username, bot.id, user.full_name, self.tasks_concurrency_limit
+        )
+        try:
+            async for update in self._listen_updates(
+                bot,
+                polling_timeout=polling_timeout,
+                backoff_config=backoff_config,
+                allowed_updates=allowed_updates
+            ):
+                # Ждем свободный слот - чтение следующих обновлений тоже ждет
+                await semaphore.acquire()
+                handle_update_task = asyncio.create_task(self._process_update(bot=bot, update=update, **kwargs))
+                self._handle_update_tasks.add(handle_update_task)
+                handle_update_task.add_done_callback(self._handle_update_tasks.discard)
+                handle_update_task.add_done_callback(lambda _: semaphore.release())
+        finally:
+            loggers.dispatcher.info(
+                "Polling stopped for bot @%s id=%d - %r", user.username, bot.id, user.full_name
+            )
+
+    async def drain(self, timeout: float) -> bool:
+        """Ожидание завершения обработчиков обновлений, запущенных в polling"""
+        tasks = list(self._handle_update_tasks)
+        if not tasks:
+            return True
+        logger.info(f"Waiting for {len(tasks)} in-flight updates")
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logger.warning(f"Drain timed out after {timeout}s, {len(pending)} updates still in flight")
+        return not pending
+
+
+def get_allowed_updates(dispatcher: Dispatcher) -> List[str]:
+    """
+    Типы обновлений для getUpdates: из настройки или по зарегистрированным обработчикам
+
+    Telegram не присылает типы, которых нет в списке, поэтому бот не тратит
+    время на обновления, которые все равно никто не обработает.
+    """
+    if settings.polling_allowed_updates:
+        return [name.strip() for name in settings.polling_allowed_updates.split(",") if name.strip()]
+    return dispatcher.resolve_used_update_types()
+
+
+def get_backoff_config() -> BackoffConfig:
+    """Параметры паузы между повторами getUpdates после ошибок сети/API"""
+    return BackoffConfig(
+        min_delay=settings.polling_backoff_min_delay_seconds,
+        max_delay=settings.polling_backoff_max_delay_seconds,
+        factor=settings.polling_backoff_factor,
+        jitter=settings.polling_backoff_jitter
+    )
@@ -0,0 +1,167 @@
+"""
+Обработчик webhook Telegram с ограничением числа одновременно обрабатываемых обновлений
+
+SimpleRequestHandler создает задачу на каждое обновление без ограничений:
+при всплеске обновлений задачи исчерпывают подключения к БД и квоту Gemini.
+Здесь обновление принимается в очередь и Telegram сразу получает ответ,
+а обрабатывают очередь max_in_flight фоновых обработчиков. При
+переполнении очереди срабатывает политика сброса нагрузки.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from aiohttp import web
+from config.settings import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Политики при переполнении очереди
+OVERFLOW_REJECT = "reject"  # ответить Telegram ошибкой - он доставит обновление повторно позже
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # выбросить самое старое обновление из очереди
+OVERFLOW_DROP_NEWEST = "drop_newest"  # принять и выбросить новое обновление
+OVERFLOW_POLICIES = (OVERFLOW_REJECT, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST)
+
+# Не чаще одного предупреждения о переполнении за этот интервал
+OVERFLOW_LOG_INTERVAL_SECONDS = 10
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """Webhook-обработчик с очередью и ограниченным числом обработчиков"""
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        max_in_flight: int = None,
+        queue_size: int = None,
+        overflow_policy: str = None,
+        drain_timeout_seconds: float = None,
+        **kwargs: Any
+    ):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True, **kwargs)
+        self.max_in_flight = max_in_flight or settings.webhook_max_in_flight
+        self.queue_size = queue_size or settings.webhook_queue_size
+        self.overflow_policy = overflow_policy or settings.webhook_overflow_policy
+        self.drain_timeout_seconds = (
+            settings.webhook_drain_timeout_seconds if drain_timeout_seconds is None else drain_timeout_seconds
+        )
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown webhook overflow policy: {self.overflow_policy}")
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._workers: List[asyncio.Task] = []
+        self._accepting = True
+        self._in_flight = 0
+        self._last_overflow_log = 0.0
+
+        self.accepted = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.max_queue_depth = 0
+        self.queue_wait_seconds_total = 0.0
+
+    def register(self, app: web.Application, /, path: str, **kwargs: Any) -> None:
+        # Обработчики запускаются вместе с приложением, остановка - в close()
+        app.on_startup.append(self._start_workers)
+        super().register(app, path=path, **kwargs)
+
+    async def _start_workers(self, app: web.Application) -> None:
+        self._accepting = True
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_in_flight)]
+        logger.info(
+            f"Webhook update workers started: max_in_flight={self.max_in_flight}, "
+            f"queue_size={self.queue_size}, overflow_policy={self.overflow_policy}"
+        )
+
+    async def _worker(self) -> None:
+        while True:
+            bot, update, enqueued_at = await self._queue.get()
+            self.queue_wait_seconds_total += time.monotonic() - enqueued_at
+            self._in_flight += 1
+            try:
+                await self._background_feed_update(bot=bot, update=update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error processing update {update.get('update_id')}: {e}")
+            finally:
+                self._in_flight -= 1
+                self._queue.task_done()
+
+    def _log_overflow(self) -> None:
+        now = time.monotonic()
+        if now - self._last_overflow_log >= OVERFLOW_LOG_INTERVAL_SECONDS:
+            self._last_overflow_log = now
+            logger.warning(
+                f"Webhook update queue full ({self.queue_size}), policy {self.overflow_policy}: "
+                f"rejected {self.rejected}, dropped {self.dropped}"
+            )
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        if not self._accepting:
+            # Сервер останавливается - Telegram доставит обновление другому процессу или позже
+            return web.Response(status=503, text="Shutting down")
+
+        update = await request.json(loads=bot.session.json_loads)
+
+        if self._queue.full():
+            if self.overflow_policy == OVERFLOW_REJECT:
+                self.rejected += 1
+                self._log_overflow()
+                return web.Response(status=503, text="Overloaded")
+            self.dropped += 1
+            self._log_overflow()
+            if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                return web.json_response({}, dumps=bot.session.json_dumps)
+            # OVERFLOW_DROP_OLDEST
+            self._queue.get_nowait()
+            self._queue.task_done()
+
+        self._queue.put_nowait((bot, update, time.monotonic()))
+        self.accepted += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def drain(self) -> bool:
+        """Прекращение приема и ожидание обработки принятых обновлений"""
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=self.drain_timeout_seconds)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Webhook drain timed out after {self.drain_timeout_seconds}s, "
+                f"{self._queue.qsize()} queued and {self._in_flight} in-flight updates abandoned"
+            )
+            return False
+
+    async def close(self) -> None:
+        await self.drain()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info(f"Webhook update workers stopped: {self.get_stats()}")
+        await super().close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Глубина очереди и счетчики обработки"""
+        taken = self.processed + self.failed + self._in_flight
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self.queue_size,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self._in_flight,
+            "max_in_flight": self.max_in_flight,
+            "accepted": self.accepted,
+            "processed": self.processed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "dropped": self.dropped,
+            "avg_queue_wait_seconds": self.queue_wait_seconds_total / taken if taken else 0.0
+        }
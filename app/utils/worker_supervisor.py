@@ -0,0 +1,156 @@
+"""
+Пре-форк супервизор процессов webhook-сервера
+
+Каждый процесс-обработчик запускается через spawn (чистый интерпретатор:
+собственные пулы БД, клиенты Redis и сессия бота) и слушает общий порт
+с SO_REUSEPORT - ядро распределяет соединения между процессами.
+Процесс 0 - основной: только он выполняет разовые действия при запуске
+(создание таблиц, планировщик уведомлений).
+
+Сигналы супервизору:
+    SIGTERM / SIGINT - плавная остановка всех процессов
+    SIGHUP - поочередный перезапуск процессов без остановки приема запросов
+"""
+import multiprocessing
+import multiprocessing.connection
+import signal
+import time
+from typing import Callable, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед перезапуском упавшего процесса (защита от цикла перезапусков)
+RESTART_DELAY_SECONDS = 1.0
+
+
+class WorkerSupervisor:
+    """Запуск, наблюдение и перезапуск процессов-обработчиков"""
+
+    def __init__(
+        self,
+        target: Callable,
+        workers: int,
+        ready_timeout_seconds: float = 60,
+        stop_timeout_seconds: float = 30,
+        on_worker_exit: Optional[Callable[[int], None]] = None
+    ):
+        # target(index, ready_event) - точка входа процесса, выставляет ready_event после запуска сервера
+        self.target = target
+        # on_worker_exit(pid) - вызывается после завершения процесса (остановка или падение)
+        self.on_worker_exit = on_worker_exit
+        self.workers = workers
+        self.ready_timeout_seconds = ready_timeout_seconds
+        self.stop_timeout_seconds = stop_timeout_seconds
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._stopping = False
+        self._restart_requested = False
+
+    def _start(self, index: int) -> Tuple[multiprocessing.Process, object]:
+        ready = self._context.Event()
+        process = self._context.Process(target=self.target, args=(index, ready), name=f"webhook-worker-{index}")
+        process.start()
+        self._processes[index] = process
+        return process, ready
+
+    def _wait_ready(self, index: int, process: multiprocessing.Process, ready) -> bool:
+        deadline = time.monotonic() + self.ready_timeout_seconds
+        while time.monotonic() < deadline:
+            if ready.wait(0.5):
+                logger.info(f"Worker {index} ready (pid {process.pid})")
+                return True
+            if not process.is_alive():
+                logger.error(f"Worker {index} exited during startup with code {process.exitcode}")
+                return False
+        logger.error(f"Worker {index} not ready after {self.ready_timeout_seconds}s")
+        return False
+
+    def _stop(self, index: int, terminate: bool = True) -> None:
+        process = self._processes.pop(index, None)
+        if process is None:
+            return
+        if process.is_alive():
+            # SIGTERM: процесс закрывает сервер и выполняет on_shutdown
+            # (повторный SIGTERM прервал бы остановку, поэтому сигнал отправляется один раз)
+            if terminate:
+                process.terminate()
+            process.join(self.stop_timeout_seconds)
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not stop in {self.stop_timeout_seconds}s, killing")
+                process.kill()
+                process.join()
+        logger.info(f"Worker {index} stopped with code {process.exitcode}")
+        self._notify_exit(process)
+
+    def _notify_exit(self, process: multiprocessing.Process) -> None:
+        if self.on_worker_exit is None:
+            return
+        try:
+            self.on_worker_exit(process.pid)
+        except Exception as e:
+            logger.error(f"Worker exit hook failed for pid {process.pid}: {e}")
+
+    def start_all(self) -> bool:
+        """Запуск процессов: сначала основной, затем остальные параллельно"""
+        if not self._wait_ready(0, *self._start(0)):
+            return False
+        started = [(index, *self._start(index)) for index in range(1, self.workers)]
+        return all([self._wait_ready(index, process, ready) for index, process, ready in started])
+
+    def stop_all(self) -> None:
+        """Плавная остановка всех процессов (SIGTERM всем сразу, затем ожидание)"""
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        for index in list(self._processes):
+            self._stop(index, terminate=False)
+
+    def rolling_restart(self) -> None:
+        """
+        Поочередный перезапуск: процесс останавливается и запускается заново,
+        следующий - только после готовности предыдущего. Остальные процессы
+        продолжают принимать запросы на общем порту.
+        """
+        logger.info("Rolling restart of webhook workers")
+        for index in sorted(self._processes):
+            if self._stopping:
+                return
+            self._stop(index)
+            self._wait_ready(index, *self._start(index))
+        logger.info("Rolling restart complete")
+
+    def _handle_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def _handle_restart(self, signum, frame) -> None:
+        self._restart_requested = True
+
+    def run(self) -> None:
+        """Основной цикл супервизора (блокирующий)"""
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGHUP, self._handle_restart)
+
+        logger.info(f"Starting {self.workers} webhook workers")
+        if not self.start_all():
+            self.stop_all()
+            raise RuntimeError("Failed to start webhook workers")
+
+        try:
+            while not self._stopping:
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self.rolling_restart()
+
+                multiprocessing.connection.wait([p.sentinel for p in self._processes.values()], timeout=1)
+
+                for index, process in list(self._processes.items()):
+                    if not process.is_alive() and not self._stopping:
+                        logger.warning(f"Worker {index} exited with code {process.exitcode}, restarting")
+                        self._notify_exit(process)
+                        time.sleep(RESTART_DELAY_SECONDS)
+                        self._wait_ready(index, *self._start(index))
+        finally:
+            logger.info("Stopping webhook workers")
+            self.stop_all()
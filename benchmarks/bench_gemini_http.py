@@ -0,0 +1,79 @@
+"""
+Бенчмарк бэкенда http: общий пул соединений против нового клиента на каждый запрос
+
+Мок-сервер поднимается в этом же процессе (benchmarks.gemini_mock_server),
+запросы идут через HttpGenerativeModel с заданным параллелизмом.
+"""
+from benchmarks import common  # noqa: F401  (заглушки настроек)
+import asyncio
+import os
+import time
+
+PORT = 8089
+LATENCY_MS = 50
+REQUESTS = 200
+CONCURRENCY = (1, 10, 50)
+
+# Адрес API задается до импорта настроек
+os.environ["GEMINI_HTTP_BASE_URL"] = f"http://127.0.0.1:{PORT}"
+
+import httpx  # noqa: E402
+from aiohttp import web  # noqa: E402
+from app.services import gemini_http  # noqa: E402
+from app.services.gemini_router import percentile  # noqa: E402
+from benchmarks.gemini_mock_server import create_app  # noqa: E402
+
+
+async def fresh_client_request(model: gemini_http.HttpGenerativeModel) -> None:
+    """Прежний подход без пула: новое соединение на каждый запрос"""
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}") as client:
+        response = await client.post(
+            f"/v1beta/models/{model.model_name}:generateContent",
+            json={"contents": [{"role": "user", "parts": [{"text": "Привет! Как дела?"}]}]},
+            headers={"x-goog-api-key": model.api_key}
+        )
+        gemini_http.HttpResponse(response.json()).text
+
+
+async def pooled_request(model: gemini_http.HttpGenerativeModel) -> None:
+    response = await model.generate_content_async("Привет! Как дела?")
+    response.text
+
+
+async def run(name: str, call, concurrency: int) -> None:
+    model = gemini_http.HttpModelBackend().create_model("gemini-1.5-flash", api_key="benchmark")
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await call(model)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(REQUESTS)))
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name:<28} x{concurrency:<4} {REQUESTS / elapsed:8.1f} req/s  "
+        f"p50 {percentile(latencies, 50) * 1000:7.1f} ms  p95 {percentile(latencies, 95) * 1000:7.1f} ms"
+    )
+
+
+async def main():
+    runner = web.AppRunner(create_app(latency_ms=LATENCY_MS, jitter_ms=0))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+    print(f"Mock server latency {LATENCY_MS} ms, {REQUESTS} requests per run")
+
+    try:
+        for concurrency in CONCURRENCY:
+            await run("fresh client per request", fresh_client_request, concurrency)
+            await run("shared pooled client", pooled_request, concurrency)
+    finally:
+        await gemini_http.close_http_client()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
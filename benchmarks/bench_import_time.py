@@ -0,0 +1,69 @@
+"""
+Время импорта приложения (холодный старт) по python -X importtime
+
+Запускает `import main` в отдельном процессе несколько раз, печатает лучшее
+время и самые тяжелые модули, проверяет, что SDK из контейнера сервисов не
+импортируются при старте. Код возврата 1, если время выше цели или тяжелый
+SDK попал в импорт - можно использовать как проверку в CI.
+
+Запуск: python -m benchmarks.bench_import_time --target-ms 4000
+"""
+from benchmarks import common  # noqa: F401  (заглушки настроек)
+import argparse
+import os
+import subprocess
+import sys
+
+# Модули, которые должны загружаться только при первом обращении к сервису
+LAZY_MODULES = ("google.generativeai", "yookassa", "httpx", "sqlalchemy.dialects.postgresql.asyncpg")
+
+
+def measure_import(module: str) -> dict:
+    """Кумулятивное время импорта каждого модуля в микросекундах"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=os.environ.copy(),
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        timings[name] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время импорта приложения")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--target-ms", type=float, default=4000)
+    args = parser.parse_args()
+
+    runs = [measure_import(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda timings: timings[args.module][1])
+    total_ms = best[args.module][1] / 1000
+    print(f"import {args.module}: best of {args.runs} runs {total_ms:.0f} ms (target {args.target_ms:.0f} ms)")
+
+    print(f"\nTop {args.top} modules by self time:")
+    heaviest = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in heaviest:
+        print(f"  {name:<60} self {self_us / 1000:8.1f} ms  cumulative {cumulative_us / 1000:8.1f} ms")
+
+    eager = [name for name in LAZY_MODULES if name in best]
+    if eager:
+        print(f"\nModules that should be lazy were imported at startup: {', '.join(eager)}")
+
+    if eager or total_ms > args.target_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
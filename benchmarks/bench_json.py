@@ -0,0 +1,109 @@
+"""
+Бенчмарк бэкендов JSON (JSON_BACKEND) на типичных данных бота
+
+Разбор тела webhook (обновления Telegram и уведомления YooKassa),
+сборка параметров запроса к Bot API и запись/чтение данных FSM.
+Бэкенды, которые не установлены, пропускаются.
+
+Запуск: python -m benchmarks.bench_json
+"""
+from benchmarks.common import bench
+import importlib
+import random
+from app.utils.json_codec import CODECS, get_json_codec
+from benchmarks.load_webhook import make_update
+
+rng = random.Random(42)
+
+CALLBACK_UPDATE = {
+    "update_id": 100500,
+    "callback_query": {
+        "id": "4382bfdwdsb323b2d9",
+        "from": {"id": 123456789, "is_bot": False, "first_name": "Иван", "username": "ivan", "language_code": "ru"},
+        "message": {
+            "message_id": 42,
+            "date": 1700000000,
+            "chat": {"id": 123456789, "type": "private", "first_name": "Иван"},
+            "from": {"id": 987654321, "is_bot": True, "first_name": "Bot", "username": "girlfriend_bot"},
+            "text": "Выберите тариф подписки:",
+            "reply_markup": {"inline_keyboard": [
+                [{"text": f"Тариф {i}: {i * 299} ₽", "callback_data": f"buy_plan_{i}"}] for i in range(1, 5)
+            ]}
+        },
+        "chat_instance": "-1234567890123456789",
+        "data": "buy_plan_2"
+    }
+}
+
+YOOKASSA_NOTIFICATION = {
+    "type": "notification",
+    "event": "payment.succeeded",
+    "object": {
+        "id": "2d3a1a2b-000f-5000-9000-1b68e7b15f3f",
+        "status": "succeeded",
+        "paid": True,
+        "amount": {"value": "599.00", "currency": "RUB"},
+        "income_amount": {"value": "578.03", "currency": "RUB"},
+        "captured_at": "2024-01-01T12:00:05.000Z",
+        "created_at": "2024-01-01T12:00:00.000Z",
+        "description": "Подписка на 30 дней",
+        "metadata": {"user_id": "123456789", "plan_id": "2"},
+        "payment_method": {"type": "bank_card", "id": "2d3a1a2b-000f-5000-9000-1b68e7b15f3f", "saved": False},
+        "refundable": True,
+        "test": False
+    }
+}
+
+SEND_MESSAGE_PARAMS = {
+    "chat_id": 123456789,
+    "text": "Привет! Я так рада тебя видеть 😊 " * 10,
+    "parse_mode": "HTML",
+    "reply_markup": {"keyboard": [[{"text": "💬 Общение"}, {"text": "👤 Профиль"}], [{"text": "💎 Подписка"}]],
+                     "resize_keyboard": True}
+}
+
+FSM_DATA = {
+    "user_description": "Люблю путешествия, книги и долгие прогулки по вечернему городу",
+    "name": "Алиса",
+    "age": 23,
+    "personality": "Добрая, веселая, немного застенчивая",
+    "appearance": "Светлые волосы, зеленые глаза",
+    "interests": "Музыка, кино, кулинария",
+    "payment_id": 1234,
+    "plan_id": 2
+}
+
+PAYLOADS = [
+    ("message update", make_update(1, rng)),
+    ("callback update", CALLBACK_UPDATE),
+    ("yookassa webhook", YOOKASSA_NOTIFICATION),
+    ("sendMessage params", SEND_MESSAGE_PARAMS),
+    ("fsm data", FSM_DATA),
+]
+
+
+def available_backends() -> list:
+    backends = ["json"]
+    for name in ("orjson", "msgspec"):
+        try:
+            importlib.import_module(name)
+            backends.append(name)
+        except ImportError:
+            print(f"{name} is not installed, skipped")
+    return backends
+
+
+def main():
+    backends = [name for name in available_backends() if name in CODECS]
+    for payload_name, payload in PAYLOADS:
+        print(f"\n{payload_name}:")
+        for backend in backends:
+            loads, dumps = get_json_codec(backend)
+            raw = dumps(payload).encode()
+            assert loads(raw) == payload
+            bench(f"  {backend} loads ({len(raw)} bytes)", lambda: loads(raw), number=20000)
+            bench(f"  {backend} dumps", lambda: dumps(payload), number=20000)
+
+
+if __name__ == "__main__":
+    main()
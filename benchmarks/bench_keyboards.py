@@ -0,0 +1,43 @@
+"""Бенчмарк клавиатур: время и аллокации на вызов без кэша и из реестра"""
+from benchmarks.common import bench
+import tracemalloc
+from app.utils.keyboards import (
+    get_main_keyboard, get_conversation_keyboard, get_profile_creation_keyboard,
+    get_confirmation_keyboard, get_profile_keyboard
+)
+
+CASES = [
+    ("get_main_keyboard", get_main_keyboard, ()),
+    ("get_conversation_keyboard", get_conversation_keyboard, ()),
+    ("get_profile_creation_keyboard", get_profile_creation_keyboard, ()),
+    ("get_confirmation_keyboard", get_confirmation_keyboard, ("clear_history",)),
+    ("get_profile_keyboard", get_profile_keyboard, (True,)),
+]
+
+
+def allocations_per_call(func, args, calls: int = 1000) -> float:
+    """Среднее число аллоцированных блоков памяти на вызов"""
+    func(*args)  # прогрев
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    results = [func(*args) for _ in range(calls)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+    del results
+    return blocks / calls
+
+
+def main():
+    for name, cached, args in CASES:
+        uncached = cached.__wrapped__
+        bench(f"{name}: build", lambda: uncached(*args), number=2000)
+        bench(f"{name}: registry", lambda: cached(*args), number=200000)
+        print(
+            f"{'':<45} allocations/call: "
+            f"{allocations_per_call(uncached, args):.1f} -> {allocations_per_call(cached, args):.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
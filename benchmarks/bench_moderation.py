@@ -0,0 +1,96 @@
+"""Бенчмарк модерации: стоимость проверки одного сообщения на большом корпусе"""
+from benchmarks.common import bench
+import random
+import time
+from app.services.moderation_service import (
+    CRITICAL, ModerationService, StemMatcher, load_dictionary, moderation_service, normalize_text
+)
+
+VOCABULARY = (
+    "привет как дела что делаешь сегодня вечером давай сходим в кино я соскучился "
+    "расскажи о себе мне нравится музыка работа устал погода хорошая планы на выходные "
+    "люблю тебя смешно правда интересно завтра встреча друзья поехали путешествие море "
+    "книга фильм сериал готовить ужин спорт зал бегать настроение грустно весело"
+).split()
+RISKY = ("хочу", "буду", "убить", "кокаин", "героин", "собираюсь", "суицид")
+
+CORPUS_SIZE = 20000
+DICTIONARY_SIZES = (10, 30, 100, 1000)
+
+
+def legacy_moderate(text: str) -> bool:
+    """Прежняя проверка: поиск подстрок по списку слов и повторный проход по словам-намерениям"""
+    critical_words = ["убить", "убийство", "суицид", "самоубийство", "наркотики", "героин", "кокаин"]
+    text_lower = text.lower()
+    for word in critical_words:
+        if word in text_lower:
+            if any(context in text_lower for context in ["хочу", "буду", "планирую", "собираюсь"]):
+                return False
+    return True
+
+
+def build_corpus(size: int) -> list:
+    """Корпус сообщений разной длины, около 2% с опасными словами"""
+    rng = random.Random(42)
+    corpus = []
+    for _ in range(size):
+        words = rng.choices(VOCABULARY, k=rng.randint(3, 60))
+        if rng.random() < 0.02:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(RISKY))
+            words.insert(rng.randrange(len(words) + 1), rng.choice(RISKY))
+        corpus.append(" ".join(words))
+    return corpus
+
+
+def per_message(name: str, check, corpus: list) -> None:
+    started = time.perf_counter()
+    blocked = sum(1 for text in corpus if not check(text))
+    elapsed = time.perf_counter() - started
+    print(f"{name:<45} {elapsed / len(corpus) * 1e6:10.2f} us/message, blocked {blocked}")
+
+
+def random_dictionary(size: int, rng: random.Random) -> list:
+    """Синтетический словарь: стоимость поиска в зависимости от числа слов"""
+    letters = "абвгдежзийклмнопрстуфхцчшщыэюя"
+    return ["".join(rng.choices(letters, k=rng.randint(5, 10))) for _ in range(size)]
+
+
+def main():
+    corpus = build_corpus(CORPUS_SIZE)
+    average_length = sum(len(text) for text in corpus) / len(corpus)
+    print(f"Corpus: {len(corpus)} messages, average length {average_length:.0f} chars")
+
+    moderation_service.reload()
+    bench("dictionary compile", moderation_service.reload, number=20, repeat=3)
+
+    # Прежняя проверка знала только 7 слов; с тем же словарем, что и сервис, - честное сравнение
+    critical_stems = [word_stem for word_stem, category in load_dictionary(moderation_service.path) if category == CRITICAL]
+    per_message("legacy substring scan (7 words)", legacy_moderate, corpus)
+
+    def legacy_shipped(text: str) -> bool:
+        text_lower = text.lower()
+        return not any(word_stem in text_lower for word_stem in critical_stems)
+
+    per_message("legacy substring scan, shipped dictionary", legacy_shipped, corpus)
+    per_message("moderation service (shipped dictionary)", moderation_service.is_allowed, corpus)
+    obfuscation_service = ModerationService(match_obfuscation=True)
+    per_message("moderation service, match_obfuscation", obfuscation_service.is_allowed, corpus)
+
+    # Поиск подстрок растет линейно с размером словаря, скомпилированное выражение - почти нет;
+    # сервис переключается на выражение после SUBSTRING_SCAN_MAX_STEMS основ
+    rng = random.Random(7)
+    sample = [normalize_text(text) for text in corpus[:2000]]
+    for size in DICTIONARY_SIZES:
+        words = random_dictionary(size, rng)
+        patterns = [(word, CRITICAL) for word in words]
+        substring_matcher = StemMatcher(patterns, substring_max_stems=size)
+        compiled_matcher = StemMatcher(patterns, substring_max_stems=0)
+        per_message(f"{size} words: substring scan", lambda text: not substring_matcher.contains(CRITICAL, text), sample)
+        per_message(f"{size} words: compiled matcher", lambda text: not compiled_matcher.contains(CRITICAL, text), sample)
+
+    long_text = " ".join(build_corpus(50))
+    bench(f"compiled stem matcher, {len(long_text)} chars", lambda: moderation_service.is_allowed(long_text), number=200)
+
+
+if __name__ == "__main__":
+    main()
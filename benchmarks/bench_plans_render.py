@@ -0,0 +1,56 @@
+"""Микро-бенчмарк отрисовки экрана тарифов: сборка на каждый показ против готового экрана"""
+from benchmarks.common import bench
+from decimal import Decimal
+from app.models import SubscriptionPlan, PlanType
+from app.services.plan_catalog_service import PlanSnapshot, PlanCatalog
+from app.services.subscription_plan_service import SubscriptionPlanService
+from app.utils.keyboards import get_subscription_plans_keyboard
+
+
+def make_plans() -> list:
+    """Планы по умолчанию в виде ORM-объектов (без базы данных)"""
+    plans = []
+    for plan_id, (name, plan_type, days, price, features, popular) in enumerate([
+        ("Месячная подписка", PlanType.MONTHLY, 30, "299", ["Неограниченное общение", "Создание профилей", "Поддержка 24/7"], False),
+        ("Квартальная подписка", PlanType.QUARTERLY, 90, "799", ["Неограниченное общение", "Создание профилей", "Поддержка 24/7", "Экономия 11%"], True),
+        ("Годовая подписка", PlanType.YEARLY, 365, "2399", ["Неограниченное общение", "Создание профилей", "Поддержка 24/7", "Приоритетная поддержка", "Экономия 33%"], False),
+    ], start=1):
+        plan = SubscriptionPlan(
+            id=plan_id, name=name, plan_type=plan_type.value, duration_days=days,
+            price=Decimal(price), is_popular=popular, discount_percentage=0
+        )
+        plan.set_features_list(features)
+        plans.append(plan)
+    return plans
+
+
+def render_per_view(plans: list):
+    """Прежний путь: разбор features, Decimal-математика и клавиатура на каждый показ"""
+    plans_text = "💳 **Выберите план подписки:**\n\n"
+    for plan in plans:
+        plans_text += f"{SubscriptionPlanService.format_plan_info(plan)}\n\n"
+        plans_text += "---\n\n"
+    return plans_text, get_subscription_plans_keyboard(plans)
+
+
+def main():
+    orm_plans = make_plans()
+    catalog = PlanCatalog.build([PlanSnapshot.from_model(plan) for plan in orm_plans])
+    rendered = SubscriptionPlanService.render_catalog(catalog)
+    cache = {"rendered": rendered}
+
+    def cached_view():
+        # Новый путь: сверка версии и чтение готового экрана
+        current = cache["rendered"]
+        if current.version != catalog.version:
+            current = SubscriptionPlanService.render_catalog(catalog)
+        return current.plans_text, current.plans_keyboard
+
+    before = bench("plans screen: render per view", lambda: render_per_view(orm_plans), number=2000)
+    after = bench("plans screen: precomputed", cached_view, number=200000)
+    bench("plans screen: re-render on new version", lambda: SubscriptionPlanService.render_catalog(catalog), number=2000)
+    print(f"speedup: {before / after:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Локальный мок REST API Gemini для бенчмарков и офлайн-проверок бэкенда http
+
+Запуск: python -m benchmarks.gemini_mock_server --port 8089 --latency-ms 200
+Бот: GEMINI_BACKEND=http GEMINI_HTTP_BASE_URL=http://127.0.0.1:8089
+"""
+import argparse
+import asyncio
+import json
+import random
+from aiohttp import web
+
+PROFILE = {
+    "name": "Алина",
+    "age": 24,
+    "personality": "Веселая и заботливая",
+    "appearance": "Светлые волосы, зеленые глаза",
+    "interests": "Музыка, путешествия, книги",
+    "background": "Работает дизайнером",
+    "communication_style": "Дружелюбный, с юмором"
+}
+
+
+def create_app(latency_ms: float = 200, jitter_ms: float = 50) -> web.Application:
+    """Приложение мок-сервера: generateContent и cachedContents с заданной задержкой"""
+
+    async def delay():
+        await asyncio.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000)
+
+    async def generate_content(request: web.Request) -> web.Response:
+        model, _, method = request.match_info["action"].partition(":")
+        if method != "generateContent":
+            return web.json_response({"error": {"code": 404, "message": "Not found"}}, status=404)
+
+        body = await request.json()
+        await delay()
+
+        generation_config = body.get("generationConfig", {})
+        if generation_config.get("responseMimeType") == "application/json":
+            text = json.dumps(PROFILE, ensure_ascii=False)
+        else:
+            last_text = body["contents"][-1]["parts"][0].get("text", "")
+            text = f"[{model}] Ответ на: {last_text[:100]}"
+
+        prompt_tokens = sum(
+            len(part.get("text", "")) // 4 for content in body["contents"] for part in content["parts"]
+        )
+        candidates_tokens = len(text) // 4
+        return web.json_response({
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": candidates_tokens,
+                "totalTokenCount": prompt_tokens + candidates_tokens
+            }
+        })
+
+    async def create_cached_content(request: web.Request) -> web.Response:
+        body = await request.json()
+        await delay()
+        return web.json_response({"name": f"cachedContents/mock-{random.getrandbits(32):08x}", "model": body["model"]})
+
+    app = web.Application()
+    app.router.add_post("/v1beta/models/{action}", generate_content)
+    app.router.add_post("/v1beta/cachedContents", create_cached_content)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Мок REST API Gemini")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency_ms, args.jitter_ms), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Нагрузочный тест webhook-сервера: обновлений Telegram в секунду
+
+Отправляет синтетические обновления (текстовые сообщения от разных
+пользователей) на запущенный бот в режиме webhook. Для оценки
+масштабирования запустите бота с WEBHOOK_WORKERS=1, 2, 4... и сравните
+результат; нагрузку лучше подавать с другой машины или ограничить
+тест отдельными ядрами (taskset), чтобы он не отнимал CPU у бота.
+
+Запуск: python -m benchmarks.load_webhook --url http://127.0.0.1:8000/webhook --updates 20000 --concurrency 200
+"""
+import argparse
+import asyncio
+import random
+import time
+import aiohttp
+
+TEXTS = ("Привет!", "Как дела?", "Что делаешь?", "Расскажи о себе", "Спокойной ночи")
+
+
+def make_update(update_id: int, rng: random.Random) -> dict:
+    """Обновление Telegram с текстовым сообщением"""
+    user_id = rng.randint(1, 100000)
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": "Load"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load", "language_code": "ru"},
+            "text": rng.choice(TEXTS)
+        }
+    }
+
+
+async def run(url: str, updates: int, concurrency: int, secret_token: str = None) -> None:
+    rng = random.Random(42)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret_token} if secret_token else {}
+    latencies = []
+    errors = 0
+    next_id = iter(range(1, updates + 1))
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        async def sender():
+            nonlocal errors
+            for update_id in next_id:
+                started = time.perf_counter()
+                try:
+                    async with session.post(url, json=make_update(update_id, rng), headers=headers) as response:
+                        await response.read()
+                        if response.status != 200:
+                            errors += 1
+                except aiohttp.ClientError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(sender() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"{updates} updates in {elapsed:.1f}s: {updates / elapsed:.0f} updates/s, {errors} errors")
+    print(
+        f"latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест webhook-сервера")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/webhook")
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--secret-token", default=None)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.updates, args.concurrency, args.secret_token))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Разбор файла трейсов (TRACING_EXPORTER=file): на что уходит время обновлений
+
+Для каждого вида корневого спана (update message, update callback_query)
+печатает перцентили длительности и собственное время шагов - без учета
+вложенных спанов: сколько в среднем заняли декораторы, SQL, Redis,
+Gemini и Bot API. --slowest N показывает дерево самых медленных трейсов.
+
+Запуск: python -m benchmarks.trace_report traces.jsonl --slowest 3
+"""
+import argparse
+import json
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+
+
+def parse_time(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def load_spans(path: str) -> List[dict]:
+    spans = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            raw = json.loads(line)
+            spans.append({
+                "name": raw["name"],
+                "trace_id": raw["context"]["trace_id"],
+                "span_id": raw["context"]["span_id"],
+                "parent_id": raw.get("parent_id"),
+                "start": parse_time(raw["start_time"]),
+                "duration": parse_time(raw["end_time"]) - parse_time(raw["start_time"]),
+                "error": raw.get("status", {}).get("status_code") == "ERROR"
+            })
+    return spans
+
+
+def self_time(span: dict, children: Dict[str, List[dict]]) -> float:
+    """Длительность без вложенных спанов (параллельные дочерние, например дублирующий запрос, могут дать < 0)"""
+    return max(0.0, span["duration"] - sum(child["duration"] for child in children[span["span_id"]]))
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def print_tree(span: dict, children: Dict[str, List[dict]], depth: int = 0) -> None:
+    marker = " !" if span["error"] else ""
+    print(f"    {'  ' * depth}{span['name']:<{48 - 2 * depth}} {span['duration'] * 1000:9.1f} ms{marker}")
+    for child in sorted(children[span["span_id"]], key=lambda item: item["start"]):
+        print_tree(child, children, depth + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Разбор файла трейсов")
+    parser.add_argument("path", nargs="?", default="traces.jsonl")
+    parser.add_argument("--slowest", type=int, default=0)
+    args = parser.parse_args()
+
+    spans = load_spans(args.path)
+    span_ids = {span["span_id"] for span in spans}
+    children = defaultdict(list)
+    traces = defaultdict(list)
+    for span in spans:
+        children[span["parent_id"]].append(span)
+        traces[span["trace_id"]].append(span)
+
+    # Корневые спаны: без родителя или с родителем вне файла
+    roots = defaultdict(list)
+    for span in spans:
+        if span["parent_id"] is None or span["parent_id"] not in span_ids:
+            roots[span["name"]].append(span)
+
+    for root_name, root_spans in sorted(roots.items(), key=lambda item: -len(item[1])):
+        durations = [span["duration"] for span in root_spans]
+        print(
+            f"\n{root_name}: {len(root_spans)} traces, "
+            f"p50 {percentile(durations, 50) * 1000:.1f} ms, p95 {percentile(durations, 95) * 1000:.1f} ms"
+        )
+
+        # Собственное время шагов по всем трейсам этого вида
+        totals = defaultdict(float)
+        counts = defaultdict(int)
+        for root in root_spans:
+            for span in traces[root["trace_id"]]:
+                totals[span["name"]] += self_time(span, children)
+                counts[span["name"]] += 1
+        total_time = sum(totals.values()) or 1.0
+        print(f"  {'step':<48} {'calls/trace':>11} {'self ms/trace':>14} {'share':>7}")
+        for name, value in sorted(totals.items(), key=lambda item: -item[1]):
+            print(
+                f"  {name:<48} {counts[name] / len(root_spans):11.1f} "
+                f"{value / len(root_spans) * 1000:14.2f} {value / total_time:7.1%}"
+            )
+
+        for root in sorted(root_spans, key=lambda span: -span["duration"])[:args.slowest]:
+            print(f"\n  slowest trace {root['trace_id'][:18]}...")
+            print_tree(root, children)
+
+
+if __name__ == "__main__":
+    main()
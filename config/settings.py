@@ -11,7 +11,53 @@ class Settings(BaseSettings):
     
     # Gemini AI
     gemini_api_key: str = Field(..., env="GEMINI_API_KEY")
+    gemini_api_keys: str = Field("", env="GEMINI_API_KEYS")  # дополнительные ключи через запятую
+    gemini_key_rpm_limit: int = Field(0, env="GEMINI_KEY_RPM_LIMIT")  # 0 - без ограничения
+    gemini_key_tpm_limit: int = Field(0, env="GEMINI_KEY_TPM_LIMIT")
+    gemini_key_quarantine_seconds: int = Field(30, env="GEMINI_KEY_QUARANTINE_SECONDS")
+    gemini_key_max_quarantine_seconds: int = Field(600, env="GEMINI_KEY_MAX_QUARANTINE_SECONDS")
     gemini_model: str = Field("gemini-pro", env="GEMINI_MODEL")
+    gemini_backend: str = Field("google", env="GEMINI_BACKEND")  # google, http (REST через пул соединений) или fake (локальная модель без сети)
+    gemini_http_base_url: str = Field("https://generativelanguage.googleapis.com", env="GEMINI_HTTP_BASE_URL")
+    gemini_http2: bool = Field(True, env="GEMINI_HTTP2")
+    gemini_http_max_connections: int = Field(100, env="GEMINI_HTTP_MAX_CONNECTIONS")
+    gemini_http_max_keepalive_connections: int = Field(20, env="GEMINI_HTTP_MAX_KEEPALIVE_CONNECTIONS")
+    gemini_http_keepalive_expiry_seconds: float = Field(30.0, env="GEMINI_HTTP_KEEPALIVE_EXPIRY_SECONDS")
+    gemini_http_connect_timeout_seconds: float = Field(10.0, env="GEMINI_HTTP_CONNECT_TIMEOUT_SECONDS")
+    gemini_enable_context_cache: bool = Field(True, env="GEMINI_ENABLE_CONTEXT_CACHE")
+    gemini_context_cache_min_tokens: int = Field(32768, env="GEMINI_CONTEXT_CACHE_MIN_TOKENS")
+    gemini_context_cache_ttl_minutes: int = Field(60, env="GEMINI_CONTEXT_CACHE_TTL_MINUTES")
+    gemini_fallback_models: str = Field("gemini-1.5-flash,gemini-2.0-flash-lite", env="GEMINI_FALLBACK_MODELS")  # через запятую
+    gemini_request_timeout_seconds: float = Field(30.0, env="GEMINI_REQUEST_TIMEOUT_SECONDS")
+    gemini_router_max_error_rate: float = Field(0.5, env="GEMINI_ROUTER_MAX_ERROR_RATE")
+    gemini_router_explore_ratio: float = Field(0.05, env="GEMINI_ROUTER_EXPLORE_RATIO")
+    gemini_chat_deadline_seconds: float = Field(25.0, env="GEMINI_CHAT_DEADLINE_SECONDS")
+    gemini_chat_hedge: bool = Field(True, env="GEMINI_CHAT_HEDGE")
+    gemini_profile_deadline_seconds: float = Field(60.0, env="GEMINI_PROFILE_DEADLINE_SECONDS")
+    gemini_profile_hedge: bool = Field(False, env="GEMINI_PROFILE_HEDGE")
+    gemini_profile_max_attempts: int = Field(2, env="GEMINI_PROFILE_MAX_ATTEMPTS")  # повторы при невалидном JSON
+    gemini_hedge_default_delay_seconds: float = Field(2.0, env="GEMINI_HEDGE_DEFAULT_DELAY_SECONDS")
+    gemini_hedge_min_delay_seconds: float = Field(0.3, env="GEMINI_HEDGE_MIN_DELAY_SECONDS")
+    gemini_breaker_failure_rate: float = Field(0.5, env="GEMINI_BREAKER_FAILURE_RATE")
+    gemini_breaker_min_calls: int = Field(10, env="GEMINI_BREAKER_MIN_CALLS")
+    gemini_breaker_window_seconds: int = Field(60, env="GEMINI_BREAKER_WINDOW_SECONDS")
+    gemini_breaker_open_seconds: int = Field(30, env="GEMINI_BREAKER_OPEN_SECONDS")
+    gemini_breaker_half_open_calls: int = Field(3, env="GEMINI_BREAKER_HALF_OPEN_CALLS")
+    gemini_response_cache_enabled: bool = Field(False, env="GEMINI_RESPONSE_CACHE_ENABLED")
+    gemini_response_cache_ttl_seconds: int = Field(86400, env="GEMINI_RESPONSE_CACHE_TTL_SECONDS")
+    gemini_response_cache_max_entries: int = Field(10000, env="GEMINI_RESPONSE_CACHE_MAX_ENTRIES")
+    gemini_response_cache_chat_classes: str = Field("greeting,farewell,thanks", env="GEMINI_RESPONSE_CACHE_CHAT_CLASSES")
+    
+    # Модерация сообщений
+    moderation_words_path: str = Field("config/moderation_words.txt", env="MODERATION_WORDS_PATH")
+    moderation_reload_interval_seconds: int = Field(60, env="MODERATION_RELOAD_INTERVAL_SECONDS")
+    moderation_match_obfuscation: bool = Field(False, env="MODERATION_MATCH_OBFUSCATION")
+    
+    # Пул заранее сгенерированных профилей
+    profile_pool_enabled: bool = Field(False, env="PROFILE_POOL_ENABLED")
+    profile_pool_bucket_size: int = Field(5, env="PROFILE_POOL_BUCKET_SIZE")
+    profile_pool_refill_interval_seconds: int = Field(300, env="PROFILE_POOL_REFILL_INTERVAL_SECONDS")
+    profile_pool_refine: bool = Field(False, env="PROFILE_POOL_REFINE")  # предлагать уточненный вариант выданного профиля
     
     # YooKassa
     yookassa_shop_id: str = Field(..., env="YOOKASSA_SHOP_ID")
@@ -22,9 +68,53 @@ class Settings(BaseSettings):
     
     # App Settings
     debug: bool = Field(False, env="DEBUG")
+    # Схема БД при запуске: check - сверить ревизию Alembic, create - create_all (разработка), skip - ничего
+    database_schema_mode: str = Field("check", env="DATABASE_SCHEMA_MODE")
+    # JSON для webhook, сессии бота и FSM: json, orjson или msgspec (библиотеку нужно установить)
+    json_backend: str = Field("json", env="JSON_BACKEND")
+    # Метрики Prometheus на /metrics (режим webhook)
+    metrics_enabled: bool = Field(True, env="METRICS_ENABLED")
+    # Каталог для счетчиков нескольких процессов webhook-сервера (WEBHOOK_WORKERS > 1)
+    metrics_multiproc_dir: str = Field("", env="METRICS_MULTIPROC_DIR")
+    # Трассировка OpenTelemetry: file (JSON Lines), console или otlp
+    tracing_enabled: bool = Field(False, env="TRACING_ENABLED")
+    tracing_exporter: str = Field("file", env="TRACING_EXPORTER")
+    tracing_file_path: str = Field("traces.jsonl", env="TRACING_FILE_PATH")
+    tracing_otlp_endpoint: str = Field("http://localhost:4318/v1/traces", env="TRACING_OTLP_ENDPOINT")
+    tracing_sample_ratio: float = Field(1.0, env="TRACING_SAMPLE_RATIO")
+    tracing_service_name: str = Field("girlfriend-bot", env="TRACING_SERVICE_NAME")
+    # Контроль задержки event loop; стек блокирующего кода пишется в лог при DEBUG или LOOP_BLOCK_CAPTURE_STACKS
+    loop_monitor_enabled: bool = Field(True, env="LOOP_MONITOR_ENABLED")
+    loop_monitor_interval_seconds: float = Field(0.5, env="LOOP_MONITOR_INTERVAL_SECONDS")
+    loop_block_threshold_seconds: float = Field(0.1, env="LOOP_BLOCK_THRESHOLD_SECONDS")
+    loop_block_capture_stacks: bool = Field(False, env="LOOP_BLOCK_CAPTURE_STACKS")
     trial_days: int = Field(7, env="TRIAL_DAYS")
     webhook_url: Optional[str] = Field(None, env="WEBHOOK_URL")
     webhook_path: str = Field("/webhook", env="WEBHOOK_PATH")
+    webhook_host: str = Field("0.0.0.0", env="WEBHOOK_HOST")
+    webhook_port: int = Field(8000, env="WEBHOOK_PORT")
+    webhook_workers: int = Field(1, env="WEBHOOK_WORKERS")  # > 1 - процессы на общем порту (SO_REUSEPORT)
+    webhook_worker_ready_timeout_seconds: int = Field(60, env="WEBHOOK_WORKER_READY_TIMEOUT_SECONDS")
+    webhook_worker_stop_timeout_seconds: int = Field(30, env="WEBHOOK_WORKER_STOP_TIMEOUT_SECONDS")
+    webhook_max_in_flight: int = Field(100, env="WEBHOOK_MAX_IN_FLIGHT")
+    webhook_queue_size: int = Field(1000, env="WEBHOOK_QUEUE_SIZE")
+    webhook_overflow_policy: str = Field("reject", env="WEBHOOK_OVERFLOW_POLICY")  # reject, drop_oldest или drop_newest
+    webhook_drain_timeout_seconds: int = Field(20, env="WEBHOOK_DRAIN_TIMEOUT_SECONDS")
+    
+    # Polling
+    polling_timeout_seconds: int = Field(30, env="POLLING_TIMEOUT_SECONDS")  # long polling getUpdates
+    polling_handle_as_tasks: bool = Field(True, env="POLLING_HANDLE_AS_TASKS")
+    polling_tasks_concurrency_limit: int = Field(20, env="POLLING_TASKS_CONCURRENCY_LIMIT")  # 0 - без ограничения
+    polling_allowed_updates: str = Field("", env="POLLING_ALLOWED_UPDATES")  # пусто - по зарегистрированным обработчикам
+    polling_backoff_min_delay_seconds: float = Field(1.0, env="POLLING_BACKOFF_MIN_DELAY_SECONDS")
+    polling_backoff_max_delay_seconds: float = Field(5.0, env="POLLING_BACKOFF_MAX_DELAY_SECONDS")
+    polling_backoff_factor: float = Field(1.3, env="POLLING_BACKOFF_FACTOR")
+    polling_backoff_jitter: float = Field(0.1, env="POLLING_BACKOFF_JITTER")
+    polling_drain_timeout_seconds: int = Field(20, env="POLLING_DRAIN_TIMEOUT_SECONDS")
+    
+    # Health checks
+    health_check_timeout_seconds: float = Field(2.0, env="HEALTH_CHECK_TIMEOUT_SECONDS")
+    shutdown_readiness_delay_seconds: int = Field(0, env="SHUTDOWN_READINESS_DELAY_SECONDS")
     bot_username: Optional[str] = Field(None, env="BOT_USERNAME")
     payment_return_url: Optional[str] = Field(None, env="PAYMENT_RETURN_URL")
     admin_username: Optional[str] = Field(None, env="ADMIN_USERNAME")
@@ -34,6 +124,12 @@ class Settings(BaseSettings):
     notification_check_interval_hours: int = Field(6, env="NOTIFICATION_CHECK_INTERVAL_HOURS")
     enable_subscription_notifications: bool = Field(True, env="ENABLE_SUBSCRIPTION_NOTIFICATIONS")
     
+    # Scheduler
+    scheduler_jobstore: str = Field("memory", env="SCHEDULER_JOBSTORE")  # memory, redis или sqlalchemy
+    scheduler_jobstore_url: Optional[str] = Field(None, env="SCHEDULER_JOBSTORE_URL")
+    scheduler_misfire_grace_time_seconds: int = Field(3600, env="SCHEDULER_MISFIRE_GRACE_TIME_SECONDS")
+    scheduler_coalesce: bool = Field(True, env="SCHEDULER_COALESCE")
+    
     # Rate Limiting
     enable_rate_limiting: bool = Field(True, env="ENABLE_RATE_LIMITING")
     rate_limit_messages_per_minute: int = Field(10, env="RATE_LIMIT_MESSAGES_PER_MINUTE")
@@ -1,13 +1,26 @@
 import asyncio
 import logging
-from aiogram import Bot, Dispatcher
+import signal
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.storage.redis import RedisStorage
-from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiogram.webhook.aiohttp_server import setup_application
 from aiohttp import web
 from config.settings import settings
 from app.services.database import db_service
 from app.services.subscription_plan_service import SubscriptionPlanService
+from app.services.plan_catalog_service import plan_catalog_service
+from app.services.persona_prompt_service import persona_prompt_service
+from app.services.redis_client import close_redis
+from app.services.profile_pool_service import profile_pool_service
+from app.services.container import services
+from app.services.health_service import health_service
+from app.services.metrics import (
+    clear_multiprocess_dir, mark_process_dead, metrics_handler, setup_handler_metrics, stats_collector
+)
+from app.services.tracing import setup_bot_tracing, setup_tracing, shutdown_tracing
+from app.services.loop_monitor import loop_monitor
 from app.handlers import (
     start_router,
     subscription_router,
@@ -19,6 +32,10 @@ from app.handlers import (
 from app.handlers.payment import process_yookassa_webhook, setup_yookassa_webhook
 from app.services.scheduler_service import SchedulerService
 from app.services.redis_rate_limiter import redis_rate_limiter
+from app.utils.polling import BoundedDispatcher, get_allowed_updates, get_backoff_config
+from app.utils.webhook_handler import BoundedRequestHandler
+from app.utils.json_codec import json_loads, json_dumps
+from app.utils.worker_supervisor import WorkerSupervisor
 
 # Настройка логирования
 logging.basicConfig(
@@ -28,12 +45,15 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Инициализация бота
-bot = Bot(token=settings.bot_token)
+bot = Bot(
+    token=settings.bot_token,
+    session=AiohttpSession(json_loads=json_loads, json_dumps=json_dumps)
+)
 
 # Настройка хранилища состояний
 if settings.redis_url:
     try:
-        storage = RedisStorage.from_url(settings.redis_url)
+        storage = RedisStorage.from_url(settings.redis_url, json_loads=json_loads, json_dumps=json_dumps)
         logger.info("Using Redis storage for FSM")
     except Exception as e:
         logger.warning(f"Failed to connect to Redis: {e}. Using memory storage.")
@@ -42,61 +62,113 @@ else:
     storage = MemoryStorage()
     logger.info("Using memory storage for FSM")
 
-# Инициализация диспетчера
-dp = Dispatcher(storage=storage)
+# Инициализация диспетчера (ограничение параллельной обработки действует в режиме polling)
+dp = BoundedDispatcher(storage=storage, tasks_concurrency_limit=settings.polling_tasks_concurrency_limit)
 
 # Инициализация планировщика
 scheduler_service = None
 
+# Номер процесса webhook-сервера: 0 - основной (таблицы, планировщик), остальные только обрабатывают обновления
+worker_index = 0
 
-async def on_startup():
-    """Действия при запуске бота"""
-    logger.info("Starting bot...")
-    
-    # Создаем таблицы в базе данных
+
+async def init_database():
+    """Проверка схемы БД и создание планов подписок"""
     try:
-        await db_service.create_tables()
-        logger.info("Database tables created successfully")
+        schema_mode = settings.database_schema_mode.lower()
+        if schema_mode == "create":
+            # Только для разработки: create_all читает структуру всех таблиц при каждом запуске
+            await db_service.create_tables()
+        elif schema_mode == "check":
+            await db_service.check_schema_revision()
+        else:
+            logger.info("Database schema check skipped")
         
         # Инициализируем планы подписок
         async with db_service.async_session() as session:
             await SubscriptionPlanService.initialize_plans_if_needed(session)
-            logger.info("Subscription plans initialized")
+            logger.info(f"Subscription plans initialized, catalog version {plan_catalog_service.version}")
             
     except Exception as e:
-        logger.error(f"Failed to create database tables: {e}")
+        logger.error(f"Failed to initialize database: {e}")
         raise
-    
-    # Настраиваем webhook для YooKassa
+
+
+async def init_yookassa():
+    """Настройка webhook для YooKassa"""
     try:
         await setup_yookassa_webhook()
     except Exception as e:
         logger.warning(f"Failed to setup YooKassa webhook: {e}")
+
+
+async def init_redis_rate_limiter():
+    """Проверка подключения Redis rate limiter"""
+    try:
+        await redis_rate_limiter._get_redis()
+        logger.info("Redis rate limiter initialized")
+    except Exception as e:
+        logger.warning(f"Failed to initialize Redis rate limiter: {e}")
+
+
+async def on_startup():
+    """Действия при запуске бота"""
+    logger.info("Starting bot...")
+    
+    # Задержка event loop измеряется с самого запуска
+    if settings.loop_monitor_enabled:
+        loop_monitor.start()
+    
+    # Независимые шаги выполняются параллельно, время каждого пишется в лог и в /readyz.
+    # Тяжелые сервисы (БД, Gemini, YooKassa) создаются в потоках
+    steps = [health_service.run_step("services", services.warm_up())]
+    
+    # Разовые действия выполняет только основной процесс
+    if worker_index == 0:
+        steps.append(health_service.run_step("database", init_database()))
+        steps.append(health_service.run_step("yookassa", init_yookassa()))
     
-    # Инициализируем Redis rate limiter
     if settings.enable_rate_limiting and settings.redis_url:
-        try:
-            # Проверяем подключение к Redis
-            await redis_rate_limiter._get_redis()
-            logger.info("Redis rate limiter initialized")
-        except Exception as e:
-            logger.warning(f"Failed to initialize Redis rate limiter: {e}")
+        steps.append(health_service.run_step("redis", init_redis_rate_limiter()))
+    
+    await asyncio.gather(*steps)
     
-    # Запускаем планировщик уведомлений
+    # Подписываемся на сброс каталога планов с других реплик
+    if settings.redis_url:
+        plan_catalog_service.start_listener()
+        persona_prompt_service.start_listener()
+        logger.info("Plan catalog and persona prompt invalidation listeners started")
+    
+    # Запускаем фоновое пополнение пула готовых профилей
+    if profile_pool_service.enabled:
+        profile_pool_service.start_producer()
+        logger.info("Profile pool producer started")
+    
+    # Запускаем планировщик уведомлений (один на все процессы)
     global scheduler_service
-    try:
-        scheduler_service = SchedulerService(bot)
-        scheduler_service.start()
-        logger.info("Notification scheduler started")
-    except Exception as e:
-        logger.error(f"Failed to start notification scheduler: {e}")
+    if worker_index == 0:
+        try:
+            scheduler_service = SchedulerService(bot)
+            await scheduler_service.start()
+            logger.info("Notification scheduler started")
+        except Exception as e:
+            logger.error(f"Failed to start notification scheduler: {e}")
+            # Явно выбранное постоянное хранилище задач не работает - не запускаемся без уведомлений
+            if settings.scheduler_jobstore.lower() != "memory":
+                raise
     
-    logger.info("Bot started successfully")
+    health_service.mark_started()
+    logger.info(f"Bot started successfully (worker {worker_index})")
 
 
 async def on_shutdown():
     """Действия при остановке бота"""
     logger.info("Shutting down bot...")
+    health_service.start_draining()
+    
+    # Дожидаемся обработки уже полученных обновлений до закрытия БД
+    # (в режиме webhook очередь дообрабатывает BoundedRequestHandler до вызова on_shutdown)
+    await dp.drain(settings.polling_drain_timeout_seconds)
     
     # Останавливаем планировщик
     global scheduler_service
@@ -114,19 +186,52 @@ async def on_shutdown():
     except Exception as e:
         logger.error(f"Error closing Redis rate limiter: {e}")
     
+    # Останавливаем подписки на сброс кэшей и закрываем общее подключение к Redis
+    try:
+        await plan_catalog_service.close()
+        await persona_prompt_service.close()
+        await profile_pool_service.close()
+        await close_redis()
+        if settings.gemini_backend == "http":
+            from app.services.gemini_http import close_http_client
+            await close_http_client()
+    except Exception as e:
+        logger.error(f"Error closing cache services: {e}")
+    
+    await loop_monitor.stop()
+    
     # Закрываем соединение с базой данных
     await db_service.close()
     
     # Закрываем сессию бота
     await bot.session.close()
     
+    # Отправляем оставшиеся спаны
+    shutdown_tracing()
+    
     logger.info("Bot shutdown complete")
 
 
+async def healthz_handler(request):
+    """Проверка живости процесса"""
+    return web.json_response({
+        **health_service.liveness(),
+        "worker": worker_index,
+        "event_loop": loop_monitor.get_stats()
+    })
+
+
+async def readyz_handler(request):
+    """Проверка готовности принимать обновления (БД, Redis, Gemini)"""
+    readiness = await health_service.readiness()
+    readiness["worker"] = worker_index
+    return web.json_response(readiness, status=200 if readiness["ready"] else 503)
+
+
 async def yookassa_webhook_handler(request):
     """Обработчик webhook от YooKassa"""
     try:
-        data = await request.json()
+        data = await request.json(loads=json_loads)
         logger.info(f"Received YooKassa webhook: {data}")
         
         success = await process_yookassa_webhook(data, bot)
@@ -150,54 +255,142 @@ def register_routers():
     dp.include_router(conversation_router)
     dp.include_router(payment_router)
 
-async def main():
-    """Основная функция"""
-    # Регистрируем роутеры
+
+def setup_dispatcher():
+    """Роутеры и события запуска/остановки"""
     register_routers()
-    
-    # Регистрируем события запуска и остановки
+    if settings.metrics_enabled:
+        setup_handler_metrics(dp)
+    if settings.tracing_enabled:
+        setup_tracing(worker_index)
+        setup_bot_tracing(dp, bot)
     dp.startup.register(on_startup)
     dp.shutdown.register(on_shutdown)
+
+
+async def set_telegram_webhook():
+    """Установка webhook в Telegram"""
+    await bot.set_webhook(
+        url=f"{settings.webhook_url}{settings.webhook_path}",
+        drop_pending_updates=True
+    )
+
+
+async def run_webhook_server(reuse_port: bool = False, ready_event=None):
+    """
+    Веб-сервер webhook до сигнала остановки
+    
+    reuse_port - порт слушают несколько процессов (SO_REUSEPORT),
+    ready_event выставляется после запуска сервера.
+    """
+    # Создаем веб-приложение
+    app = web.Application()
+    
+    # Настраиваем webhook для Telegram: очередь обновлений с ограниченным числом обработчиков
+    # (регистрируется до setup_application, чтобы при остановке очередь дообработалась до закрытия БД)
+    webhook_requests_handler = BoundedRequestHandler(
+        dispatcher=dp,
+        bot=bot
+    )
+    webhook_requests_handler.register(app, path=settings.webhook_path)
+    
+    # Добавляем обработчик для YooKassa webhook
+    app.router.add_post("/yookassa_webhook", yookassa_webhook_handler)
+    
+    # Проверки живости и готовности
+    app.router.add_get("/healthz", healthz_handler)
+    app.router.add_get("/readyz", readyz_handler)
+    
+    # Метрики Prometheus
+    if settings.metrics_enabled:
+        stats_collector.set_webhook_handler(webhook_requests_handler, worker=worker_index)
+        app.router.add_get("/metrics", metrics_handler)
+    
+    # Настраиваем приложение (on_startup/on_shutdown диспетчера)
+    setup_application(app, dp, bot=bot)
+    
+    # Запускаем веб-сервер
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.webhook_host, port=settings.webhook_port, reuse_port=reuse_port)
+    await site.start()
+    
+    logger.info(f"Webhook server started on port {settings.webhook_port} (worker {worker_index})")
+    if ready_event is not None:
+        ready_event.set()
+    
+    # Ждем SIGTERM/SIGINT и плавно останавливаемся
+    # (процессы под супервизором останавливает только он - сигналом SIGTERM)
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in ((signal.SIGTERM,) if reuse_port else (signal.SIGTERM, signal.SIGINT)):
+        loop.add_signal_handler(sig, stop_event.set)
+    try:
+        await stop_event.wait()
+        
+        # Сначала /readyz начинает отвечать 503, чтобы балансировщик убрал процесс,
+        # затем закрываем порт: очередь обновлений дообрабатывается до закрытия БД
+        health_service.start_draining()
+        if settings.shutdown_readiness_delay_seconds:
+            logger.info(f"Draining: waiting {settings.shutdown_readiness_delay_seconds}s before closing the listener")
+            await asyncio.sleep(settings.shutdown_readiness_delay_seconds)
+    finally:
+        await runner.cleanup()
+
+
+def run_webhook_worker(index: int, ready_event):
+    """Точка входа процесса-обработчика webhook (запускается супервизором)"""
+    global worker_index
+    worker_index = index
+    # SIGHUP и SIGINT (Ctrl+C в терминале) предназначены супервизору, процессы их игнорируют
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    setup_dispatcher()
+    asyncio.run(run_webhook_server(reuse_port=True, ready_event=ready_event))
+
+
+def run_webhook_workers():
+    """Многопроцессный режим webhook: супервизор и WEBHOOK_WORKERS процессов на общем порту"""
+    if not settings.redis_url:
+        # Состояния FSM в памяти процесса разъехались бы между обработчиками
+        raise RuntimeError("WEBHOOK_WORKERS > 1 requires REDIS_URL for shared FSM storage")
+    
+    logger.info(f"Starting bot in webhook mode with {settings.webhook_workers} workers")
+    
+    # Webhook устанавливается один раз супервизором, а не каждым процессом
+    async def set_webhook_once():
+        try:
+            await set_telegram_webhook()
+        finally:
+            await bot.session.close()
+    
+    asyncio.run(set_webhook_once())
+    
+    # Счетчики прошлого запуска не должны попасть в сумму по процессам
+    clear_multiprocess_dir()
+    
+    WorkerSupervisor(
+        run_webhook_worker,
+        settings.webhook_workers,
+        ready_timeout_seconds=settings.webhook_worker_ready_timeout_seconds,
+        stop_timeout_seconds=settings.webhook_worker_stop_timeout_seconds,
+        on_worker_exit=mark_process_dead
+    ).run()
+
+
+async def main():
+    """Основная функция"""
+    # Регистрируем роутеры и события запуска и остановки
+    setup_dispatcher()
     
     if settings.webhook_url:
         # Режим webhook
         logger.info("Starting bot in webhook mode")
         
-        # Создаем веб-приложение
-        app = web.Application()
-        
-        # Настраиваем webhook для Telegram
-        webhook_requests_handler = SimpleRequestHandler(
-            dispatcher=dp,
-            bot=bot
-        )
-        webhook_requests_handler.register(app, path=settings.webhook_path)
-        
-        # Добавляем обработчик для YooKassa webhook
-        app.router.add_post("/yookassa_webhook", yookassa_webhook_handler)
-        
-        # Настраиваем приложение
-        setup_application(app, dp, bot=bot)
-        
         # Устанавливаем webhook
-        await bot.set_webhook(
-            url=f"{settings.webhook_url}{settings.webhook_path}",
-            drop_pending_updates=True
-        )
-        
-        # Запускаем веб-сервер
-        runner = web.AppRunner(app)
-        await runner.setup()
-        site = web.TCPSite(runner, host="0.0.0.0", port=8000)
-        await site.start()
-        
-        logger.info("Webhook server started on port 8000")
+        await set_telegram_webhook()
         
-        # Ждем бесконечно
-        try:
-            await asyncio.Future()  # run forever
-        finally:
-            await runner.cleanup()
+        await run_webhook_server()
     else:
         # Режим polling
         logger.info("Starting bot in polling mode")
@@ -205,14 +398,25 @@ async def main():
         # Удаляем webhook если он был установлен
         await bot.delete_webhook(drop_pending_updates=True)
         
-        # Запускаем polling
-        await dp.start_polling(bot)
+        # Запускаем polling только за теми типами обновлений, которые обрабатываются
+        allowed_updates = get_allowed_updates(dp)
+        logger.info(f"Polling allowed updates: {', '.join(allowed_updates)}")
+        await dp.start_polling(
+            bot,
+            polling_timeout=settings.polling_timeout_seconds,
+            handle_as_tasks=settings.polling_handle_as_tasks,
+            backoff_config=get_backoff_config(),
+            allowed_updates=allowed_updates
+        )
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        if settings.webhook_url and settings.webhook_workers > 1:
+            run_webhook_workers()
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
     except Exception as e:
         logger.error(f"Bot crashed: {e}")
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,127 @@
+"""
+Фаззинг разбора профиля из ответа модели
+
+parse_profile получает произвольный текст модели и должен либо вернуть
+валидный GeneratedProfile, либо бросить InvalidProfileOutput - любое
+другое исключение уронило бы генерацию профиля вместо перехода к
+запасному варианту.
+"""
+import json
+import random
+import pytest
+from app.services.profile_schema import GeneratedProfile, InvalidProfileOutput, parse_profile
+
+VALID_PROFILE = {
+    "name": "Алиса",
+    "age": 23,
+    "personality": "Добрая, веселая, немного застенчивая",
+    "appearance": "Светлые волосы, зеленые глаза",
+    "interests": ["музыка", "кино", "кулинария"],
+    "background": "Учится на дизайнера в Санкт-Петербурге",
+    "communication_style": "Мягкий, с эмодзи и шутками"
+}
+VALID_TEXT = json.dumps(VALID_PROFILE, ensure_ascii=False)
+
+MUTATION_ALPHABET = '{}[]":,\\ \n\t0123456789-.eEabcnulltrueалиса😊\x00'
+
+FIELD_VALUES = [
+    None, True, 0, -1, 17, 51, 10 ** 100, 1e400, 23.5, "", "   ", "x" * 10000,
+    [], [None, 1, {"a": []}], {}, {"nested": {"deep": [1, 2]}}, "23"
+]
+
+
+def assert_profile_or_invalid(text):
+    """Либо валидный профиль, либо InvalidProfileOutput - других исходов быть не должно"""
+    try:
+        profile = parse_profile(text)
+    except InvalidProfileOutput:
+        return None
+    assert isinstance(profile, GeneratedProfile)
+    return profile
+
+
+def test_valid_profile():
+    profile = parse_profile(VALID_TEXT)
+    assert profile.name == "Алиса"
+    assert profile.interests == "музыка, кино, кулинария"
+
+
+@pytest.mark.parametrize("text", [None, "", "   \n", "null", "42", '"text"', "[]", "[1, 2]", "true"])
+def test_empty_and_non_object(text):
+    with pytest.raises(InvalidProfileOutput):
+        parse_profile(text)
+
+
+@pytest.mark.parametrize("length", range(0, len(VALID_TEXT), 3))
+def test_truncated(length):
+    # Ответ, оборванный по лимиту токенов
+    assert assert_profile_or_invalid(VALID_TEXT[:length]) is None
+
+
+@pytest.mark.parametrize("text", [
+    pytest.param("{" * 100000, id="open-braces"),
+    pytest.param("[" * 100000, id="open-brackets"),
+    pytest.param('{"a": ' * 5000 + "1" + "}" * 5000, id="deep-object"),
+    pytest.param("[" * 5000 + VALID_TEXT + "]" * 5000, id="deep-array-around-profile"),
+    pytest.param("{" * 5000 + VALID_TEXT, id="braces-before-profile"),
+    pytest.param('{"profile": ' + VALID_TEXT + "}", id="wrapped-profile"),
+    pytest.param("{{" + VALID_TEXT + "}}", id="double-braces-around"),
+    pytest.param(VALID_TEXT.replace("{", "{{").replace("}", "}}"), id="doubled-braces"),
+    pytest.param("}" * 1000 + VALID_TEXT, id="closing-braces-before"),
+])
+def test_nested_braces(text):
+    assert_profile_or_invalid(text)
+
+
+@pytest.mark.parametrize("text", [
+    f"```json\n{VALID_TEXT}\n```",
+    f"```\n{VALID_TEXT}\n```",
+    f"```json\n{json.dumps(VALID_PROFILE, ensure_ascii=False, indent=2)}\n```\n",
+    f"Вот профиль: {VALID_TEXT}. Надеюсь, понравится {{",
+    f"Конечно! {{не json}} А вот и профиль:\n{VALID_TEXT}\n```",
+    f"{VALID_TEXT}\n\nВторой вариант: {VALID_TEXT}",
+])
+def test_fenced_and_prose_wrapped(text):
+    profile = assert_profile_or_invalid(text)
+    assert profile is not None and profile.name == "Алиса"
+
+
+@pytest.mark.parametrize("text", [
+    "```json\n```",
+    "```json\n{\n```",
+    "Извините, я не могу создать такой профиль.",
+    "Профиль: {name: Алиса, age: 23}",
+    f"```json\n{VALID_TEXT[:-20]}\n```",
+])
+def test_fenced_and_prose_invalid(text):
+    assert assert_profile_or_invalid(text) is None
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_random_mutations(seed):
+    rng = random.Random(seed)
+    chars = list(VALID_TEXT)
+    for _ in range(rng.randint(1, 8)):
+        position = rng.randrange(len(chars) + 1)
+        operation = rng.choice(("insert", "delete", "replace"))
+        if operation == "insert":
+            chars.insert(position, rng.choice(MUTATION_ALPHABET))
+        elif chars and position < len(chars):
+            if operation == "delete":
+                del chars[position]
+            else:
+                chars[position] = rng.choice(MUTATION_ALPHABET)
+    assert_profile_or_invalid("".join(chars))
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_field_values(seed):
+    rng = random.Random(seed)
+    data = dict(VALID_PROFILE)
+    for field in rng.sample(sorted(data), rng.randint(1, 3)):
+        if rng.random() < 0.2:
+            del data[field]
+        else:
+            data[field] = rng.choice(FIELD_VALUES)
+    data.update({f"extra_{index}": rng.choice(FIELD_VALUES) for index in range(rng.randint(0, 2))})
+    assert_profile_or_invalid(json.dumps(data, ensure_ascii=False))